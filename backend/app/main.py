@@ -1,17 +1,49 @@
 """
 Main FastAPI application entry point
 """
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import query
-from app.middleware.rate_limit import rate_limit_middleware
+from app.routers import query, metrics
+from app.middleware.rate_limit import rate_limit_middleware, backend as rate_limit_backend
+from app.middleware.metrics import MetricsMiddleware
+from app.services.google_maps_service import google_maps_service
+from app.services.llm_service import llm_service
+from app.utils.metrics import monitor_event_loop_lag
+from app.utils.env_config import get_llm_warmup, get_metrics_loop_lag_interval
 import os
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Manage shared upstream clients and caches for the lifetime of the app"""
+    await llm_service.preload_intent_cache()
+    
+    # Load the model in the background so startup is not blocked on Ollama
+    warmup_task = asyncio.create_task(llm_service.warm_up()) if get_llm_warmup() else None
+    compact_task = asyncio.create_task(google_maps_service.compact_place_index())
+    lag_interval = get_metrics_loop_lag_interval()
+    lag_task = asyncio.create_task(monitor_event_loop_lag(lag_interval)) if lag_interval > 0 else None
+    
+    yield
+    
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    if lag_task is not None:
+        lag_task.cancel()
+    await compact_task
+    await google_maps_service.aclose()
+    await llm_service.aclose()
+    await rate_limit_backend.aclose()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="HeyPico AI Maps API",
     description="AI-powered location search with Google Maps integration",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -27,8 +59,12 @@ app.add_middleware(
 # Add rate limiting middleware
 app.middleware("http")(rate_limit_middleware)
 
+# Added last so it is outermost and also times rate-limited requests
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(query.router, prefix="/api", tags=["query"])
+app.include_router(metrics.router, tags=["metrics"])
 
 
 @app.get("/")
@@ -0,0 +1,77 @@
+"""
+Request metrics and Server-Timing middleware
+"""
+import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.utils.metrics import HTTP_REQUEST_DURATION, server_timing_header, track_request_timings
+
+
+def _route_label(scope: Scope) -> str:
+    """
+    Path label for a request
+
+    No route takes path parameters, so matched paths are a fixed set;
+    unmatched and rejected requests share one label to keep cardinality low.
+    """
+    if "route" in scope:
+        return scope["path"]
+    return "other"
+
+
+class MetricsMiddleware:
+    """
+    Time every request and expose its stage durations
+
+    Handlers that record stage timings write them into the dict returned by
+    request_timings(); they are sent back in a Server-Timing header together
+    with the total time spent in the app. Streamed responses carry it as an
+    HTTP trailer instead when the server supports the ASGI trailers
+    extension; otherwise their header only holds the time to first byte and
+    the stage timings arrive in the stream's final event.
+
+    Written as plain ASGI rather than an @app.middleware("http") function,
+    which would add a task and a memory stream to every request.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = track_request_timings()
+        start = time.perf_counter()
+        supports_trailers = "http.response.trailers" in scope.get("extensions", {})
+        use_trailer = False
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal use_trailer
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - start
+                HTTP_REQUEST_DURATION.labels(
+                    scope["method"], _route_label(scope), str(message["status"])
+                ).observe(elapsed)
+                headers = list(message.get("headers", ()))
+                # A streamed body's stages finish after the headers are sent,
+                # so they go in a trailer when the server can send one
+                use_trailer = supports_trailers and not any(name.lower() == b"content-length" for name, _ in headers)
+                if use_trailer:
+                    headers.append((b"trailer", b"server-timing"))
+                    message = {**message, "trailers": True}
+                else:
+                    header = server_timing_header({**timings, "total": round(elapsed * 1000, 1)})
+                    headers.append((b"server-timing", header.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+            if use_trailer and message["type"] == "http.response.body" and not message.get("more_body", False):
+                trailer = server_timing_header({**timings, "total": round((time.perf_counter() - start) * 1000, 1)})
+                await send({
+                    "type": "http.response.trailers",
+                    "headers": [(b"server-timing", trailer.encode("latin-1"))],
+                    "more_trailers": False,
+                })
+
+        await self.app(scope, receive, send_with_timing)
@@ -1,48 +1,122 @@
 """
 Rate limiting middleware to protect API endpoints
 """
-from fastapi import Request, HTTPException
-from collections import defaultdict
-import time
+from fastapi import Request
+from fastapi.responses import JSONResponse
+import logging
+import math
 from typing import Dict, Tuple
+from app.middleware.rate_limit_backends import (
+    RateLimit,
+    RateLimitBackend,
+    InMemoryBackend,
+    RedisBackend,
+)
+from app.utils.env_config import (
+    get_rate_limit_requests,
+    get_rate_limit_window,
+    get_rate_limit_max_keys,
+    get_rate_limit_routes,
+    get_rate_limit_backend,
+    get_rate_limit_redis_url,
+    get_rate_limit_redis_timeout,
+    get_rate_limit_redis_retry_interval,
+)
+from app.utils.metrics import RATE_LIMIT_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+
+def parse_route_limits(spec: str) -> Dict[str, RateLimit]:
+    """
+    Parse per-route limits
+
+    Args:
+        spec: Comma-separated "path=requests/window" pairs,
+            e.g. "/health=120/60,/api/geocode=60/60"
+    """
+    limits = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        path, _, budget = item.partition("=")
+        requests, _, window = budget.partition("/")
+        limits[path.strip()] = RateLimit(int(requests), float(window or RATE_LIMIT_WINDOW))
+    return limits
 
-# In-memory store: {ip: (request_count, window_start_time)}
-request_store: Dict[str, Tuple[int, float]] = defaultdict(lambda: (0, time.time()))
 
 # Configuration
-RATE_LIMIT_REQUESTS = 20  # requests per window
-RATE_LIMIT_WINDOW = 60  # seconds
+RATE_LIMIT_REQUESTS = get_rate_limit_requests()  # requests per window
+RATE_LIMIT_WINDOW = get_rate_limit_window()  # seconds
+DEFAULT_LIMIT = RateLimit(RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW)
+ROUTE_LIMITS = parse_route_limits(get_rate_limit_routes())
+
+
+def create_backend() -> RateLimitBackend:
+    """Build the storage backend selected by RATE_LIMIT_BACKEND"""
+    kind = get_rate_limit_backend()
+    if kind == "redis":
+        return RedisBackend(
+            url=get_rate_limit_redis_url(),
+            timeout=get_rate_limit_redis_timeout(),
+            retry_interval=get_rate_limit_redis_retry_interval(),
+            max_local_keys=get_rate_limit_max_keys()
+        )
+    if kind != "memory":
+        logger.error(f"Unknown RATE_LIMIT_BACKEND '{kind}'; using in-memory limits")
+    return InMemoryBackend(max_keys=get_rate_limit_max_keys())
+
+
+backend = create_backend()
+
+
+# Monitoring scrapes must neither be throttled nor use up clients' budgets
+EXEMPT_PATHS = {"/metrics"}
+
+
+def _limit_for(path: str) -> Tuple[str, RateLimit]:
+    """Return the bucket name and limit for a request path"""
+    limit = ROUTE_LIMITS.get(path)
+    if limit is not None:
+        return path, limit
+    # All other routes share one budget per client
+    return "*", DEFAULT_LIMIT
+
 
 async def rate_limit_middleware(request: Request, call_next):
     """
-    Rate limit requests per IP address
-    
-    Limits: 20 requests per 60 seconds per IP
+    Rate limit requests per IP address and route budget
+
+    Default: RATE_LIMIT_REQUESTS per RATE_LIMIT_WINDOW seconds per IP, with
+    separate budgets for routes listed in RATE_LIMIT_ROUTES. EXEMPT_PATHS
+    are not limited.
     """
-    # Skip rate limiting for health check
-    if request.url.path == "/health":
+    if request.url.path in EXEMPT_PATHS:
         return await call_next(request)
-    
+
     # Get client IP
-    client_ip = request.client.host
-    
-    # Get current window data
-    current_time = time.time()
-    count, window_start = request_store[client_ip]
-    
-    # Reset window if expired
-    if current_time - window_start > RATE_LIMIT_WINDOW:
-        request_store[client_ip] = (1, current_time)
-        return await call_next(request)
-    
-    # Check if limit exceeded
-    if count >= RATE_LIMIT_REQUESTS:
-        raise HTTPException(
+    client_ip = request.client.host if request.client else "unknown"
+
+    bucket, limit = _limit_for(request.url.path)
+    result = await backend.hit((bucket, client_ip), limit)
+
+    if not result.allowed:
+        RATE_LIMIT_REJECTIONS.labels(bucket).inc()
+        retry_after = max(math.ceil(result.retry_after), 1)
+        return JSONResponse(
             status_code=429,
-            detail=f"Rate limit exceeded. Max {RATE_LIMIT_REQUESTS} requests per {RATE_LIMIT_WINDOW} seconds."
+            content={
+                "detail": f"Rate limit exceeded. Max {limit.requests} requests per {limit.window:g} seconds."
+            },
+            headers={
+                "Retry-After": str(retry_after),
+                "X-RateLimit-Limit": str(limit.requests),
+                "X-RateLimit-Remaining": "0",
+            }
         )
-    
-    # Increment counter
-    request_store[client_ip] = (count + 1, window_start)
-    
-    return await call_next(request)
+
+    response = await call_next(request)
+    response.headers["X-RateLimit-Limit"] = str(limit.requests)
+    response.headers["X-RateLimit-Remaining"] = str(result.remaining)
+    return response
@@ -0,0 +1,243 @@
+"""
+Rate limit counting and storage backends
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+import logging
+import time
+from typing import Hashable, List, Optional, Tuple
+import redis.asyncio as redis_asyncio
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Allow `requests` per `window` seconds"""
+    requests: int
+    window: float
+
+
+@dataclass
+class RateLimitResult:
+    """Outcome of counting one request"""
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float
+
+
+def _evaluate(limit: RateLimit, elapsed: float, current: int, previous: int) -> Tuple[bool, float]:
+    """
+    Sliding-window estimate for one more request
+
+    Returns:
+        (allowed, estimated count before this request)
+    """
+    estimated = previous * (1 - elapsed) + current
+    return estimated + 1 <= limit.requests, estimated
+
+
+def _retry_after(limit: RateLimit, elapsed: float, current: int, previous: int) -> float:
+    """Seconds until one more request would fit in the sliding window"""
+    if current + 1 <= limit.requests and previous > 0:
+        # Wait for enough of the previous window to slide out
+        target = 1 - (limit.requests - current - 1) / previous
+        return max(target - elapsed, 0.0) * limit.window
+
+    # Wait for the next window, where the current count becomes "previous"
+    target = 1 - (limit.requests - 1) / current if current else 0.0
+    return (1 - elapsed + max(target, 0.0)) * limit.window
+
+
+def _result(limit: RateLimit, allowed: bool, estimated: float, elapsed: float, current: int, previous: int) -> RateLimitResult:
+    if not allowed:
+        return RateLimitResult(
+            allowed=False,
+            limit=limit.requests,
+            remaining=0,
+            retry_after=_retry_after(limit, elapsed, current, previous)
+        )
+    return RateLimitResult(
+        allowed=True,
+        limit=limit.requests,
+        remaining=max(int(limit.requests - estimated - 1), 0),
+        retry_after=0.0
+    )
+
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window counter limiter with a bounded key table
+
+    Each key keeps only the counts of the current and previous fixed windows;
+    the previous count is weighted by how much of it still overlaps the
+    sliding window. That smooths out the 2x bursts a fixed window allows at
+    window edges while keeping O(1) work and memory per key. The key table
+    is an LRU capped at `max_keys`, so idle clients are evicted first and
+    memory stays bounded under scanning traffic.
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        # key -> [window_index, current_count, previous_count]
+        self._state: "OrderedDict[Hashable, List[int]]" = OrderedDict()
+
+        self.evictions = 0
+        self.rejections = 0
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def hit(self, key: Hashable, limit: RateLimit, now: Optional[float] = None) -> RateLimitResult:
+        """Count one request for key and decide whether it is allowed"""
+        if now is None:
+            now = time.time()
+
+        window_index = int(now // limit.window)
+        state = self._state.get(key)
+        if state is None:
+            state = [window_index, 0, 0]
+            self._state[key] = state
+            if len(self._state) > self.max_keys:
+                self._state.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._state.move_to_end(key)
+            if window_index != state[0]:
+                # Roll forward; anything older than one window no longer counts
+                state[2] = state[1] if window_index == state[0] + 1 else 0
+                state[1] = 0
+                state[0] = window_index
+
+        _, current, previous = state
+        elapsed = (now - window_index * limit.window) / limit.window
+        allowed, estimated = _evaluate(limit, elapsed, current, previous)
+
+        if allowed:
+            state[1] += 1
+        else:
+            self.rejections += 1
+        return _result(limit, allowed, estimated, elapsed, current, previous)
+
+
+class RateLimitBackend(ABC):
+    """Storage interface behind the rate limiting middleware"""
+
+    name = "base"
+
+    @abstractmethod
+    async def hit(self, key: Tuple[str, str], limit: RateLimit, now: Optional[float] = None) -> RateLimitResult:
+        """Count one request for (bucket, client) and decide whether it is allowed"""
+
+    async def aclose(self) -> None:
+        """Release backend resources"""
+
+
+class InMemoryBackend(RateLimitBackend):
+    """Per-process counters; limits apply per uvicorn worker"""
+
+    name = "memory"
+
+    def __init__(self, max_keys: int):
+        self.limiter = SlidingWindowLimiter(max_keys=max_keys)
+
+    async def hit(self, key: Tuple[str, str], limit: RateLimit, now: Optional[float] = None) -> RateLimitResult:
+        return self.limiter.hit(key, limit, now)
+
+
+# Sliding-window update done atomically on the server in one round trip.
+# Returns {allowed, current_before, previous, elapsed_fraction}; the fraction
+# is returned as a string because Redis truncates Lua numbers to integers.
+_SLIDING_WINDOW_LUA = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local index = math.floor(now / window)
+
+local state = redis.call('HMGET', KEYS[1], 'w', 'c', 'p')
+local w = tonumber(state[1])
+local c = tonumber(state[2]) or 0
+local p = tonumber(state[3]) or 0
+
+if w ~= index then
+    if w ~= nil and index == w + 1 then p = c else p = 0 end
+    c = 0
+end
+
+local elapsed = (now - index * window) / window
+local allowed = 0
+if p * (1 - elapsed) + c + 1 <= limit then allowed = 1 end
+
+redis.call('HSET', KEYS[1], 'w', index, 'c', c + allowed, 'p', p)
+redis.call('PEXPIRE', KEYS[1], math.ceil(window * 2000))
+return {allowed, c, p, tostring(elapsed)}
+"""
+
+
+class RedisBackend(RateLimitBackend):
+    """
+    Counters shared by every worker through a Redis-protocol server
+
+    Each request is one EVALSHA of a Lua script, so the read-modify-write is
+    atomic across workers and hosts. If the server is unreachable, requests
+    are counted by a local in-memory limiter instead of failing, and the
+    server is retried after `retry_interval` seconds.
+    """
+
+    name = "redis"
+
+    def __init__(
+        self,
+        url: str = "redis://localhost:6379/0",
+        key_prefix: str = "ratelimit",
+        timeout: float = 0.05,
+        retry_interval: float = 5.0,
+        max_local_keys: int = 100000,
+        client=None
+    ):
+        if client is None:
+            client = redis_asyncio.Redis.from_url(
+                url,
+                socket_timeout=timeout,
+                socket_connect_timeout=timeout,
+            )
+        self.client = client
+        self.key_prefix = key_prefix
+        self.retry_interval = retry_interval
+        self.local = InMemoryBackend(max_keys=max_local_keys)
+        self._script = client.register_script(_SLIDING_WINDOW_LUA)
+        self._unavailable_until = 0.0
+
+        self.fallbacks = 0
+
+    async def hit(self, key: Tuple[str, str], limit: RateLimit, now: Optional[float] = None) -> RateLimitResult:
+        if now is None:
+            now = time.time()
+
+        if time.monotonic() < self._unavailable_until:
+            self.fallbacks += 1
+            return await self.local.hit(key, limit, now)
+
+        try:
+            allowed, current, previous, elapsed = await self._script(
+                keys=[f"{self.key_prefix}:{key[0]}:{key[1]}"],
+                args=[repr(now), repr(limit.window), limit.requests]
+            )
+        except Exception as e:
+            logger.warning(
+                f"Rate limit backend unavailable, counting locally for {self.retry_interval}s: {e}"
+            )
+            self._unavailable_until = time.monotonic() + self.retry_interval
+            self.fallbacks += 1
+            return await self.local.hit(key, limit, now)
+
+        elapsed = float(elapsed)
+        current = int(current)
+        previous = int(previous)
+        _, estimated = _evaluate(limit, elapsed, current, previous)
+        return _result(limit, bool(allowed), estimated, elapsed, current, previous)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
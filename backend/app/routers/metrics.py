@@ -0,0 +1,187 @@
+"""
+Prometheus metrics endpoint
+"""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.services.google_maps_service import google_maps_service
+from app.services.llm_service import llm_service
+from app.utils.metrics import REGISTRY, CallbackMetric
+from app.utils.resilience import CLOSED, HALF_OPEN, OPEN
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_CIRCUIT_STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def _cache_stats() -> dict:
+    """Current stats of every response cache, keyed by cache label"""
+    caches = {
+        "reverse_geocode": google_maps_service.reverse_geocode_cache.stats(),
+        "places": google_maps_service.places_cache.stats(),
+        "intent": llm_service.intent_cache.stats(),
+    }
+    for mode, cache in google_maps_service.distance_caches.items():
+        caches[f"distance_{mode}"] = cache.stats()
+    return caches
+
+
+def _cache_samples(key: str):
+    def collect():
+        for name, stats in _cache_stats().items():
+            value = stats["hits"] + stats.get("stale_hits", 0) if key == "hits" else stats[key]
+            yield (name,), value
+    return collect
+
+
+def _distance_request_samples():
+    for mode, stats in google_maps_service.distance_cache_stats().items():
+        for result in ("full_hit", "partial_hit", "miss"):
+            yield (mode, result), stats[f"{result}_requests"]
+
+
+def _guards():
+    return [*google_maps_service.client.guards.values(), *(tier.guard for tier in llm_service.tiers)]
+
+
+def _flight_samples(key: str):
+    def collect():
+        for flight in (google_maps_service.client.single_flight, llm_service.single_flight):
+            yield (flight.name,), flight.stats()[key]
+    return collect
+
+
+def _batcher_samples():
+    stats = google_maps_service.distance_batcher.stats()
+    yield ("lookups",), stats["lookups"]
+    yield ("requests",), stats["requests"]
+    yield ("elements",), stats["elements"]
+
+
+# Read from the services' own counters when scraped, so exporting them
+# adds nothing to the request path
+for _name, _doc, _type, _key in (
+    ("heypico_cache_hits_total", "Cache lookups answered from the cache, including stale hits", "counter", "hits"),
+    ("heypico_cache_misses_total", "Cache lookups that missed", "counter", "misses"),
+    ("heypico_cache_hit_ratio", "Share of cache lookups that hit since startup", "gauge", "hit_ratio"),
+    ("heypico_cache_entries", "Entries currently held per cache", "gauge", "entries"),
+):
+    REGISTRY.register(CallbackMetric(_name, _doc, _type, ("cache",), _cache_samples(_key)))
+
+for _name, _doc, _type, _key in (
+    ("heypico_single_flight_calls_total", "Calls made through a single-flight group", "counter", "calls"),
+    ("heypico_single_flight_executions_total", "Calls that actually ran upstream", "counter", "executions"),
+    ("heypico_single_flight_coalesced_total", "Calls that joined an identical call already in flight", "counter", "coalesced"),
+    ("heypico_single_flight_cancelled_total", "Shared calls cancelled because every caller gave up", "counter", "cancelled"),
+    ("heypico_single_flight_in_flight", "Distinct calls currently in flight", "gauge", "in_flight"),
+):
+    REGISTRY.register(CallbackMetric(_name, _doc, _type, ("flight",), _flight_samples(_key)))
+
+REGISTRY.register(CallbackMetric(
+    "heypico_distance_cache_requests_total",
+    "Distance Matrix lookups per mode by how much of the destination list the cache answered",
+    "counter",
+    ("mode", "result"),
+    _distance_request_samples
+))
+REGISTRY.register(CallbackMetric(
+    "heypico_intent_path_total",
+    "Queries by the path that produced their intent",
+    "counter",
+    ("path",),
+    lambda: (((path,), count) for path, count in llm_service.path_counts.items())
+))
+REGISTRY.register(CallbackMetric(
+    "heypico_place_index_hits_total",
+    "Place searches answered from the local place index",
+    "counter",
+    (),
+    lambda: [((), google_maps_service.place_index_hits)]
+))
+for _name, _doc, _type, _key in (
+    ("heypico_place_index_searches_total", "Searches run against the local place index", "counter", "searches"),
+    ("heypico_place_index_writes_total", "Places API responses written to the local place index", "counter", "writes"),
+    ("heypico_place_index_places", "Places in the local place index, as seen by this worker", "gauge", "places"),
+):
+    REGISTRY.register(CallbackMetric(
+        _name, _doc, _type, (),
+        lambda key=_key: [((), google_maps_service.place_index.stats()[key])] if google_maps_service.place_index else []
+    ))
+REGISTRY.register(CallbackMetric(
+    "heypico_distance_batch_total",
+    "Batched Distance Matrix lookups, the requests they were packed into and the elements billed",
+    "counter",
+    ("kind",),
+    _batcher_samples
+))
+REGISTRY.register(CallbackMetric(
+    "heypico_travel_time_places_total",
+    "Places by the source of their travel times (exact Distance Matrix, local estimate or none)",
+    "counter",
+    ("source",),
+    lambda: (((source,), count) for source, count in google_maps_service.travel_time_sources.items())
+))
+REGISTRY.register(CallbackMetric(
+    "heypico_travel_estimator_observations_total",
+    "Distance Matrix elements the local travel time model was calibrated with",
+    "counter",
+    (),
+    lambda: [((), google_maps_service.travel_estimator.stats()["observations"])]
+))
+REGISTRY.register(CallbackMetric(
+    "heypico_travel_estimator_speed_mps",
+    "Current straight-line speed of the local travel time model per mode",
+    "gauge",
+    ("mode", "calibrated"),
+    lambda: (
+        ((mode, str(model["calibrated"]).lower()), model["straight_line_mps"])
+        for mode, model in google_maps_service.travel_estimator.stats()["models"].items()
+    )
+))
+REGISTRY.register(CallbackMetric(
+    "heypico_circuit_state",
+    "Upstream circuit breaker state (0 closed, 1 half-open, 2 open)",
+    "gauge",
+    ("api",),
+    lambda: (((guard.name,), _CIRCUIT_STATES[guard.breaker.state]) for guard in _guards())
+))
+REGISTRY.register(CallbackMetric(
+    "heypico_circuit_rejections_total",
+    "Upstream calls rejected because the circuit was open",
+    "counter",
+    ("api",),
+    lambda: (((guard.name,), guard.breaker.rejections) for guard in _guards())
+))
+REGISTRY.register(CallbackMetric(
+    "heypico_upstream_timeout_seconds",
+    "Current adaptive timeout per upstream, before the request deadline is applied",
+    "gauge",
+    ("api",),
+    lambda: (((guard.name,), guard.tracker.timeout()) for guard in _guards())
+))
+
+REGISTRY.register(CallbackMetric(
+    "heypico_admission_queue_depth",
+    "Calls waiting for an LLM slot, per priority",
+    "gauge",
+    ("upstream", "priority"),
+    lambda: (((llm_service.admission.name, priority), depth)
+             for priority, depth in llm_service.admission.queue_depths().items())
+))
+for _name, _doc, _type, _key in (
+    ("heypico_admission_admitted_total", "Calls given an LLM slot, immediately or after queueing", "counter", "admitted"),
+    ("heypico_admission_active", "Calls currently holding an LLM slot", "gauge", "active"),
+    ("heypico_admission_limit", "LLM slots available at once", "gauge", "limit"),
+    ("heypico_admission_service_seconds", "Moving average of how long a call holds an LLM slot", "gauge", "service_time"),
+):
+    REGISTRY.register(CallbackMetric(
+        _name, _doc, _type, ("upstream",),
+        lambda key=_key: [((llm_service.admission.name,), llm_service.admission.stats()[key] or 0.0)]
+    ))
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Expose service metrics in the Prometheus text format"""
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
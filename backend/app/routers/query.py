@@ -1,12 +1,28 @@
 """
 Query router for handling user queries
 """
+import asyncio
+import json
+from typing import Callable, Dict, List, Optional
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.schemas.models import UserQuery, QueryResponse, Place
+from app.schemas.models import UserQuery, BatchQueryRequest, QueryResponse, Place, LLMIntent
 from app.services.llm_service import llm_service
 from app.services.google_maps_service import google_maps_service
+from app.services.intent_cache import normalize_query
+from app.utils.pipeline import Stage, StageGraph
+from app.utils.upstream_calls import track_upstream_calls
+from app.utils.deadline import start_deadline
+from app.utils.admission import BATCH, set_priority
+from app.utils.metrics import observe_stage_timings, request_timings
+from app.utils.env_config import (
+    get_batch_query_concurrency,
+    get_batch_query_max_items,
+    get_request_deadline,
+)
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -28,112 +44,406 @@ async def process_query(query: UserQuery):
     """
     Process a user query and return AI-powered place recommendations
     
-    Flow:
-    1. Extract intent from natural language using LLM
-    2. Search Google Maps for places
-    3. Calculate distances and travel times
-    4. Generate AI response
-    5. Return structured results
+    Flow (independent stages run concurrently):
+    1. Reverse geocode the user's coordinates to a location name
+    2. Extract intent from natural language using LLM, speculatively on the
+       raw query while step 1 is still running
+    3. Search Google Maps for places, directly around the user's
+       coordinates when given
+    4. Calculate distances and travel times
+    5. Generate AI response
+    6. Return structured results
     """
+    # Shared with the metrics middleware, which reports it as Server-Timing
+    timings = request_timings()
+    start = time.perf_counter()
     try:
-        # Preprocess query: replace "near me" with actual location if coordinates provided
-        processed_query = query.query
-        user_location_name = None
+        upstream_calls = track_upstream_calls()
+        # Upstream calls in every stage are bounded by this budget
+        start_deadline(get_request_deadline())
+        graph = _build_query_graph(query, timings)
+        results = await graph.run()
+        return _build_query_response(query, results, timings, upstream_calls, start)
         
-        # If user location is provided, always get the location name for better results
-        if query.user_lat and query.user_lng:
-            # Reverse geocode to get location name
-            try:
-                geocode_result = google_maps_service.client.reverse_geocode((query.user_lat, query.user_lng))
-                if geocode_result:
-                    # Extract city name
-                    for component in geocode_result[0].get('address_components', []):
-                        if 'locality' in component.get('types', []) or 'administrative_area_level_2' in component.get('types', []):
-                            user_location_name = component.get('long_name')
-                            break
-                    
-                    if user_location_name:
-                        # If query doesn't already specify a location, add it
-                        if "near me" in query.query.lower() or "nearby" in query.query.lower():
-                            processed_query = processed_query.replace("near me", f"near {user_location_name}")
-                            processed_query = processed_query.replace("Near me", f"near {user_location_name}")
-                            processed_query = processed_query.replace("nearby", f"near {user_location_name}")
-                        elif "near" not in query.query.lower() and "in" not in query.query.lower():
-                            # No location specified at all, append the user's location
-                            processed_query = f"{processed_query} near {user_location_name}"
-                        
-                        logger.info(f"Using user location '{user_location_name}': {processed_query}")
-            except Exception as e:
-                logger.warning(f"Could not geocode user location: {e}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing query: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"An error occurred while processing your query: {str(e)}"
+        )
+    finally:
+        _observe_timings(timings, start)
+
+
+@router.post("/query/stream")
+async def stream_query(query: UserQuery):
+    """
+    Process a user query and stream results as they become available
+    
+    Runs the same pipeline as /query but responds with newline-delimited
+    JSON events, so the UI can render each stage as soon as it finishes:
+    
+    - {"type": "intent", "intent": {...}, "location": "..."}
+    - {"type": "places", "places": [...]}
+    - {"type": "distances", "source": "walking", "places": [...]}, once per
+      travel mode (or "estimate") as its results arrive
+    - {"type": "response", ...QueryResponse fields}, always last on success
+    - {"type": "error", "status": 400, "detail": "..."} if the query fails
+    """
+    return StreamingResponse(_query_events(query), media_type="application/x-ndjson")
+
+
+async def _query_events(query: UserQuery):
+    """Run the query graph and yield NDJSON events as stages complete"""
+    queue: asyncio.Queue = asyncio.Queue()
+    timings = request_timings()
+    upstream_calls = track_upstream_calls()
+    start_deadline(get_request_deadline())
+    start = time.perf_counter()
+    
+    def on_stage_done(name: str, results: dict) -> None:
+        if name == "intent":
+            queue.put_nowait({
+                "type": "intent",
+                "intent": results["intent"].model_dump(),
+                "location": _search_location(results)
+            })
+        elif name == "places_search":
+            queue.put_nowait({
+                "type": "places",
+                "places": [place.model_dump() for place in results["places_search"]]
+            })
+    
+    def on_distances(source: str) -> None:
+        # Places are updated in place, so the search results hold the latest values
+        queue.put_nowait({
+            "type": "distances",
+            "source": source,
+            "places": [place.model_dump() for place in graph.results["places_search"]]
+        })
+    
+    graph = _build_query_graph(query, timings, on_stage_done=on_stage_done, on_distances=on_distances)
+    task = asyncio.create_task(graph.run())
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+    
+    try:
+        while (event := await queue.get()) is not None:
+            yield json.dumps(event) + "\n"
         
-        # Step 1: Extract intent using LLM
-        logger.info(f"Processing query: {processed_query}")
-        intent = await llm_service.extract_intent(processed_query)
+        try:
+            results = task.result()
+            response = _build_query_response(query, results, timings, upstream_calls, start)
+            event = {"type": "response", **response.model_dump()}
+        except Exception as e:
+            event = _error_event(e)
+        finally:
+            _observe_timings(timings, start)
+        yield json.dumps(event) + "\n"
+    finally:
+        # The client may disconnect mid-stream
+        if not task.done():
+            task.cancel()
+
+
+@router.post("/query/batch")
+async def batch_query(batch: BatchQueryRequest):
+    """
+    Process many queries in one request, streaming each result as it completes
+    
+    Queries run with bounded concurrency; identical queries in the batch are
+    answered once, concurrent identical geocodes and place searches share
+    one upstream call, and Distance Matrix lookups from different queries
+    are packed into multi-origin requests. Responds with NDJSON lines in
+    completion order:
+    
+    - {"type": "result", "index": 3, "status": 200, "response": {...}}
+    - {"type": "error", "index": 4, "status": 400, "detail": "..."}
+    - {"type": "summary", "queries": 10, "unique": 8, "elapsed_ms": ...}, last
+    """
+    max_items = get_batch_query_max_items()
+    if len(batch.queries) > max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch too large. Max {max_items} queries per request."
+        )
+    return StreamingResponse(_batch_events(batch.queries), media_type="application/x-ndjson")
+
+
+async def _batch_events(queries: List[UserQuery]):
+    """Run a batch of queries and yield an NDJSON line per query as each finishes"""
+    start = time.perf_counter()
+    
+    # Identical queries share one run and its result
+    groups: Dict[tuple, List[int]] = {}
+    for index, query in enumerate(queries):
+        key = (normalize_query(query.query), query.user_lat, query.user_lng)
+        groups.setdefault(key, []).append(index)
+    
+    semaphore = asyncio.Semaphore(get_batch_query_concurrency())
+    queue: asyncio.Queue = asyncio.Queue()
+    
+    async def run(indices: List[int]) -> None:
+        async with semaphore:
+            event = await _run_batch_item(queries[indices[0]])
+        queue.put_nowait((indices, event))
+    
+    tasks = [asyncio.create_task(run(indices)) for indices in groups.values()]
+    try:
+        for _ in range(len(tasks)):
+            indices, event = await queue.get()
+            for index in indices:
+                yield json.dumps({"index": index, **event}) + "\n"
         
-        if not intent:
-            raise HTTPException(
-                status_code=400,
-                detail="Could not understand the query. Please try rephrasing."
-            )
+        yield json.dumps({
+            "type": "summary",
+            "queries": len(queries),
+            "unique": len(groups),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+        }) + "\n"
+    finally:
+        # The client may disconnect mid-stream
+        for task in tasks:
+            task.cancel()
+
+
+async def _run_batch_item(query: UserQuery) -> dict:
+    """Run one query of a batch and describe its outcome as an event"""
+    timings = {}
+    # Runs in its own task, so each query gets its own upstream call counts
+    upstream_calls = track_upstream_calls()
+    # Each query gets its own budget, counted from when it starts running
+    start_deadline(get_request_deadline())
+    # Interactive queries go first when the LLM is busy
+    set_priority(BATCH)
+    start = time.perf_counter()
+    try:
+        graph = _build_query_graph(query, timings, batched=True)
+        results = await graph.run()
+        response = _build_query_response(query, results, timings, upstream_calls, start)
+        return {"type": "result", "status": 200, "response": response.model_dump()}
+    except Exception as e:
+        return _error_event(e)
+    finally:
+        _observe_timings(timings, start)
+
+
+def _error_event(e: Exception) -> dict:
+    """Describe a failed query as a stream event, mirroring /query's HTTP errors"""
+    if isinstance(e, HTTPException):
+        return {"type": "error", "status": e.status_code, "detail": e.detail}
+    logger.error(f"Error processing query: {e}")
+    return {
+        "type": "error",
+        "status": 500,
+        "detail": f"An error occurred while processing your query: {str(e)}"
+    }
+
+
+def _build_query_response(
+    query: UserQuery,
+    results: dict,
+    timings: dict,
+    upstream_calls: dict,
+    start: float
+) -> QueryResponse:
+    """Generate the AI response text and assemble the final QueryResponse"""
+    intent = results["intent"]
+    search_location = _search_location(results)
+    places = results["distances"] if "distances" in results else results["places_search"]
+    user_location = {
+        "lat": query.user_lat,
+        "lng": query.user_lng
+    } if query.user_lat and query.user_lng else None
+    
+    if not places:
+        timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+        return QueryResponse(
+            ai_response=f"I couldn't find any {intent.query} places near {search_location}. Try a different location or search term.",
+            places=[],
+            user_location=user_location,
+            timings=timings,
+            upstream_calls=upstream_calls
+        )
+    
+    # Step 5: Generate AI response (use actual search location)
+    # Create a modified intent with the actual search location for response generation
+    response_start = time.perf_counter()
+    response_intent = LLMIntent(
+        query=intent.query,
+        location=search_location,
+        category=intent.category
+    )
+    ai_response = _generate_response(response_intent, places, has_distances=bool(query.user_lat))
+    timings["response"] = round((time.perf_counter() - response_start) * 1000, 1)
+    timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+    
+    # Step 6: Return results
+    return QueryResponse(
+        ai_response=ai_response,
+        places=places,
+        user_location=user_location,
+        timings=timings,
+        upstream_calls=upstream_calls
+    )
+
+
+def _observe_timings(timings: dict, start: float) -> None:
+    """Record a finished query's stage durations, whether it succeeded or failed"""
+    # Failed queries have no total yet; the stage that failed is timed by the graph
+    timings.setdefault("total", round((time.perf_counter() - start) * 1000, 1))
+    observe_stage_timings(timings)
+
+
+def _build_query_graph(
+    query: UserQuery,
+    timings: dict,
+    on_stage_done: Optional[Callable[[str, dict], None]] = None,
+    on_distances: Optional[Callable[[str], None]] = None,
+    batched: bool = False
+) -> StageGraph:
+    """
+    Model process_query as a stage graph
+    
+    Without coordinates the stages form a simple chain. With coordinates,
+    intent extraction starts on the raw query while reverse geocoding runs;
+    the speculative intent is kept unless it absorbed the "near me" words
+    the rewrite replaces.
+    
+    `on_stage_done` and `on_distances` let the streaming endpoint publish
+    each stage's results, and each travel mode's, as soon as they exist.
+    `batched` lets Distance Matrix lookups share requests with other
+    queries of a batch.
+    """
+    has_location = bool(query.user_lat and query.user_lng)
+    graph = StageGraph(timings, on_stage_done=on_stage_done)
+    
+    if has_location:
+        # Step 1: Reverse geocode to get location name
+        async def reverse_geocode_stage(results: dict) -> Optional[str]:
+            return await _resolve_location_name(query.user_lat, query.user_lng)
         
+        graph.add(Stage("reverse_geocode", reverse_geocode_stage))
+    
+    # Step 2: Extract intent using LLM
+    async def intent_stage(results: dict) -> LLMIntent:
+        processed_query = _rewrite_query(query.query, results.get("reverse_geocode"))
+        logger.info(f"Processing query: {processed_query}")
+        return await _extract_intent(processed_query)
+    
+    if has_location:
+        graph.add(Stage(
+            "intent",
+            intent_stage,
+            deps=("reverse_geocode",),
+            speculate=lambda: _extract_intent(query.query),
+            keep_speculation=lambda results: _rewrite_is_location_only(
+                query.query, _rewrite_query(query.query, results["reverse_geocode"])
+            ),
+            accept=lambda intent, results: not (
+                _NEAR_ME_WORDS & set(intent.query.lower().split())
+            )
+        ))
+    else:
+        graph.add(Stage("intent", intent_stage))
+    
+    # Step 3: Search for places
+    async def places_stage(results: dict) -> List[Place]:
+        intent = results["intent"]
         logger.info(f"Extracted intent: {intent}")
         
-        # Override location with user's actual location if available
-        search_location = user_location_name if user_location_name else intent.location
-        
-        # Step 2: Search for places
-        places = await google_maps_service.search_places(
+        if has_location:
+            # Search around the exact coordinates rather than geocoding
+            # the location name back into a coarser centre point
+            return await google_maps_service.search_places(
+                query=intent.query,
+                coordinates=(query.user_lat, query.user_lng),
+                max_results=5
+            )
+        return await google_maps_service.search_places(
             query=intent.query,
-            location=search_location,
+            location=intent.location,
             max_results=5
         )
-        
-        if not places:
-            return QueryResponse(
-                ai_response=f"I couldn't find any {intent.query} places near {search_location}. Try a different location or search term.",
-                places=[],
-                user_location={
-                    "lat": query.user_lat,
-                    "lng": query.user_lng
-                } if query.user_lat and query.user_lng else None
-            )
-        
-        # Step 3: Calculate distances if user location is provided
-        if query.user_lat and query.user_lng:
-            places = await google_maps_service.calculate_distances(
+    
+    graph.add(Stage("places_search", places_stage, deps=("intent",)))
+    
+    # Step 4: Calculate distances if user location is provided
+    if has_location:
+        async def distances_stage(results: dict) -> List[Place]:
+            return await google_maps_service.calculate_distances(
                 origin_lat=query.user_lat,
                 origin_lng=query.user_lng,
-                places=places
+                places=results["places_search"],
+                timings=timings,
+                on_update=on_distances,
+                batched=batched
             )
         
-        # Step 4: Generate AI response (use actual search location)
-        # Create a modified intent with the actual search location for response generation
-        from app.schemas.models import LLMIntent
-        response_intent = LLMIntent(
-            query=intent.query,
-            location=search_location,
-            category=intent.category
-        )
-        ai_response = _generate_response(response_intent, places, has_distances=bool(query.user_lat))
-        
-        # Step 5: Return results
-        return QueryResponse(
-            ai_response=ai_response,
-            places=places,
-            user_location={
-                "lat": query.user_lat,
-                "lng": query.user_lng
-            } if query.user_lat and query.user_lng else None
-        )
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error processing query: {e}")
+        graph.add(Stage("distances", distances_stage, deps=("places_search",)))
+    
+    return graph
+
+
+def _search_location(results: dict) -> str:
+    """Override the intent location with the user's actual location if available"""
+    return results.get("reverse_geocode") or results["intent"].location
+
+
+async def _extract_intent(text: str) -> LLMIntent:
+    """Extract an intent or fail the request with a 400"""
+    intent = await llm_service.extract_intent(text)
+    if not intent:
         raise HTTPException(
-            status_code=500,
-            detail=f"An error occurred while processing your query: {str(e)}"
+            status_code=400,
+            detail="Could not understand the query. Please try rephrasing."
         )
+    return intent
+
+
+async def _resolve_location_name(lat: float, lng: float) -> Optional[str]:
+    """Reverse geocode coordinates to a city-level name, or None"""
+    try:
+        geocode_result = await google_maps_service.reverse_geocode(lat, lng)
+        if geocode_result:
+            # Extract city name
+            for component in geocode_result[0].get('address_components', []):
+                if 'locality' in component.get('types', []) or 'administrative_area_level_2' in component.get('types', []):
+                    return component.get('long_name')
+    except Exception as e:
+        logger.warning(f"Could not geocode user location: {e}")
+    return None
+
+
+# Words the "near me" rewrite replaces with the user's location name
+_NEAR_ME_WORDS = {"me", "nearby"}
+
+
+def _rewrite_query(text: str, user_location_name: Optional[str]) -> str:
+    """Replace "near me" with the user's location, or append it if no location is given"""
+    if not user_location_name:
+        return text
+    
+    processed_query = text
+    # If query doesn't already specify a location, add it
+    if "near me" in text.lower() or "nearby" in text.lower():
+        processed_query = processed_query.replace("near me", f"near {user_location_name}")
+        processed_query = processed_query.replace("Near me", f"near {user_location_name}")
+        processed_query = processed_query.replace("nearby", f"near {user_location_name}")
+    elif "near" not in text.lower() and "in" not in text.lower():
+        # No location specified at all, append the user's location
+        processed_query = f"{processed_query} near {user_location_name}"
+    
+    if processed_query != text:
+        logger.info(f"Using user location '{user_location_name}': {processed_query}")
+    return processed_query
+
+
+def _rewrite_is_location_only(original: str, rewritten: str) -> bool:
+    """True when the rewrite only swapped or added location words"""
+    removed = set(original.lower().split()) - set(rewritten.lower().split())
+    return removed <= _NEAR_ME_WORDS | {"near"}
 
 
 def _generate_response(intent, places: list[Place], has_distances: bool) -> str:
@@ -150,7 +460,7 @@ def _generate_response(intent, places: list[Place], has_distances: bool) -> str:
     
     if has_distances:
         # Find the closest place
-        closest = min(places, key=lambda p: float('inf') if not p.walk_time else int(p.walk_time.split()[0]))
+        closest = min(places, key=lambda p: float('inf') if p.walk_seconds is None else p.walk_seconds)
         if closest.recommended_transport:
             response += f"The closest is {closest.name}, best reached by {closest.recommended_transport}."
     else:
@@ -173,8 +483,8 @@ async def reverse_geocode(location: LocationRequest):
     try:
         logger.info(f"Reverse geocoding: {location.lat}, {location.lng}")
         
-        # Use Google Maps client to reverse geocode
-        result = google_maps_service.client.reverse_geocode((location.lat, location.lng))
+        # Use Google Maps service to reverse geocode
+        result = await google_maps_service.reverse_geocode(location.lat, location.lng)
         
         if not result:
             raise HTTPException(status_code=404, detail="Location not found")
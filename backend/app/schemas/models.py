@@ -1,7 +1,7 @@
 """
 Pydantic schemas for request/response validation
 """
-from typing import Optional, List
+from typing import Optional, List, Dict
 from pydantic import BaseModel, Field
 
 
@@ -12,6 +12,11 @@ class UserQuery(BaseModel):
     user_lng: Optional[float] = Field(None, description="User's longitude")
 
 
+class BatchQueryRequest(BaseModel):
+    """Many user queries processed in one request"""
+    queries: List[UserQuery] = Field(..., min_length=1, description="Queries to process")
+
+
 class LLMIntent(BaseModel):
     """Structured intent extracted by LLM"""
     query: str = Field(..., description="Search query (e.g., 'ramen')")
@@ -40,7 +45,11 @@ class Place(BaseModel):
     walk_time: Optional[str] = None
     bike_time: Optional[str] = None
     drive_time: Optional[str] = None
+    walk_seconds: Optional[int] = None
+    bike_seconds: Optional[int] = None
+    drive_seconds: Optional[int] = None
     recommended_transport: Optional[str] = None
+    travel_time_source: Optional[str] = None  # "exact" (Distance Matrix) or "estimate"
     maps_url: str
 
 
@@ -49,6 +58,8 @@ class QueryResponse(BaseModel):
     ai_response: str = Field(..., description="Natural language response from AI")
     places: List[Place] = Field(default_factory=list, description="List of suggested places")
     user_location: Optional[dict] = Field(None, description="User's location used for query")
+    timings: Optional[Dict[str, float]] = Field(None, description="Stage durations in milliseconds")
+    upstream_calls: Optional[Dict[str, int]] = Field(None, description="Upstream API calls made for this request, by API")
 
 
 class HealthCheck(BaseModel):
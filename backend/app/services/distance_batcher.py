@@ -0,0 +1,154 @@
+"""
+Coalesces Distance Matrix lookups from concurrent queries into shared requests
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+from app.services.maps_client import AsyncMapsClient
+from app.utils.deadline import create_detached_task
+
+logger = logging.getLogger(__name__)
+
+LatLng = Tuple[float, float]
+
+# Distance Matrix limits per request
+MAX_ORIGINS = 25
+MAX_DESTINATIONS = 25
+MAX_ELEMENTS = 100
+
+
+@dataclass
+class _Lookup:
+    """One origin's row of destinations, waiting to be batched"""
+    origin: LatLng
+    destinations: List[LatLng]
+    future: asyncio.Future
+
+
+@dataclass
+class _Group:
+    """Lookups sharing one Distance Matrix request"""
+    origins: Dict[LatLng, int] = field(default_factory=dict)
+    destinations: Dict[LatLng, int] = field(default_factory=dict)
+    lookups: List[_Lookup] = field(default_factory=list)
+    useful: int = 0
+
+    def fits(self, lookup: _Lookup, min_fill: float) -> bool:
+        origins = len(self.origins) + (lookup.origin not in self.origins)
+        destinations = len(self.destinations) + len(
+            {d for d in lookup.destinations if d not in self.destinations}
+        )
+        elements = origins * destinations
+        if origins > MAX_ORIGINS or destinations > MAX_DESTINATIONS or elements > MAX_ELEMENTS:
+            return False
+        # Every origin gets every destination, so unrelated lookups waste
+        # billed elements; only merge while most of the matrix is wanted
+        return (self.useful + len(lookup.destinations)) / elements >= min_fill
+
+    def add(self, lookup: _Lookup) -> None:
+        self.origins.setdefault(lookup.origin, len(self.origins))
+        for destination in lookup.destinations:
+            self.destinations.setdefault(destination, len(self.destinations))
+        self.lookups.append(lookup)
+        self.useful += len(lookup.destinations)
+
+
+class DistanceMatrixBatcher:
+    """
+    Groups single-origin Distance Matrix lookups into multi-origin requests
+
+    Lookups for the same mode that arrive within `window` seconds are packed
+    first-fit into requests of at most 25 origins, 25 destinations and 100
+    elements. A lookup joins a request only while at least `min_fill` of the
+    resulting matrix is actually needed, so batching never multiplies the
+    elements billed by much. Each caller gets back just its own row.
+    """
+
+    def __init__(self, client: AsyncMapsClient, window: float = 0.02, min_fill: float = 0.5):
+        self.client = client
+        self.window = window
+        self.min_fill = min_fill
+        self._pending: Dict[str, List[_Lookup]] = {}
+        self._flushes: Dict[str, asyncio.Task] = {}
+
+        self.lookups = 0
+        self.requests = 0
+        self.elements = 0
+
+    async def elements_for(self, origin: LatLng, destinations: List[LatLng], mode: str) -> List[dict]:
+        """
+        Distance Matrix elements from one origin, batched with concurrent lookups
+
+        Returns:
+            One element per destination, in order
+
+        Raises:
+            MapsApiError or httpx errors from the shared request
+        """
+        if len(destinations) > MAX_DESTINATIONS:
+            # Too wide for any request on its own; split into single-row chunks
+            chunks = await asyncio.gather(*(
+                self.elements_for(origin, destinations[i:i + MAX_DESTINATIONS], mode)
+                for i in range(0, len(destinations), MAX_DESTINATIONS)
+            ))
+            return [element for chunk in chunks for element in chunk]
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(mode, []).append(_Lookup(origin, list(destinations), future))
+        self.lookups += 1
+        if mode not in self._flushes:
+            # Serves every lookup in the window, not just this caller's query
+            self._flushes[mode] = create_detached_task(self._flush(mode))
+        return await future
+
+    async def _flush(self, mode: str) -> None:
+        await asyncio.sleep(self.window)
+        self._flushes.pop(mode, None)
+        lookups = [lookup for lookup in self._pending.pop(mode, []) if not lookup.future.done()]
+        if not lookups:
+            return
+
+        groups: List[_Group] = []
+        for lookup in lookups:
+            for group in groups:
+                if group.fits(lookup, self.min_fill):
+                    group.add(lookup)
+                    break
+            else:
+                group = _Group()
+                group.add(lookup)
+                groups.append(group)
+
+        await asyncio.gather(*(self._send(group, mode) for group in groups))
+
+    async def _send(self, group: _Group, mode: str) -> None:
+        self.requests += 1
+        self.elements += len(group.origins) * len(group.destinations)
+        try:
+            result = await self.client.distance_matrix(
+                origins=list(group.origins),
+                destinations=list(group.destinations),
+                mode=mode
+            )
+            rows = result['rows']
+        except Exception as e:
+            for lookup in group.lookups:
+                if not lookup.future.done():
+                    lookup.future.set_exception(e)
+            return
+
+        for lookup in group.lookups:
+            if lookup.future.done():
+                continue
+            row = rows[group.origins[lookup.origin]]['elements']
+            lookup.future.set_result([row[group.destinations[d]] for d in lookup.destinations])
+
+    def stats(self) -> dict:
+        """Return lookup, request and element counters"""
+        return {
+            "lookups": self.lookups,
+            "requests": self.requests,
+            "elements": self.elements,
+            "lookups_per_request": round(self.lookups / self.requests, 2) if self.requests else 0.0,
+        }
@@ -1,72 +1,436 @@
 """
 Google Maps Service for Places and Distance Matrix APIs
 """
-import googlemaps
+import asyncio
 import logging
-from typing import List, Optional, Dict, Tuple
-from app.utils.env_config import get_google_maps_api_key
+import os
+import time
+from typing import Callable, List, Optional, Dict, Tuple
+from app.services.maps_client import AsyncMapsClient
+from app.services.distance_batcher import DistanceMatrixBatcher
+from app.services.place_index import PlaceIndex
+from app.services.place_ranker import PlaceRanker
 from app.schemas.models import Place, TransportOption
+from app.utils.cache import MISSING, TTLCache
+from app.utils.shared_cache import SharedMemoryCache
+from app.services.travel_estimator import (
+    WALK_THRESHOLD_SECONDS,
+    SpeedModel,
+    TravelEstimate,
+    TravelTimeEstimator,
+    format_distance,
+    format_duration,
+)
+from app.utils.geo import geohash_encode, haversine_m
+from app.utils.deadline import DeadlineExceeded, bounded_timeout, create_detached_task
+from app.utils.resilience import CircuitOpenError
+from app.utils.env_config import (
+    get_distance_mode_timeout,
+    get_reverse_geocode_cache_precision,
+    get_reverse_geocode_cache_ttl,
+    get_reverse_geocode_cache_max_entries,
+    get_reverse_geocode_cache_max_bytes,
+    get_places_cache_ttl,
+    get_places_cache_stale_ttl,
+    get_places_cache_negative_ttl,
+    get_places_cache_max_entries,
+    get_places_cache_max_bytes,
+    get_places_cache_precision,
+    get_places_search_mode,
+    get_place_index_path,
+    get_place_index_min_results,
+    get_place_index_max_age,
+    get_maps_cache_backend,
+    get_maps_shared_cache_dir,
+    get_maps_shared_cache_slots,
+    get_maps_shared_cache_slot_bytes,
+    get_travel_time_mode,
+    get_travel_time_hybrid_margin,
+    get_travel_time_calibration,
+    get_travel_walk_speed,
+    get_travel_bike_speed,
+    get_travel_drive_speed,
+    get_travel_detour_factor,
+    get_rank_rating_weight,
+    get_rank_distance_weight,
+    get_rank_relevance_weight,
+    get_rank_ratings_prior,
+    get_rank_distance_scale,
+    get_distance_cache_precision,
+    get_distance_cache_ttls,
+    get_distance_cache_max_entries,
+    get_distance_cache_max_bytes,
+    get_distance_batch_window,
+    get_distance_batch_min_fill,
+)
 
 logger = logging.getLogger(__name__)
 
+# Distance Matrix travel modes and the Place field each one fills
+TRAVEL_MODES = {
+    "walking": "walk_time",
+    "bicycling": "bike_time",
+    "driving": "drive_time",
+}
+
+# Numeric counterpart of each TRAVEL_MODES field, in seconds
+TRAVEL_MODE_SECONDS = {
+    "walking": "walk_seconds",
+    "bicycling": "bike_seconds",
+    "driving": "drive_seconds",
+}
+
+
+def _normalize(text: str) -> str:
+    """Normalize free text for use in cache keys"""
+    return " ".join(text.lower().split())
+
+
+def _create_cache(name: str, max_entries: int, ttl: float, max_bytes: int, stale_ttl: float = 0.0):
+    """
+    Build a cache for Maps data using the backend selected by MAPS_CACHE_BACKEND
+    
+    "shared" places the cache in a memory-mapped file that every worker on
+    the host reads, so N workers share one warm cache instead of N copies.
+    """
+    if get_maps_cache_backend() == "shared":
+        path = os.path.join(get_maps_shared_cache_dir(), f"heypico-{name}.cache")
+        try:
+            return SharedMemoryCache(
+                name=name,
+                path=path,
+                slots=get_maps_shared_cache_slots(),
+                slot_size=get_maps_shared_cache_slot_bytes(),
+                ttl=ttl,
+                stale_ttl=stale_ttl
+            )
+        except OSError as e:
+            logger.error(f"Could not open shared cache {path}, using in-process cache: {e}")
+    
+    return TTLCache(
+        name=name,
+        max_entries=max_entries,
+        ttl=ttl,
+        stale_ttl=stale_ttl,
+        max_bytes=max_bytes
+    )
+
 
 class GoogleMapsService:
     """Service for Google Maps Places and Distance Matrix APIs"""
     
     def __init__(self):
-        api_key = get_google_maps_api_key()
-        self.client = googlemaps.Client(key=api_key)
+        self.client = AsyncMapsClient()
+        self.distance_mode_timeout = get_distance_mode_timeout()
+        # Packs Distance Matrix lookups from concurrent batch queries into
+        # multi-origin requests
+        self.distance_batcher = DistanceMatrixBatcher(
+            self.client,
+            window=get_distance_batch_window(),
+            min_fill=get_distance_batch_min_fill()
+        )
+        
+        # exact: Distance Matrix for every place; estimate: local model only;
+        # hybrid: local model, verified upstream only near the walk/bike thresholds
+        self.travel_time_mode = get_travel_time_mode()
+        if self.travel_time_mode not in ("exact", "estimate", "hybrid"):
+            logger.error(f"Unknown TRAVEL_TIME_MODE '{self.travel_time_mode}'; using exact")
+            self.travel_time_mode = "exact"
+        self.travel_time_hybrid_margin = get_travel_time_hybrid_margin()
+        self.travel_estimator = TravelTimeEstimator(
+            models={
+                "walking": SpeedModel(speed=get_travel_walk_speed()),
+                "bicycling": SpeedModel(speed=get_travel_bike_speed()),
+                "driving": SpeedModel(speed=get_travel_drive_speed(), overhead=60.0),
+            },
+            detour_factor=get_travel_detour_factor(),
+            calibrate=get_travel_time_calibration()
+        )
+        # Places by where their travel times came from; "none" had no times at all
+        self.travel_time_sources = {"exact": 0, "estimate": 0, "none": 0}
+        
+        # Every candidate of a search is scored; only the top results get travel times
+        self.ranker = PlaceRanker(
+            rating_weight=get_rank_rating_weight(),
+            distance_weight=get_rank_distance_weight(),
+            relevance_weight=get_rank_relevance_weight(),
+            ratings_prior=get_rank_ratings_prior(),
+            distance_scale=get_rank_distance_scale()
+        )
+        
+        # Reverse geocode results keyed by the geohash cell of the coordinates
+        self.reverse_geocode_precision = get_reverse_geocode_cache_precision()
+        self.reverse_geocode_cache = _create_cache(
+            name="reverse_geocode",
+            max_entries=get_reverse_geocode_cache_max_entries(),
+            ttl=get_reverse_geocode_cache_ttl(),
+            max_bytes=get_reverse_geocode_cache_max_bytes()
+        )
+        
+        # Places search results keyed by normalized (query, location, radius)
+        self.places_cache = _create_cache(
+            name="places",
+            max_entries=get_places_cache_max_entries(),
+            ttl=get_places_cache_ttl(),
+            stale_ttl=get_places_cache_stale_ttl(),
+            max_bytes=get_places_cache_max_bytes()
+        )
+        self.places_negative_ttl = get_places_cache_negative_ttl()
+        # Coordinate searches share an entry per geohash cell
+        self.places_cache_precision = get_places_cache_precision()
+        
+        # Every Places API result is recorded in a persistent spatial index;
+        # in local_first mode searches are answered from it when it has
+        # enough fresh matches nearby
+        index_path = get_place_index_path()
+        self.place_index = PlaceIndex(index_path) if index_path else None
+        self.places_search_mode = get_places_search_mode()
+        self.place_index_min_results = get_place_index_min_results()
+        self.place_index_max_age = get_place_index_max_age()
+        self.place_index_hits = 0
+        self._index_writes: set = set()
+        self._places_refreshes: Dict[tuple, asyncio.Task] = {}
+        
+        # Distance Matrix elements keyed by (origin geohash cell, place_id),
+        # one cache per mode since driving times go stale much sooner
+        self.distance_cache_precision = get_distance_cache_precision()
+        distance_ttls = get_distance_cache_ttls()
+        self.distance_caches = {
+            mode: _create_cache(
+                name=f"distance_{mode}",
+                max_entries=get_distance_cache_max_entries(),
+                ttl=distance_ttls[mode],
+                max_bytes=get_distance_cache_max_bytes()
+            )
+            for mode in TRAVEL_MODES
+        }
+        # Per-mode request outcomes: every element cached, some cached, none cached
+        self.distance_cache_requests = {
+            mode: {"full_hit_requests": 0, "partial_hit_requests": 0, "miss_requests": 0}
+            for mode in TRAVEL_MODES
+        }
+    
+    async def aclose(self) -> None:
+        """Release pooled upstream connections, shared cache mappings and the place index"""
+        # Background refreshes use the client, so they must end before it closes
+        refreshes = list(self._places_refreshes.values())
+        for task in refreshes:
+            task.cancel()
+        if refreshes:
+            await asyncio.gather(*refreshes, return_exceptions=True)
+        await self.client.aclose()
+        if self._index_writes:
+            await asyncio.gather(*self._index_writes, return_exceptions=True)
+        if self.place_index is not None:
+            self.place_index.close()
+        for cache in (self.reverse_geocode_cache, self.places_cache, *self.distance_caches.values()):
+            if isinstance(cache, SharedMemoryCache):
+                cache.close()
+    
+    async def compact_place_index(self) -> None:
+        """Drop places that are too old to be served from the index"""
+        if self.place_index is None:
+            return
+        try:
+            await asyncio.to_thread(self.place_index.compact, self.place_index_max_age)
+        except Exception as e:
+            logger.warning(f"Place index compaction failed: {e}")
+    
+    async def reverse_geocode(self, lat: float, lng: float) -> List[dict]:
+        """
+        Reverse geocode coordinates using the Geocoding API
+        
+        Coordinates are snapped to a geohash cell, so repeated lookups from
+        the same neighbourhood are served from cache instead of upstream.
+        
+        Args:
+            lat: Latitude
+            lng: Longitude
+            
+        Returns:
+            List of geocoding results (empty if nothing was found)
+        """
+        cell = geohash_encode(lat, lng, self.reverse_geocode_precision)
+        cached = self.reverse_geocode_cache.get(cell)
+        if cached is not None:
+            return cached
+        
+        result = await self.client.reverse_geocode((lat, lng))
+        if result:
+            self.reverse_geocode_cache.set(cell, result)
+        return result
     
     async def search_places(
         self,
         query: str,
-        location: str,
-        max_results: int = 5
+        location: Optional[str] = None,
+        max_results: int = 5,
+        radius: int = 5000,
+        coordinates: Optional[Tuple[float, float]] = None
     ) -> List[Place]:
         """
         Search for places using Google Places API
         
+        With `coordinates` the text search is biased straight to that point;
+        otherwise `location` is forward geocoded first. Results are cached
+        per normalized query and location (the geohash cell for coordinates).
+        The whole candidate list is cached and re-ranked on every call, by
+        rating, distance to `coordinates` and name relevance.
+        Stale entries are returned immediately while a background refresh
+        runs, and empty or failed searches are cached briefly so they are
+        not retried on every request.
+        
         Args:
             query: Search query (e.g., "ramen")
             location: Location string (e.g., "Blok M Jakarta")
-            max_results: Maximum number of results to return
+            max_results: Number of top-ranked results to return
+            radius: Search radius in meters
+            coordinates: (lat, lng) to search around instead of `location`
             
         Returns:
             List of Place objects
         """
+        if coordinates is not None:
+            cell = geohash_encode(coordinates[0], coordinates[1], self.places_cache_precision)
+            key = (_normalize(query), f"@{cell}", radius)
+        elif location:
+            key = (_normalize(query), _normalize(location), radius)
+        else:
+            raise ValueError("search_places needs a location or coordinates")
+        
+        cached, is_stale = self.places_cache.lookup(key)
+        
+        if cached is MISSING:
+            cached = await self._refresh_places(key, query, location, radius, coordinates)
+        elif is_stale:
+            self._schedule_places_refresh(key, query, location, radius, coordinates)
+        
+        # Cache holds plain dicts so callers can never mutate cached places
+        return [Place(**cached[i]) for i in self.ranker.top(cached, query, max_results, coordinates)]
+    
+    async def _refresh_places(
+        self,
+        key: tuple,
+        query: str,
+        location: Optional[str],
+        radius: int,
+        coordinates: Optional[Tuple[float, float]] = None,
+        keep_stale_on_error: bool = False
+    ) -> List[dict]:
+        """Search upstream and store the results in the places cache"""
         try:
-            # First, geocode the location to get lat/lng
-            geocode_result = self.client.geocode(location)
-            
-            if not geocode_result:
-                logger.warning(f"Could not geocode location: {location}")
-                return []
-            
-            location_coords = geocode_result[0]['geometry']['location']
-            lat = location_coords['lat']
-            lng = location_coords['lng']
-            
-            # Search for places
-            places_result = self.client.places(
-                query=f"{query} near {location}",
-                location=(lat, lng),
-                radius=5000  # 5km radius
-            )
-            
-            places = []
-            results = places_result.get('results', [])[:max_results]
-            
-            for result in results:
-                place = self._parse_place(result)
-                if place:
-                    places.append(place)
-            
-            logger.info(f"Found {len(places)} places for query: {query} near {location}")
-            return places
-            
+            if coordinates is None:
+                results = await self._search_places_upstream(query, location, radius)
+            else:
+                results = await self._search_places_near(query, coordinates, radius)
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            # Nothing was asked upstream, so there is no answer worth caching
+            logger.warning(f"Skipped places search: {e}")
+            return []
         except Exception as e:
             logger.error(f"Error searching places: {e}")
+            if keep_stale_on_error:
+                return []
+            results = []
+        
+        if results:
+            self.places_cache.set(key, results)
+        else:
+            # Negative entry: short-lived and never served stale
+            self.places_cache.set(key, results, ttl=self.places_negative_ttl, stale_ttl=0.0)
+        return results
+    
+    def _schedule_places_refresh(
+        self,
+        key: tuple,
+        query: str,
+        location: Optional[str],
+        radius: int,
+        coordinates: Optional[Tuple[float, float]] = None
+    ) -> None:
+        """Refresh a stale places entry in the background, once per key"""
+        if key in self._places_refreshes:
+            return
+        
+        # Outlives the query that noticed the stale entry, so not bound by its deadline
+        task = create_detached_task(
+            self._refresh_places(key, query, location, radius, coordinates, keep_stale_on_error=True)
+        )
+        self._places_refreshes[key] = task
+        task.add_done_callback(lambda _: self._places_refreshes.pop(key, None))
+    
+    async def _search_places_upstream(self, query: str, location: str, radius: int) -> List[dict]:
+        """Geocode the location and search around it"""
+        # First, geocode the location to get lat/lng
+        geocode_result = await self.client.geocode(location)
+        
+        if not geocode_result:
+            logger.warning(f"Could not geocode location: {location}")
             return []
+        
+        location_coords = geocode_result[0]['geometry']['location']
+        lat = location_coords['lat']
+        lng = location_coords['lng']
+        
+        return await self._search_places_near(
+            query, (lat, lng), radius, text_query=f"{query} near {location}"
+        )
+    
+    async def _search_places_near(
+        self,
+        query: str,
+        coordinates: Tuple[float, float],
+        radius: int,
+        text_query: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Search around coordinates, from the place index first in local_first mode
+        
+        Args:
+            query: What to search for (e.g., "ramen")
+            coordinates: (lat, lng) to bias the search to
+            radius: Search radius in meters
+            text_query: Text sent to the Places API, defaults to `query`
+        """
+        if self.places_search_mode == "local_first" and self.place_index is not None:
+            try:
+                local = await self.place_index.search(
+                    query, coordinates[0], coordinates[1], radius, max_age=self.place_index_max_age
+                )
+            except Exception as e:
+                logger.warning(f"Place index search failed: {e}")
+                local = []
+            if len(local) >= self.place_index_min_results:
+                self.place_index_hits += 1
+                logger.info(f"Found {len(local)} indexed places for query: {query}")
+                return local
+        
+        places_result = await self.client.places(
+            query=text_query or query,
+            location=coordinates,
+            radius=radius
+        )
+        
+        places = self._parse_places(places_result)
+        logger.info(f"Found {len(places)} places for query: {text_query or query}")
+        if places and self.place_index is not None:
+            self._record_places(query, places)
+        return places
+    
+    def _record_places(self, query: str, places: List[dict]) -> None:
+        """Add places to the spatial index in the background"""
+        task = asyncio.create_task(self.place_index.add(query, places))
+        self._index_writes.add(task)
+        task.add_done_callback(self._index_writes.discard)
+    
+    def _parse_places(self, places_result: dict) -> List[dict]:
+        """Parse a text search response into place dicts"""
+        places = []
+        for result in places_result.get('results', []):
+            place = self._parse_place(result)
+            if place:
+                places.append(place.model_dump())
+        return places
     
     def _parse_place(self, result: dict) -> Optional[Place]:
         """Parse a place result from Google Maps API"""
@@ -103,15 +467,32 @@ class GoogleMapsService:
         self,
         origin_lat: float,
         origin_lng: float,
-        places: List[Place]
+        places: List[Place],
+        timings: Optional[Dict[str, float]] = None,
+        on_update: Optional[Callable[[str], None]] = None,
+        batched: bool = False
     ) -> List[Place]:
         """
         Calculate distances and travel times from origin to each place
         
+        Depending on TRAVEL_TIME_MODE the times come from Distance Matrix
+        ("exact"), from the local travel time model ("estimate"), or from the
+        model with upstream checks only for places whose recommendation is
+        too close to call ("hybrid").
+        
+        Places are updated in place as results arrive. A recommendation is
+        set as soon as the remaining modes can no longer change it. While the
+        Distance Matrix circuit is open, every mode uses the local model.
+        
         Args:
             origin_lat: Origin latitude
             origin_lng: Origin longitude
             places: List of places to calculate distances to
+            timings: Optional dict that receives per-mode durations in ms
+            on_update: Called with the travel mode (or "estimate") after each
+                batch of updates is applied to `places`
+            batched: Share Distance Matrix requests with other concurrent
+                batched calls, trading a short wait for fewer requests
             
         Returns:
             Updated list of places with distance and time information
@@ -119,60 +500,233 @@ class GoogleMapsService:
         if not places:
             return places
         
+        origin = (origin_lat, origin_lng)
+        # While Distance Matrix is unhealthy every mode falls back to the local estimate
+        upstream = self.client.available("distance_matrix")
+        if self.travel_time_mode == "exact" and upstream:
+            await self._apply_distance_matrix(origin, places, timings, on_update, batched)
+            self._count_travel_time_sources(places)
+            return places
+        
+        start = time.perf_counter()
+        estimate = self.travel_estimator.estimate(origin, [(place.lat, place.lng) for place in places])
+        exact = []
+        if self.travel_time_mode == "hybrid" and upstream:
+            exact = self.travel_estimator.borderline(estimate, self.travel_time_hybrid_margin)
+        if timings is not None:
+            timings["distance_estimate"] = round((time.perf_counter() - start) * 1000, 1)
+        
+        if exact:
+            await self._apply_distance_matrix(origin, [places[i] for i in exact], timings, on_update, batched)
+        
+        for i, place in enumerate(places):
+            # Upstream failures in hybrid mode fall back to the estimate
+            if place.recommended_transport is None:
+                self._apply_estimate(place, estimate, i)
+        if on_update is not None:
+            on_update("estimate")
+        
+        self._count_travel_time_sources(places)
+        return places
+    
+    def _count_travel_time_sources(self, places: List[Place]) -> None:
+        for place in places:
+            self.travel_time_sources[place.travel_time_source or "none"] += 1
+    
+    async def _apply_distance_matrix(
+        self,
+        origin: Tuple[float, float],
+        places: List[Place],
+        timings: Optional[Dict[str, float]] = None,
+        on_update: Optional[Callable[[str], None]] = None,
+        batched: bool = False
+    ) -> None:
+        """Fill travel fields from cached or fresh Distance Matrix elements, mode by mode"""
+        # Request all transport modes concurrently; a failed or slow mode
+        # comes back as None and simply leaves its fields unset
+        tasks = {
+            asyncio.create_task(self._cached_distance_elements(origin, places, mode, timings, batched)): mode
+            for mode in TRAVEL_MODES
+        }
+        pending_modes = set(TRAVEL_MODES)
+        durations: List[Dict[str, int]] = [{} for _ in places]
+        
         try:
-            origin = (origin_lat, origin_lng)
-            destinations = [(place.lat, place.lng) for place in places]
+            remaining = set(tasks)
+            while remaining:
+                done, remaining = await asyncio.wait(remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    mode = tasks[task]
+                    pending_modes.discard(mode)
+                    try:
+                        elements = task.result()
+                    except Exception as e:
+                        logger.error(f"Error calculating {mode} distances: {e}")
+                        elements = None
+                    self._merge_mode(places, durations, mode, elements, pending_modes)
+                    if on_update is not None:
+                        on_update(mode)
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    def _merge_mode(
+        self,
+        places: List[Place],
+        durations: List[Dict[str, int]],
+        mode: str,
+        elements: Optional[List[dict]],
+        pending_modes: set
+    ) -> None:
+        """Apply one mode's Distance Matrix elements to the places"""
+        field = TRAVEL_MODES[mode]
+        for i, place in enumerate(places):
+            if elements and i < len(elements) and elements[i].get('status') == 'OK':
+                elem = elements[i]
+                setattr(place, field, elem['duration']['text'])
+                setattr(place, TRAVEL_MODE_SECONDS[mode], elem['duration']['value'])
+                durations[i][mode] = elem['duration']['value']
+                # Prefer the walking distance, fall back to the next mode available
+                if mode == 'walking' or place.distance is None:
+                    place.distance = elem['distance']['text']
             
-            # Get distance matrix for all transport modes
-            walking = self.client.distance_matrix(
-                origins=[origin],
-                destinations=destinations,
-                mode="walking"
-            )
+            if not durations[i]:
+                continue
+            place.travel_time_source = "exact"
             
-            bicycling = self.client.distance_matrix(
-                origins=[origin],
-                destinations=destinations,
-                mode="bicycling"
+            # Determine recommended transport once pending modes can't change it
+            walk_seconds = durations[i].get('walking', float('inf'))
+            settled = walk_seconds <= WALK_THRESHOLD_SECONDS or not (
+                pending_modes & {'walking', 'bicycling'}
             )
+            if settled:
+                place.recommended_transport = self._recommend_transport(
+                    walk_seconds,
+                    durations[i].get('bicycling', float('inf')),
+                    durations[i].get('driving', float('inf'))
+                )
+    
+    def _apply_estimate(self, place: Place, estimate: TravelEstimate, i: int) -> None:
+        """Fill travel fields from the local travel time model"""
+        seconds = {mode: float(estimate.seconds[mode][i]) for mode in TRAVEL_MODES}
+        place.distance = format_distance(float(estimate.road_m[i]))
+        for mode, field in TRAVEL_MODES.items():
+            setattr(place, field, format_duration(seconds[mode]))
+            setattr(place, TRAVEL_MODE_SECONDS[mode], int(round(seconds[mode])))
+        place.travel_time_source = "estimate"
+        place.recommended_transport = self._recommend_transport(
+            seconds['walking'],
+            seconds['bicycling'],
+            seconds['driving']
+        )
+    
+    async def _cached_distance_elements(
+        self,
+        origin: Tuple[float, float],
+        places: List[Place],
+        mode: str,
+        timings: Optional[Dict[str, float]] = None,
+        batched: bool = False
+    ) -> Optional[List[dict]]:
+        """
+        Distance Matrix elements for one mode, requesting only uncached destinations
+        
+        The origin is snapped to a geohash cell, so nearby users share
+        entries. Freshly fetched elements also calibrate the local travel
+        time model.
+        
+        Returns:
+            One element per place (missing ones have a non-OK status), or
+            None if nothing was cached and the upstream request failed
+        """
+        cache = self.distance_caches[mode]
+        cell = geohash_encode(origin[0], origin[1], self.distance_cache_precision)
+        
+        elements: List[Optional[dict]] = []
+        missing = []
+        for i, place in enumerate(places):
+            cached = cache.get((cell, place.place_id)) if place.place_id else None
+            elements.append(cached)
+            if cached is None:
+                missing.append(i)
+        
+        requests = self.distance_cache_requests[mode]
+        if not missing:
+            requests["full_hit_requests"] += 1
+            return elements
+        requests["partial_hit_requests" if len(missing) < len(places) else "miss_requests"] += 1
+        
+        destinations = [(places[i].lat, places[i].lng) for i in missing]
+        fetched = await self._distance_matrix_elements(origin, destinations, mode, timings, batched)
+        if fetched is None and len(missing) == len(places):
+            return None
+        
+        fetched = fetched or []
+        straight_m = haversine_m(origin[0], origin[1], *zip(*destinations))
+        for j, i in enumerate(missing):
+            elem = fetched[j] if j < len(fetched) else None
+            if not elem or elem.get('status') != 'OK':
+                elements[i] = {"status": "UNAVAILABLE"}
+                continue
             
-            driving = self.client.distance_matrix(
+            elements[i] = elem
+            if places[i].place_id:
+                cache.set((cell, places[i].place_id), elem)
+            self.travel_estimator.observe(
+                mode, float(straight_m[j]), elem['distance']['value'], elem['duration']['value']
+            )
+        return elements
+    
+    def distance_cache_stats(self) -> Dict[str, dict]:
+        """Return per-mode Distance Matrix cache statistics"""
+        return {
+            mode: {**cache.stats(), **self.distance_cache_requests[mode]}
+            for mode, cache in self.distance_caches.items()
+        }
+    
+    async def _distance_matrix_elements(
+        self,
+        origin: Tuple[float, float],
+        destinations: List[Tuple[float, float]],
+        mode: str,
+        timings: Optional[Dict[str, float]] = None,
+        batched: bool = False
+    ) -> Optional[List[dict]]:
+        """
+        Fetch Distance Matrix elements for a single travel mode
+        
+        Returns:
+            Elements for the single origin row, or None if the mode failed
+            or exceeded its deadline
+        """
+        start = time.perf_counter()
+        try:
+            if batched:
+                # Also covers the wait for the batch window
+                return await asyncio.wait_for(
+                    self.distance_batcher.elements_for(origin, destinations, mode),
+                    timeout=bounded_timeout(self.distance_mode_timeout)
+                )
+            # The client bounds the call by DISTANCE_MODE_TIMEOUT, the adaptive
+            # timeout and the request deadline
+            result = await self.client.distance_matrix(
                 origins=[origin],
                 destinations=destinations,
-                mode="driving"
+                mode=mode
             )
-            
-            # Update each place with distance/time info
-            for i, place in enumerate(places):
-                walk_elem = walking['rows'][0]['elements'][i]
-                bike_elem = bicycling['rows'][0]['elements'][i]
-                drive_elem = driving['rows'][0]['elements'][i]
-                
-                if walk_elem['status'] == 'OK':
-                    place.distance = walk_elem['distance']['text']
-                    place.walk_time = walk_elem['duration']['text']
-                    walk_seconds = walk_elem['duration']['value']
-                    
-                if bike_elem['status'] == 'OK':
-                    place.bike_time = bike_elem['duration']['text']
-                    bike_seconds = bike_elem['duration']['value']
-                    
-                if drive_elem['status'] == 'OK':
-                    place.drive_time = drive_elem['duration']['text']
-                    drive_seconds = drive_elem['duration']['value']
-                
-                # Determine recommended transport
-                place.recommended_transport = self._recommend_transport(
-                    walk_elem.get('duration', {}).get('value', float('inf')),
-                    bike_elem.get('duration', {}).get('value', float('inf')),
-                    drive_elem.get('duration', {}).get('value', float('inf'))
-                )
-            
-            return places
-            
+            return result['rows'][0]['elements']
+        except CircuitOpenError:
+            logger.info(f"Distance Matrix circuit is open; skipping {mode}")
+            return None
+        except asyncio.TimeoutError:
+            logger.warning(f"Distance Matrix ({mode}) timed out")
+            return None
         except Exception as e:
-            logger.error(f"Error calculating distances: {e}")
-            return places
+            logger.error(f"Error calculating {mode} distances: {e}")
+            return None
+        finally:
+            if timings is not None:
+                timings[f"distance_{mode}"] = round((time.perf_counter() - start) * 1000, 1)
     
     def _recommend_transport(
         self,
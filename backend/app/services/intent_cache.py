@@ -0,0 +1,171 @@
+"""
+Two-tier cache for extracted LLM intents: in-memory LRU over SQLite
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+from app.schemas.models import LLMIntent
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """Normalize a query so trivial phrasing differences share a cache entry"""
+    return " ".join(text.lower().split()).rstrip("?!. ")
+
+
+class IntentCache:
+    """
+    Persistent cache of intents keyed by normalized query, model and prompt version
+
+    Lookups hit an in-memory LRU first and fall back to a local SQLite file,
+    so entries survive restarts. Including the model name and prompt version
+    in the key means a new LLM_MODEL or prompt change never serves old intents.
+    Entries expire `ttl` seconds after they were stored (0 keeps them forever),
+    in both tiers.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl: float = 0.0):
+        self.path = path
+        self.ttl = ttl if ttl > 0 else float("inf")
+        self.memory = TTLCache(
+            name="intent",
+            max_entries=max_entries,
+            ttl=self.ttl
+        )
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+        self.disk_hits = 0
+
+    @staticmethod
+    def make_key(query: str, model: str, prompt_version: str) -> str:
+        raw = f"{model}\0{prompt_version}\0{normalize_query(query)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, query: str, model: str, prompt_version: str) -> Optional[LLMIntent]:
+        """Return a cached intent from memory or disk, or None"""
+        key = self.make_key(query, model, prompt_version)
+        data = self.memory.get(key)
+
+        if data is None and self.path:
+            row = await asyncio.to_thread(self._load, key)
+            if row is not None:
+                data, created_at = row
+                self.disk_hits += 1
+                self.memory.set(key, data, ttl=self._ttl_left(created_at))
+
+        return LLMIntent(**data) if data is not None else None
+
+    async def set(self, query: str, model: str, prompt_version: str, intent: LLMIntent) -> None:
+        """Store an intent in both tiers"""
+        key = self.make_key(query, model, prompt_version)
+        data = intent.model_dump()
+        self.memory.set(key, data)
+
+        if self.path:
+            try:
+                await asyncio.to_thread(
+                    self._store, key, model, prompt_version, normalize_query(query), data
+                )
+            except sqlite3.Error as e:
+                logger.warning(f"Could not persist intent cache entry: {e}")
+
+    async def preload(self, model: str, prompt_version: str) -> int:
+        """
+        Warm the in-memory tier from disk
+
+        Loads the most recently stored intents for the current model and
+        prompt version, up to the in-memory entry limit.
+
+        Returns:
+            Number of intents loaded
+        """
+        if not self.path:
+            return 0
+
+        rows = await asyncio.to_thread(
+            self._load_recent, model, prompt_version, self.memory.max_entries
+        )
+        # Oldest first so the most recent entries end up most recently used
+        for key, intent_json, created_at in reversed(rows):
+            self.memory.set(key, json.loads(intent_json), ttl=self._ttl_left(created_at))
+        return len(rows)
+
+    def stats(self) -> dict:
+        """Return memory tier counters plus disk hits"""
+        return {**self.memory.stats(), "disk_hits": self.disk_hits}
+
+    def _ttl_left(self, created_at: float) -> float:
+        """Seconds a disk entry written at `created_at` stays servable"""
+        return self.ttl - (time.time() - created_at)
+
+    def _min_created_at(self) -> float:
+        return time.time() - self.ttl if self.ttl != float("inf") else 0.0
+
+    def close(self) -> None:
+        """Close the SQLite connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Called with self._lock held, from worker threads
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL lets several uvicorn workers share the file
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS intents (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    intent TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_intents_version "
+                "ON intents (model, prompt_version, created_at)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _load(self, key: str) -> Optional[Tuple[dict, float]]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT intent, created_at FROM intents WHERE key = ? AND created_at > ?",
+                (key, self._min_created_at())
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def _load_recent(self, model: str, prompt_version: str, limit: int) -> list:
+        with self._lock:
+            return self._connection().execute(
+                "SELECT key, intent, created_at FROM intents "
+                "WHERE model = ? AND prompt_version = ? AND created_at > ? "
+                "ORDER BY created_at DESC LIMIT ?",
+                (model, prompt_version, self._min_created_at(), limit)
+            ).fetchall()
+
+    def _store(self, key: str, model: str, prompt_version: str, query: str, data: dict) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO intents "
+                "(key, model, prompt_version, query, intent, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, prompt_version, query, json.dumps(data), time.time())
+            )
+            conn.commit()
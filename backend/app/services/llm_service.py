@@ -1,35 +1,60 @@
 """
 LLM Service for intent extraction using Ollama
 """
+import hashlib
 import httpx
 import json
 import logging
-from typing import Optional
+import math
+import re
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from pydantic import ValidationError
 from app.schemas.models import LLMIntent
-from app.utils.env_config import get_ollama_base_url, get_llm_model
+from app.services.intent_cache import IntentCache, normalize_query
+from app.services.rule_intent import DEFAULT_LOCATION, RuleIntentExtractor
+from app.utils.json_stream import JsonObjectScanner
+from app.utils.single_flight import SingleFlight
+from app.utils.upstream_calls import record_upstream_call
+from app.utils.metrics import (
+    LLM_EARLY_STOPS,
+    LLM_ESCALATIONS,
+    LLM_GENERATION_DURATION,
+    LLM_TIME_TO_INTENT,
+    UPSTREAM_ERRORS,
+    UPSTREAM_TIMEOUTS,
+)
+from app.utils.resilience import CircuitOpenError, UpstreamGuard, create_guard
+from app.utils.admission import AdmissionController, LoadShed, current_priority
+from app.utils.deadline import DeadlineExceeded, bounded_timeout
+from app.utils.env_config import (
+    get_ollama_base_url,
+    get_llm_model,
+    get_intent_cache_path,
+    get_intent_cache_max_entries,
+    get_intent_cache_ttl,
+    get_gazetteer_path,
+    get_rule_intent_min_confidence,
+    get_llm_streaming,
+    get_llm_max_tokens,
+    get_llm_keep_alive,
+    get_ollama_max_connections,
+    get_ollama_max_keepalive_connections,
+    get_ollama_keepalive_expiry,
+    get_ollama_connect_timeout,
+    get_ollama_read_timeout,
+    get_intent_deadline_reserve,
+    get_llm_max_concurrency,
+    get_llm_max_queue,
+    get_llm_small_model,
+    get_llm_small_max_words,
+    get_llm_escalation_min_confidence,
+)
 
 logger = logging.getLogger(__name__)
 
-
-class LLMService:
-    """Service for interacting with locally running LLM via Ollama"""
-    
-    def __init__(self):
-        self.base_url = get_ollama_base_url()
-        self.model = get_llm_model()
-        self.timeout = 30.0
-    
-    async def extract_intent(self, user_query: str) -> Optional[LLMIntent]:
-        """
-        Extract structured intent from natural language query
-        
-        Args:
-            user_query: Natural language query from user
-            
-        Returns:
-            LLMIntent object with structured data or None if extraction fails
-        """
-        system_prompt = """You are a JSON-only intent extraction system. Your ONLY job is to extract structured information from user queries about finding places.
+SYSTEM_PROMPT = """You are a JSON-only intent extraction system. Your ONLY job is to extract structured information from user queries about finding places.
 
 You must respond with ONLY valid JSON in this exact format:
 {
@@ -50,77 +75,459 @@ Example:
 User: "Where can I eat ramen near Blok M?"
 Response: {"query": "ramen", "location": "Blok M Jakarta", "category": "restaurant"}"""
 
-        user_prompt = f"Extract intent from: {user_query}"
+# Changes whenever the prompt text changes, invalidating cached intents
+PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class IntentParseError(ValueError):
+    """Raised when the LLM output does not contain a usable intent"""
+    
+    def __init__(self, message: str, raw: str):
+        super().__init__(message)
+        self.raw = raw
+
+
+def _is_upstream_failure(error: Exception) -> bool:
+    """Unusable output is the model's answer, not a sign Ollama is unhealthy"""
+    return not isinstance(error, (IntentParseError, ValidationError))
+
+
+def _stem(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith("s") else word
+
+
+def grounding_confidence(user_query: str, intent: LLMIntent) -> float:
+    """
+    Share of the intent's query and location words that the user actually wrote
+    
+    Small models tend to answer with plausible terms that are not in the
+    query. The default location the prompt asks for counts as grounded.
+    
+    Returns:
+        Confidence in [0, 1]
+    """
+    written = {_stem(word) for word in _WORD_RE.findall(user_query.lower())}
+    default_location = DEFAULT_LOCATION.lower()
+    words = [
+        word for word in _WORD_RE.findall(f"{intent.query} {intent.location}".lower())
+        if word != default_location
+    ]
+    if not words:
+        # The intent is made of defaults only
+        return 0.0
+    return sum(_stem(word) in written for word in words) / len(words)
+
+
+@dataclass
+class ModelTier:
+    """A model intents can be routed to, with its own timeout and circuit"""
+    name: str
+    model: str
+    guard: UpstreamGuard
+
+
+class LLMService:
+    """Service for interacting with locally running LLM via Ollama"""
+    
+    def __init__(self):
+        self.base_url = get_ollama_base_url()
+        self.model = get_llm_model()
+        self.keep_alive = get_llm_keep_alive()
+        self.limits = httpx.Limits(
+            max_connections=get_ollama_max_connections(),
+            max_keepalive_connections=get_ollama_max_keepalive_connections(),
+            keepalive_expiry=get_ollama_keepalive_expiry(),
+        )
+        self.timeout = httpx.Timeout(
+            get_ollama_read_timeout(),
+            connect=get_ollama_connect_timeout(),
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self.streaming = get_llm_streaming()
+        self.max_tokens = get_llm_max_tokens()
+        self.intent_cache = IntentCache(
+            path=get_intent_cache_path(),
+            max_entries=get_intent_cache_max_entries(),
+            ttl=get_intent_cache_ttl()
+        )
+        self.rule_extractor = RuleIntentExtractor.from_file(get_gazetteer_path())
+        self.rule_min_confidence = get_rule_intent_min_confidence()
         
-        try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                # Call Ollama API
-                response = await client.post(
-                    f"{self.base_url}/api/generate",
-                    json={
-                        "model": self.model,
-                        "prompt": f"{system_prompt}\n\n{user_prompt}",
-                        "stream": False,
-                        "format": "json"  # Request JSON format
-                    }
+        # Identical queries in flight at the same time share one extraction
+        self.single_flight = SingleFlight("llm_intent")
+        
+        # While Ollama is failing or too slow, queries go straight to the
+        # fallback extractor instead of queueing behind it. Each model has its
+        # own guard so the small model's latencies do not set the large one's timeout
+        self.guard = create_guard("llm", get_ollama_read_timeout(), _is_upstream_failure)
+        self.large_tier = ModelTier("large", self.model, self.guard)
+        
+        # Short queries try the small model first and escalate to the large
+        # one when its intent is invalid or not grounded in the query
+        small_model = get_llm_small_model()
+        self.small_tier = ModelTier(
+            "small",
+            small_model,
+            create_guard("llm_small", get_ollama_read_timeout(), _is_upstream_failure)
+        ) if small_model and small_model != self.model else None
+        self.small_max_words = get_llm_small_max_words()
+        self.escalation_min_confidence = get_llm_escalation_min_confidence()
+        # Cached intents are keyed by the routing setup that produced them
+        self.cache_model = f"{small_model}>{self.model}" if self.small_tier else self.model
+        self.deadline_reserve = get_intent_deadline_reserve()
+        
+        # Ollama runs few generations at once; the rest wait here, visibly and
+        # by priority, instead of queueing inside Ollama until they time out
+        self.admission = AdmissionController(
+            "llm",
+            limit=get_llm_max_concurrency(),
+            max_queue=get_llm_max_queue()
+        )
+        
+        # How often each extraction path answered a query
+        self.path_counts = {"rules": 0, "cache": 0, "llm": 0, "fallback": 0}
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the long-lived Ollama client, creating it on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self.limits,
+                timeout=self.timeout,
+            )
+        return self._client
+    
+    async def aclose(self) -> None:
+        """Close the Ollama client and the intent cache"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self.intent_cache.close()
+    
+    @property
+    def tiers(self) -> List[ModelTier]:
+        """Configured model tiers, smallest first"""
+        return [tier for tier in (self.small_tier, self.large_tier) if tier is not None]
+    
+    async def warm_up(self) -> None:
+        """
+        Load the models into Ollama memory before the first user query
+        
+        An empty prompt makes Ollama load a model without generating, and
+        keep_alive keeps it resident between queries.
+        """
+        for tier in self.tiers:
+            start = time.perf_counter()
+            try:
+                response = await self._get_client().post(
+                    "/api/generate",
+                    json={"model": tier.model, "prompt": "", "keep_alive": self.keep_alive}
                 )
                 response.raise_for_status()
-                
-                result = response.json()
-                generated_text = result.get("response", "")
-                
-                # Parse the JSON response
-                intent_data = json.loads(generated_text)
-                
-                # Validate and create LLMIntent object
-                intent = LLMIntent(**intent_data)
-                logger.info(f"Successfully extracted intent: {intent}")
-                return intent
-                
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse LLM JSON response: {e}")
-            logger.error(f"Raw response: {generated_text}")
+                logger.info(f"Warmed up {tier.model} in {time.perf_counter() - start:.1f}s")
+            except httpx.HTTPError as e:
+                logger.warning(f"Could not warm up {tier.model}: {e}")
+    
+    async def preload_intent_cache(self) -> None:
+        """Warm the in-memory intent cache from disk at startup"""
+        try:
+            loaded = await self.intent_cache.preload(self.cache_model, PROMPT_VERSION)
+            logger.info(f"Preloaded {loaded} cached intents for {self.cache_model}")
+        except Exception as e:
+            logger.warning(f"Could not preload intent cache: {e}")
+    
+    async def extract_intent(self, user_query: str) -> Optional[LLMIntent]:
+        """
+        Extract structured intent from natural language query
+        
+        Queries the rule-based classifier matches with high confidence never
+        reach the LLM. Intents produced by the LLM are cached per normalized
+        query, model and prompt version; fallback extractions are never cached.
+        
+        Args:
+            user_query: Natural language query from user
+            
+        Returns:
+            LLMIntent object with structured data or None if extraction fails
+        """
+        match = self.rule_extractor.classify(user_query)
+        if match.confidence >= self.rule_min_confidence:
+            self.path_counts["rules"] += 1
+            intent = match.to_intent()
+            logger.info(f"Rule-based intent (confidence {match.confidence}): {intent}")
+            return intent
+        
+        # The shared call runs with the first caller's admission priority, so
+        # an interactive query never waits behind a batch item's extraction
+        try:
+            return await self.single_flight.do(
+                (normalize_query(user_query), current_priority()),
+                lambda: self._extract_with_llm(user_query),
+                reserve=self.deadline_reserve
+            )
+        except DeadlineExceeded:
+            # The shared call goes on for other callers and fills the cache
+            logger.warning("No intent within this query's deadline; using fallback extraction")
+            self.path_counts["fallback"] += 1
+            return self._fallback_extraction(user_query)
+    
+    async def _extract_with_llm(self, user_query: str) -> Optional[LLMIntent]:
+        """Resolve an intent from the cache, the LLM or the fallback extractor"""
+        try:
+            cached = await self.intent_cache.get(user_query, self.cache_model, PROMPT_VERSION)
+        except Exception as e:
+            logger.warning(f"Intent cache lookup failed: {e}")
+            cached = None
+        
+        if cached:
+            self.path_counts["cache"] += 1
+            logger.info(f"Intent cache hit: {cached}")
+            return cached
+        
+        intent = await self._generate_intent(user_query)
+        if intent is None:
             # Fallback: try to extract manually
+            self.path_counts["fallback"] += 1
             return self._fallback_extraction(user_query)
+        
+        self.path_counts["llm"] += 1
+        await self.intent_cache.set(user_query, self.cache_model, PROMPT_VERSION, intent)
+        return intent
+    
+    def _route(self, user_query: str) -> ModelTier:
+        """Pick the tier to try first: the small model for short queries, if it is up"""
+        if (
+            self.small_tier is not None
+            and len(_WORD_RE.findall(user_query)) <= self.small_max_words
+            and self.small_tier.guard.available()
+        ):
+            return self.small_tier
+        return self.large_tier
+    
+    async def _generate_intent(self, user_query: str) -> Optional[LLMIntent]:
+        """
+        Ask the LLM for a structured intent
+        
+        Short queries go to the small model first. Its intent is used when it
+        validates and is grounded in the query; otherwise the query escalates
+        to the large model within the same admission slot.
+        
+        Returns:
+            LLMIntent, or None if the call or parsing failed
+        """
+        tier = self._route(user_query)
+        
+        try:
+            if not tier.guard.available():
+                raise CircuitOpenError(tier.guard.name)
+            # Time this query can spend waiting for and running a generation
+            budget = bounded_timeout(math.inf, self.deadline_reserve)
+            async with self.admission.slot(current_priority(), budget):
+                if tier is self.small_tier:
+                    intent, reason = await self._try_small_model(user_query)
+                    if intent is not None:
+                        return intent
+                    LLM_ESCALATIONS.labels(reason).inc()
+                    if not self.large_tier.guard.available():
+                        raise CircuitOpenError(self.large_tier.guard.name)
+                return await self._generate_with(self.large_tier, user_query)
+                
+        except CircuitOpenError:
+            logger.info("Ollama circuit is open; using fallback extraction")
+            return None
+            
+        except LoadShed as e:
+            logger.info(f"LLM queue shed this query ({e.reason}); using fallback extraction")
+            return None
+            
+        except TimeoutError:
+            # The guard's timeout or the request deadline ran out
+            logger.warning("No intent from Ollama within the time allowed; using fallback extraction")
+            return None
+            
+        except IntentParseError as e:
+            logger.error(f"Failed to parse LLM JSON response: {e}")
+            logger.error(f"Raw response: {e.raw}")
+            return None
+            
+        except httpx.TimeoutException as e:
+            UPSTREAM_TIMEOUTS.labels("llm").inc()
+            logger.error(f"Timed out calling Ollama: {e}")
+            return None
             
         except httpx.HTTPError as e:
+            UPSTREAM_ERRORS.labels("llm").inc()
             logger.error(f"HTTP error calling Ollama: {e}")
-            return self._fallback_extraction(user_query)
+            return None
             
         except Exception as e:
             logger.error(f"Unexpected error in LLM service: {e}")
-            return self._fallback_extraction(user_query)
+            return None
     
-    def _fallback_extraction(self, user_query: str) -> Optional[LLMIntent]:
+    async def _try_small_model(self, user_query: str) -> Tuple[Optional[LLMIntent], str]:
+        """
+        Generate with the small model and judge the result
+        
+        Returns:
+            (intent, "") when the intent can be used, else (None, escalation reason)
+        """
+        try:
+            intent = await self._generate_with(self.small_tier, user_query)
+        except (IntentParseError, ValidationError) as e:
+            logger.info(f"Small model intent invalid ({e}); escalating to {self.large_tier.model}")
+            return None, "invalid"
+        
+        confidence = grounding_confidence(user_query, intent)
+        if confidence < self.escalation_min_confidence:
+            logger.info(
+                f"Small model intent {intent} has grounding confidence {confidence:.2f}; "
+                f"escalating to {self.large_tier.model}"
+            )
+            return None, "low_confidence"
+        return intent, ""
+    
+    async def _generate_with(self, tier: ModelTier, user_query: str) -> LLMIntent:
         """
-        Simple fallback extraction when LLM fails
+        Run one generation on a tier's model under its guard
+        
+        Raises:
+            Whatever the guard or the generation raised
         """
+        user_prompt = f"Extract intent from: {user_query}"
+        payload = {
+            "model": tier.model,
+            "prompt": f"{SYSTEM_PROMPT}\n\n{user_prompt}",
+            "format": "json",  # Request JSON format
+            "keep_alive": self.keep_alive,
+            "options": {"num_predict": self.max_tokens}
+        }
+        
+        start = time.perf_counter()
+        client = self._get_client()
+        
+        async def generate() -> Tuple[LLMIntent, Optional[float]]:
+            record_upstream_call("llm")
+            # Call Ollama API
+            if self.streaming:
+                return await self._stream_intent(client, payload, start, tier.name)
+            return await self._request_intent(client, payload), None
+        
+        outcome = "error"
         try:
-            # Very basic extraction
-            query_lower = user_query.lower()
+            # Bounded by the adaptive timeout and the request deadline,
+            # leaving time for the stages that still need the intent
+            intent, time_to_intent = await tier.guard.call(generate, reserve=self.deadline_reserve)
+            outcome = "ok"
+        except (IntentParseError, ValidationError):
+            outcome = "invalid"
+            raise
+        except TimeoutError:
+            outcome = "timeout"
+            raise
+        finally:
+            LLM_GENERATION_DURATION.labels(tier.name, outcome).observe(time.perf_counter() - start)
+        
+        total = time.perf_counter() - start
+        self._record_generation(tier.name, time_to_intent if time_to_intent is not None else total, total)
+        logger.info(f"Successfully extracted intent with {tier.model}: {intent}")
+        return intent
+    
+    async def _request_intent(self, client: httpx.AsyncClient, payload: dict) -> LLMIntent:
+        """Wait for the full generation, then parse it"""
+        response = await client.post(
+            "/api/generate",
+            json={**payload, "stream": False}
+        )
+        response.raise_for_status()
+        
+        result = response.json()
+        generated_text = result.get("response", "")
+        
+        # Parse the JSON response
+        try:
+            intent_data = json.loads(generated_text)
+        except json.JSONDecodeError as e:
+            raise IntentParseError(str(e), generated_text) from e
+        
+        # Validate and create LLMIntent object
+        return LLMIntent(**intent_data)
+    
+    async def _stream_intent(
+        self,
+        client: httpx.AsyncClient,
+        payload: dict,
+        start: float,
+        tier: str
+    ) -> Tuple[LLMIntent, float]:
+        """
+        Stream the generation and stop as soon as a valid intent object is complete
+        
+        Leaving the streaming context closes the connection, which makes
+        Ollama abort the rest of the generation.
+        
+        Args:
+            tier: Model tier name, for the early stop counter
+        
+        Returns:
+            (intent, seconds from request start until the intent validated)
+        """
+        scanner = JsonObjectScanner()
+        generated = []
+        tokens = 0
+        
+        async with client.stream(
+            "POST",
+            "/api/generate",
+            json={**payload, "stream": True}
+        ) as response:
+            response.raise_for_status()
             
-            # Try to extract food type
-            food_keywords = ["ramen", "pizza", "sushi", "coffee", "burger", "noodle", "pasta"]
-            query_term = "restaurant"
-            for keyword in food_keywords:
-                if keyword in query_lower:
-                    query_term = keyword
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                text = chunk.get("response", "")
+                generated.append(text)
+                tokens += 1
+                
+                for candidate in scanner.feed(text):
+                    try:
+                        intent = LLMIntent(**json.loads(candidate))
+                    except (json.JSONDecodeError, ValidationError, TypeError):
+                        continue
+                    
+                    if not chunk.get("done"):
+                        LLM_EARLY_STOPS.labels(tier).inc()
+                    return intent, time.perf_counter() - start
+                
+                if chunk.get("done") or tokens >= self.max_tokens:
                     break
-            
-            # Try to extract location
-            location = "Jakarta"  # Default
-            if "blok m" in query_lower:
-                location = "Blok M Jakarta"
-            elif "sudirman" in query_lower:
-                location = "Sudirman Jakarta"
-            elif "menteng" in query_lower:
-                location = "Menteng Jakarta"
-            
-            return LLMIntent(
-                query=query_term,
-                location=location,
-                category="restaurant"
-            )
+        
+        raise IntentParseError(
+            f"no valid intent object after {tokens} tokens",
+            "".join(generated)
+        )
+    
+    def _record_generation(self, tier: str, time_to_intent: float, total: float) -> None:
+        """Record time-to-intent; total generation time is in heypico_llm_generation_seconds"""
+        LLM_TIME_TO_INTENT.labels(tier).observe(time_to_intent)
+        logger.info(
+            f"Intent ready after {time_to_intent * 1000:.0f} ms, "
+            f"generation closed after {total * 1000:.0f} ms"
+        )
+    
+    def _fallback_extraction(self, user_query: str) -> Optional[LLMIntent]:
+        """
+        Best-effort rule-based extraction when the LLM fails
+        
+        Uses whatever the gazetteer matched, however low the confidence,
+        and fills the gaps with the default query term and location.
+        """
+        try:
+            match = self.rule_extractor.classify(user_query)
+            return match.to_intent()
         except Exception as e:
             logger.error(f"Fallback extraction failed: {e}")
             return None
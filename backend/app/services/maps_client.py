@@ -0,0 +1,184 @@
+"""
+Async Google Maps web service client built on a shared, pooled HTTP client
+"""
+import httpx
+import logging
+from typing import List, Optional, Sequence, Tuple
+from app.utils.single_flight import SingleFlight
+from app.utils.upstream_calls import record_upstream_call
+from app.utils.metrics import UPSTREAM_ERRORS, UPSTREAM_TIMEOUTS
+from app.utils.resilience import create_guard
+from app.utils.env_config import (
+    get_google_maps_api_key,
+    get_google_maps_base_url,
+    get_maps_max_connections,
+    get_maps_max_keepalive_connections,
+    get_maps_keepalive_expiry,
+    get_maps_connect_timeout,
+    get_maps_read_timeout,
+    get_distance_mode_timeout,
+)
+
+logger = logging.getLogger(__name__)
+
+LatLng = Tuple[float, float]
+
+# Statuses that mean "no data" rather than an error
+_EMPTY_STATUSES = {"ZERO_RESULTS"}
+
+# Error statuses that reflect the service's health rather than the request
+_UNHEALTHY_STATUSES = {"UNKNOWN_ERROR", "OVER_QUERY_LIMIT"}
+
+APIS = ("geocode", "reverse_geocode", "places", "distance_matrix")
+
+
+class MapsApiError(Exception):
+    """Raised when a Google Maps web service returns an error status"""
+
+    def __init__(self, status: str, message: Optional[str] = None):
+        self.status = status
+        self.message = message
+        super().__init__(f"{status}: {message}" if message else status)
+
+
+def _is_upstream_failure(error: Exception) -> bool:
+    """Whether an error should count against the API's circuit breaker"""
+    if isinstance(error, MapsApiError):
+        return error.status in _UNHEALTHY_STATUSES
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return True
+
+
+def _format_latlng(latlng: LatLng) -> str:
+    return f"{latlng[0]},{latlng[1]}"
+
+
+class AsyncMapsClient:
+    """
+    Non-blocking client for the Geocoding, Places and Distance Matrix APIs
+
+    All calls share one httpx.AsyncClient, so connections to the Maps host
+    are pooled and kept alive across requests instead of being opened per call.
+    Concurrent identical requests are coalesced into a single upstream call.
+    Each API has its own circuit breaker and a timeout that adapts to its
+    recent latency and never outlasts the request's deadline.
+    """
+
+    def __init__(self):
+        self.api_key = get_google_maps_api_key()
+        self.base_url = get_google_maps_base_url().rstrip("/")
+        self.limits = httpx.Limits(
+            max_connections=get_maps_max_connections(),
+            max_keepalive_connections=get_maps_max_keepalive_connections(),
+            keepalive_expiry=get_maps_keepalive_expiry(),
+        )
+        read_timeout = get_maps_read_timeout()
+        self.timeout = httpx.Timeout(
+            read_timeout,
+            connect=get_maps_connect_timeout(),
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self.single_flight = SingleFlight("maps")
+        # Distance Matrix modes are fetched concurrently, each under its own deadline
+        ceilings = {api: read_timeout for api in APIS}
+        ceilings["distance_matrix"] = min(read_timeout, get_distance_mode_timeout())
+        self.guards = {api: create_guard(api, ceilings[api], _is_upstream_failure) for api in APIS}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared HTTP client, creating it on first use"""
+        if self._client is None or self._client.is_closed:
+            # All Maps endpoints live on a single host, so the pool limits
+            # double as the per-host connection limit.
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self.limits,
+                timeout=self.timeout,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, api: str, path: str, params: dict) -> dict:
+        """Call a Maps web service endpoint, sharing identical in-flight calls"""
+        key = (path, tuple(sorted(params.items())))
+        return await self.single_flight.do(key, lambda: self._send(api, path, params))
+
+    def available(self, api: str) -> bool:
+        """Whether calls to an API are going through (its circuit is not open)"""
+        return self.guards[api].available()
+
+    async def _send(self, api: str, path: str, params: dict) -> dict:
+        """Perform the HTTP request under the API's guard"""
+        return await self.guards[api].call(lambda: self._fetch(api, path, params))
+
+    async def _fetch(self, api: str, path: str, params: dict) -> dict:
+        """Perform the HTTP request and check the response status"""
+        # Coalesced callers share this call, so only the caller that made it counts it
+        record_upstream_call(api)
+        client = self._get_client()
+        try:
+            response = await client.get(path, params={**params, "key": self.api_key})
+            response.raise_for_status()
+        except httpx.TimeoutException:
+            UPSTREAM_TIMEOUTS.labels(api).inc()
+            raise
+        except httpx.HTTPError:
+            UPSTREAM_ERRORS.labels(api).inc()
+            raise
+
+        body = response.json()
+        status = body.get("status", "OK")
+        if status != "OK" and status not in _EMPTY_STATUSES:
+            UPSTREAM_ERRORS.labels(api).inc()
+            raise MapsApiError(status, body.get("error_message"))
+        return body
+
+    async def geocode(self, address: str) -> List[dict]:
+        """Forward geocode an address into a list of geocoding results"""
+        body = await self._request("geocode", "/maps/api/geocode/json", {"address": address})
+        return body.get("results", [])
+
+    async def reverse_geocode(self, latlng: LatLng) -> List[dict]:
+        """Reverse geocode a (lat, lng) pair into a list of geocoding results"""
+        body = await self._request(
+            "reverse_geocode",
+            "/maps/api/geocode/json",
+            {"latlng": _format_latlng(latlng)},
+        )
+        return body.get("results", [])
+
+    async def places(
+        self,
+        query: str,
+        location: Optional[LatLng] = None,
+        radius: Optional[int] = None
+    ) -> dict:
+        """Run a Places text search, optionally biased to a point and radius"""
+        params = {"query": query}
+        if location is not None:
+            params["location"] = _format_latlng(location)
+        if radius is not None:
+            params["radius"] = radius
+        return await self._request("places", "/maps/api/place/textsearch/json", params)
+
+    async def distance_matrix(
+        self,
+        origins: Sequence[LatLng],
+        destinations: Sequence[LatLng],
+        mode: str = "driving"
+    ) -> dict:
+        """Request a Distance Matrix for the given origins, destinations and mode"""
+        return await self._request(
+            "distance_matrix",
+            "/maps/api/distancematrix/json",
+            {
+                "origins": "|".join(_format_latlng(o) for o in origins),
+                "destinations": "|".join(_format_latlng(d) for d in destinations),
+                "mode": mode,
+            },
+        )
@@ -0,0 +1,368 @@
+"""
+Persistent spatial index of places seen in Places API responses
+"""
+import asyncio
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+from app.utils.geo import geohash_cover, geohash_encode, haversine_m
+
+logger = logging.getLogger(__name__)
+
+# Stored geohash precision; queries range-scan coarser prefixes of it
+GEOHASH_PRECISION = 9
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+_PLACE_COLUMNS = "place_id, name, address, lat, lng, rating, user_ratings_total"
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+# Finer covers scan fewer rows outside the circle; adjacent cells are
+# merged into single range scans, so the query count stays small
+_COVER_CELLS = 256
+
+
+def normalize_term(text: str) -> str:
+    """Normalize a search phrase into an index term"""
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def place_terms(query: str, name: str) -> List[str]:
+    """
+    Terms a place is findable by
+
+    The full search phrase that returned it, each word of that phrase, and
+    the words of its name (e.g. "ramen", "ichiran", "shibuya").
+    """
+    phrase = normalize_term(query)
+    terms = {phrase} if phrase else set()
+    terms.update(phrase.split())
+    terms.update(word for word in _WORD.findall(name.lower()) if len(word) >= 3)
+    return sorted(terms)
+
+
+def _prefix_ranges(cells: List[str]) -> List[Tuple[str, str]]:
+    """
+    Merge sorted geohash prefixes into [low, high) key ranges
+
+    Neighbouring cells are often consecutive in geohash order, so runs of
+    them become one index range scan.
+    """
+    ranges = []
+    previous = None
+    for cell in cells:
+        # "{" sorts right after "z", the last geohash character
+        if ranges and _successor(previous) == cell:
+            ranges[-1] = (ranges[-1][0], cell + "{")
+        else:
+            ranges.append((cell, cell + "{"))
+        previous = cell
+    return ranges
+
+
+def _successor(cell: str) -> Optional[str]:
+    """Next geohash of the same length in sort order, or None at the end"""
+    index = _BASE32.index(cell[-1])
+    if index + 1 < len(_BASE32):
+        return cell[:-1] + _BASE32[index + 1]
+    return None
+
+
+def _row_to_place(row: tuple) -> dict:
+    place_id, name, address, lat, lng, rating, user_ratings_total = row
+    return {
+        "name": name,
+        "address": address,
+        "place_id": place_id,
+        "lat": lat,
+        "lng": lng,
+        "rating": rating,
+        "user_ratings_total": user_ratings_total,
+        "maps_url": f"https://www.google.com/maps/place/?q=place_id:{place_id}",
+    }
+
+
+class PlaceIndex:
+    """
+    SQLite-backed geohash index of places, searchable by term and radius
+
+    Each place is stored once with its full-precision geohash; a separate
+    WITHOUT ROWID table maps (term, geohash, place_id), so a search is a
+    handful of prefix range scans over one clustered index, one per geohash
+    cell covering the search circle, followed by an exact vectorized
+    haversine filter. Lookups stay in the low milliseconds with millions of
+    places on disk.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+        self.searches = 0
+        self.writes = 0
+        # Indexed places as seen by this process: counted when the file is
+        # opened, after compaction and bulk loads, and kept up to date by writes
+        self.size = 0
+
+    async def search(
+        self,
+        query: str,
+        lat: float,
+        lng: float,
+        radius: float,
+        max_age: float,
+        limit: int = 20
+    ) -> List[dict]:
+        """
+        Find indexed places matching `query` within `radius` meters
+
+        Args:
+            query: Search phrase, matched as a whole term
+            lat: Centre latitude
+            lng: Centre longitude
+            radius: Radius in meters
+            max_age: Ignore places not seen in this many seconds
+            limit: Maximum number of places to return
+
+        Returns:
+            Place dicts, best rated first, then nearest
+        """
+        self.searches += 1
+        term = normalize_term(query)
+        if not term:
+            return []
+        return await asyncio.to_thread(self._search, term, lat, lng, radius, time.time() - max_age, limit)
+
+    async def add(self, query: str, places: List[dict]) -> None:
+        """Index places returned for a search phrase"""
+        rows = [(place, place_terms(query, place["name"])) for place in places if place.get("place_id")]
+        if not rows:
+            return
+        try:
+            await asyncio.to_thread(self._upsert, rows, time.time())
+            self.writes += 1
+        except sqlite3.Error as e:
+            logger.warning(f"Could not update place index: {e}")
+
+    def bulk_load(self, places: Iterable[Tuple[dict, Iterable[str]]], batch_size: int = 50000) -> int:
+        """
+        Load many (place, terms) pairs, committing in large batches
+
+        Blocking; meant for seeding the index offline or from a script.
+
+        Returns:
+            Number of places loaded
+        """
+        now = time.time()
+        loaded = 0
+        batch = []
+        with self._lock:
+            conn = self._connection()
+            conn.execute("PRAGMA synchronous=OFF")
+            try:
+                for place, terms in places:
+                    batch.append((place, list(terms)))
+                    if len(batch) >= batch_size:
+                        self._write(conn, batch, now)
+                        loaded += len(batch)
+                        batch = []
+                if batch:
+                    self._write(conn, batch, now)
+                    loaded += len(batch)
+            finally:
+                conn.execute("PRAGMA synchronous=NORMAL")
+                self.size = self._count(conn)
+        return loaded
+
+    def compact(self, max_age: float, vacuum: bool = False, chunk_size: int = 5000) -> int:
+        """
+        Drop places not seen within `max_age` seconds
+
+        Deletes in small chunks and releases the lock between them, so
+        searches keep running while a large index is compacted.
+
+        Args:
+            max_age: Age in seconds after which places are removed
+            vacuum: Also rebuild the file to return freed pages to the OS
+            chunk_size: Places deleted per transaction
+
+        Returns:
+            Number of places removed
+        """
+        cutoff = time.time() - max_age
+        removed = 0
+        while True:
+            with self._lock:
+                conn = self._connection()
+                ids = [row[0] for row in conn.execute(
+                    "SELECT place_id FROM places WHERE seen_at < ? LIMIT ?", (cutoff, chunk_size)
+                )]
+                if not ids:
+                    break
+                marks = ",".join("?" * len(ids))
+                conn.execute(f"DELETE FROM place_terms WHERE place_id IN ({marks})", ids)
+                conn.execute(f"DELETE FROM places WHERE place_id IN ({marks})", ids)
+                conn.commit()
+            removed += len(ids)
+
+        with self._lock:
+            conn = self._connection()
+            if vacuum:
+                conn.execute("VACUUM")
+            conn.execute("PRAGMA optimize")
+            self.size = self._count(conn)
+
+        if removed:
+            logger.info(f"Compacted place index: removed {removed} places older than {max_age:g}s")
+        return removed
+
+    def count(self) -> int:
+        """Number of indexed places"""
+        with self._lock:
+            return self._count(self._connection())
+
+    def stats(self) -> dict:
+        """Return search and write counters and the number of indexed places"""
+        return {"searches": self.searches, "writes": self.writes, "places": self.size}
+
+    def close(self) -> None:
+        """Close the SQLite connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Called with self._lock held, from worker threads
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL lets several uvicorn workers share the file
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS places (
+                    place_id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    address TEXT NOT NULL,
+                    lat REAL NOT NULL,
+                    lng REAL NOT NULL,
+                    rating REAL,
+                    user_ratings_total INTEGER,
+                    geohash TEXT NOT NULL,
+                    seen_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS place_terms (
+                    term TEXT NOT NULL,
+                    geohash TEXT NOT NULL,
+                    place_id TEXT NOT NULL,
+                    lat REAL NOT NULL,
+                    lng REAL NOT NULL,
+                    rating REAL,
+                    seen_at REAL NOT NULL,
+                    PRIMARY KEY (term, geohash, place_id)
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_place_terms_place ON place_terms (place_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_places_seen ON places (seen_at)")
+            conn.commit()
+            self._conn = conn
+            self.size = self._count(conn)
+        return self._conn
+
+    @staticmethod
+    def _count(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+
+    def _search(self, term: str, lat: float, lng: float, radius: float, min_seen: float, limit: int) -> List[dict]:
+        candidates = []
+        with self._lock:
+            conn = self._connection()
+            for low, high in _prefix_ranges(geohash_cover(lat, lng, radius, max_cells=_COVER_CELLS)):
+                candidates.extend(conn.execute(
+                    "SELECT place_id, lat, lng, rating FROM place_terms "
+                    "WHERE term = ? AND geohash >= ? AND geohash < ? AND seen_at >= ?",
+                    (term, low, high, min_seen)
+                ))
+            if not candidates:
+                return []
+
+            count = len(candidates)
+            lats = np.fromiter((row[1] for row in candidates), dtype=np.float64, count=count)
+            lngs = np.fromiter((row[2] for row in candidates), dtype=np.float64, count=count)
+            ratings = np.fromiter((row[3] or 0.0 for row in candidates), dtype=np.float64, count=count)
+            distances = haversine_m(lat, lng, lats, lngs)
+
+            inside = np.flatnonzero(distances <= radius)
+            # Best rated first, nearest breaking ties
+            order = inside[np.lexsort((distances[inside], -ratings[inside]))][:limit]
+            place_ids = [candidates[i][0] for i in order]
+            if not place_ids:
+                return []
+
+            marks = ",".join("?" * len(place_ids))
+            rows = conn.execute(
+                f"SELECT {_PLACE_COLUMNS} FROM places WHERE place_id IN ({marks})", place_ids
+            ).fetchall()
+
+        by_id = {row[0]: row for row in rows}
+        return [_row_to_place(by_id[place_id]) for place_id in place_ids if place_id in by_id]
+
+    def _upsert(self, rows: List[Tuple[dict, List[str]]], now: float) -> None:
+        place_ids = list({place["place_id"] for place, _ in rows})
+        marks = ",".join("?" * len(place_ids))
+        with self._lock:
+            conn = self._connection()
+            known = conn.execute(
+                f"SELECT COUNT(*) FROM places WHERE place_id IN ({marks})", place_ids
+            ).fetchone()[0]
+            self._write(conn, rows, now)
+            self.size += len(place_ids) - known
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, rows: List[Tuple[dict, List[str]]], now: float) -> None:
+        place_rows = []
+        term_rows = []
+        refreshed = []
+        for place, terms in rows:
+            place_id = place["place_id"]
+            lat, lng, rating = place["lat"], place["lng"], place.get("rating")
+            cell = geohash_encode(lat, lng, GEOHASH_PRECISION)
+            place_rows.append((
+                place_id, place["name"], place.get("address", ""),
+                lat, lng, rating, place.get("user_ratings_total"), cell, now
+            ))
+            refreshed.append((rating, now, place_id, cell))
+            term_rows.extend((term, cell, place_id, lat, lng, rating, now) for term in terms)
+
+        # Terms from earlier searches are kept and refreshed; rows under a
+        # previous location of the same place are dropped. Term rows carry
+        # coordinates, rating and freshness so searches never join.
+        conn.executemany(
+            "DELETE FROM place_terms WHERE place_id = ? AND geohash != ?",
+            [(place_id, cell) for _, _, place_id, cell in refreshed]
+        )
+        conn.executemany(
+            "UPDATE place_terms SET rating = ?, seen_at = ? WHERE place_id = ? AND geohash = ?",
+            refreshed
+        )
+        conn.executemany(
+            f"INSERT OR REPLACE INTO places ({_PLACE_COLUMNS}, geohash, seen_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            place_rows
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO place_terms (term, geohash, place_id, lat, lng, rating, seen_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            term_rows
+        )
+        conn.commit()
@@ -0,0 +1,202 @@
+"""
+Rule-based intent extraction over a gazetteer of place types and locations
+"""
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+from app.schemas.models import LLMIntent
+from app.utils.aho_corasick import AhoCorasick
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+
+# Words that introduce a location at the end of a query
+_LOCATION_PREPOSITIONS = {"near", "in", "around", "at", "by"}
+
+# Words that turn the rest of the query around; rules cannot tell what they
+# apply to, so such queries always go to the LLM
+_NEGATIONS = {"not", "no", "without", "except", "never"}
+
+# Filler words that carry no intent of their own
+_STOPWORDS = {
+    "a", "an", "the", "i", "me", "my", "we", "us", "you", "where", "what",
+    "which", "can", "could", "should", "do", "does", "is", "are", "there",
+    "any", "some", "find", "show", "get", "want", "need", "looking", "look",
+    "for", "to", "of", "with", "and", "good", "great", "best", "nice", "top",
+    "cheap", "recommend", "recommendation", "recommendations", "please",
+    "place", "places", "spot", "spots", "nearby", "near", "in", "around", "at",
+    "by", "here", "close", "closest", "nearest", "open", "now", "go", "grab",
+    "have", "try", "like", "would", "let", "s", "it", "this", "that",
+}
+
+DEFAULT_LOCATION = "Jakarta"
+DEFAULT_CATEGORY = "restaurant"
+
+
+@dataclass
+class RuleMatch:
+    """Result of the rule-based classifier"""
+    query: Optional[str]
+    location: Optional[str]
+    category: str
+    confidence: float
+    unknown_words: List[str] = field(default_factory=list)
+
+    def to_intent(self) -> LLMIntent:
+        """Build an intent, filling gaps with the same defaults as the LLM prompt"""
+        return LLMIntent(
+            query=self.query or DEFAULT_CATEGORY,
+            location=self.location or DEFAULT_LOCATION,
+            category=self.category
+        )
+
+
+class RuleIntentExtractor:
+    """
+    First-stage intent classifier
+
+    Place types and locations from a gazetteer are compiled into a single
+    Aho-Corasick automaton. A query that resolves to exactly one place type,
+    at most one gazetteer location and no unexplained words gets a high
+    confidence and can skip the LLM entirely. Confidence scores:
+
+    - place type: +0.55, -0.3 for every extra type
+    - gazetteer location: +0.45, -0.3 for every extra location
+    - words after a trailing "near"/"in" that are not in the gazetteer: +0.1;
+      they are kept as the location, but only the LLM can tell "near Kemang"
+      from "in 10 minutes", so this never reaches the default threshold
+    - no location at all: +0.2 (the default location is used)
+    - every unexplained word: -0.3, so a single one falls below 0.75
+    - any negation word, or no place type: 0
+    """
+
+    def __init__(self, gazetteer: dict):
+        self.matcher = AhoCorasick()
+
+        for entry in gazetteer.get("place_types", []):
+            value = (
+                "type",
+                entry["term"],
+                entry.get("category", DEFAULT_CATEGORY),
+                bool(entry.get("generic", False)),
+            )
+            for alias in entry.get("aliases", [entry["term"]]):
+                self._add(alias, value)
+
+        for entry in gazetteer.get("locations", []):
+            value = ("location", entry["name"])
+            for alias in entry.get("aliases", [entry["name"]]):
+                self._add(alias, value)
+
+        self.matcher.build()
+
+    @classmethod
+    def from_file(cls, path: str) -> "RuleIntentExtractor":
+        """Load a gazetteer JSON file and compile it"""
+        with open(path, encoding="utf-8") as f:
+            extractor = cls(json.load(f))
+        logger.info(f"Loaded gazetteer with {len(extractor.matcher)} patterns from {path}")
+        return extractor
+
+    def _add(self, alias: str, value: tuple) -> None:
+        normalized = " ".join(_WORD_RE.findall(alias.lower()))
+        self.matcher.add(normalized, value)
+
+    def classify(self, text: str) -> RuleMatch:
+        """
+        Classify a query
+
+        Args:
+            text: Natural language query
+
+        Returns:
+            RuleMatch with the extracted fields and a confidence in [0, 1]
+        """
+        words = _WORD_RE.findall(text)
+        lowered = [w.lower() for w in words]
+        normalized = " ".join(lowered)
+
+        # Character offset of each word start in the normalized text
+        word_at = {}
+        offset = 0
+        for index, word in enumerate(lowered):
+            word_at[offset] = index
+            offset += len(word) + 1
+
+        # Keep whole-word matches only, then pick leftmost-longest without overlaps
+        candidates = []
+        for start, end, value in self.matcher.iter_matches(normalized):
+            if start not in word_at or (end < len(normalized) and normalized[end] != " "):
+                continue
+            first = word_at[start]
+            last = first + normalized.count(" ", start, end)
+            candidates.append((first, last, value))
+        candidates.sort(key=lambda c: (c[0], c[0] - c[1]))
+
+        covered = [False] * len(words)
+        types = {}
+        generic_types = {}
+        locations = []
+        next_free = 0
+        for first, last, value in candidates:
+            if first < next_free:
+                continue
+            next_free = last + 1
+            for index in range(first, last + 1):
+                covered[index] = True
+
+            if value[0] == "type":
+                _, term, category, generic = value
+                (generic_types if generic else types)[term] = category
+            elif value[1] not in locations:
+                locations.append(value[1])
+
+        # A trailing "near X" we have no gazetteer entry for is still a location
+        tail_location = None
+        tail_start = len(words)
+        if not locations:
+            for index in range(len(words) - 1, -1, -1):
+                if lowered[index] in _LOCATION_PREPOSITIONS:
+                    tail = [
+                        i for i in range(index + 1, len(words))
+                        if not covered[i] and lowered[i] not in _STOPWORDS
+                    ]
+                    if tail and not any(covered[index + 1:]):
+                        tail_location = " ".join(words[i] for i in tail)
+                        tail_start = index + 1
+                    break
+
+        unknown_words = [
+            words[i] for i in range(tail_start)
+            if not covered[i] and lowered[i] not in _STOPWORDS and not lowered[i].isdigit()
+        ]
+
+        if not types and generic_types:
+            types = generic_types
+
+        confidence = 0.0
+        if types:
+            confidence += 0.55
+            confidence -= 0.3 * (len(types) - 1)
+        if locations:
+            confidence += 0.45
+            confidence -= 0.3 * (len(locations) - 1)
+        elif tail_location:
+            confidence += 0.1
+        else:
+            confidence += 0.2
+        confidence -= 0.3 * len(unknown_words)
+        if not types or _NEGATIONS.intersection(lowered):
+            confidence = 0.0
+
+        query = next(iter(types), None)
+        return RuleMatch(
+            query=query,
+            location=locations[0] if locations else tail_location,
+            category=types[query] if query else DEFAULT_CATEGORY,
+            confidence=round(min(max(confidence, 0.0), 1.0), 3),
+            unknown_words=unknown_words
+        )
@@ -0,0 +1,207 @@
+"""
+Local travel time estimates from straight-line distances
+"""
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from app.utils.geo import haversine_m
+
+logger = logging.getLogger(__name__)
+
+# Thresholds used by GoogleMapsService._recommend_transport
+WALK_THRESHOLD_SECONDS = 7 * 60
+BIKE_THRESHOLD_SECONDS = 10 * 60
+
+
+@dataclass
+class SpeedModel:
+    """Travel time as a fixed overhead plus road distance over a constant speed"""
+    speed: float  # meters per second
+    overhead: float = 0.0  # seconds
+
+
+@dataclass
+class TravelEstimate:
+    """Estimated distances and per-mode durations for one origin"""
+    straight_m: np.ndarray
+    road_m: np.ndarray
+    seconds: Dict[str, np.ndarray]
+
+
+def format_duration(seconds: float) -> str:
+    """Format seconds like Distance Matrix duration text, e.g. '5 mins' or '1 hour 5 mins'"""
+    minutes = max(int(round(seconds / 60)), 1)
+    hours, minutes = divmod(minutes, 60)
+
+    parts = []
+    if hours:
+        parts.append(f"{hours} hour" if hours == 1 else f"{hours} hours")
+    if minutes:
+        parts.append(f"{minutes} min" if minutes == 1 else f"{minutes} mins")
+    return " ".join(parts)
+
+
+def format_distance(meters: float) -> str:
+    """Format meters like Distance Matrix distance text, e.g. '850 m' or '1.2 km'"""
+    if meters < 1000:
+        return f"{int(round(meters))} m"
+    return f"{meters / 1000:.1f} km"
+
+
+class _LinearFit:
+    """
+    Exponentially weighted least-squares fit of y = a + b * x
+
+    Keeps only running sums, so each observation is O(1) and old traffic
+    patterns fade out as new responses arrive.
+    """
+
+    def __init__(self, decay: float = 0.995):
+        self.decay = decay
+        self.n = 0
+        self.w = 0.0
+        self.sx = 0.0
+        self.sy = 0.0
+        self.sxx = 0.0
+        self.sxy = 0.0
+
+    def add(self, x: float, y: float) -> None:
+        d = self.decay
+        self.n += 1
+        self.w = self.w * d + 1.0
+        self.sx = self.sx * d + x
+        self.sy = self.sy * d + y
+        self.sxx = self.sxx * d + x * x
+        self.sxy = self.sxy * d + x * y
+
+    def solve(self) -> Tuple[float, float]:
+        """Return (intercept, slope); slope is 0 when x has no spread"""
+        denom = self.w * self.sxx - self.sx * self.sx
+        if denom <= 1e-9:
+            return 0.0, 0.0
+        slope = (self.w * self.sxy - self.sx * self.sy) / denom
+        intercept = (self.sy - slope * self.sx) / self.w
+        return intercept, slope
+
+
+class TravelTimeEstimator:
+    """
+    Estimates distance and travel time per mode without calling upstream
+
+    Straight-line distances to every destination are computed in one
+    vectorized haversine pass, scaled by a detour factor to approximate road
+    distance, and turned into durations with a per-mode speed model. When
+    calibration is enabled, every Distance Matrix element seen by the
+    service refines the detour factor and the per-mode (overhead, speed)
+    fit, so estimates converge on local traffic conditions.
+    """
+
+    def __init__(
+        self,
+        models: Dict[str, SpeedModel],
+        detour_factor: float = 1.3,
+        calibrate: bool = True,
+        min_samples: int = 20
+    ):
+        self.models = models
+        self.detour_factor = detour_factor
+        self.calibrate = calibrate
+        self.min_samples = min_samples
+
+        self._time_fits = {mode: _LinearFit() for mode in models}
+        self._detour_fit = _LinearFit()
+        self._calibrated: Dict[str, Tuple[float, float]] = {}
+
+        self.estimates = 0
+        self.observations = 0
+
+    def estimate(self, origin: Tuple[float, float], destinations: Sequence[Tuple[float, float]]) -> TravelEstimate:
+        """
+        Estimate distances and durations from origin to every destination
+
+        Args:
+            origin: (lat, lng) of the user
+            destinations: (lat, lng) of each candidate place
+
+        Returns:
+            TravelEstimate with one array entry per destination
+        """
+        coords = np.asarray(destinations, dtype=np.float64).reshape(-1, 2)
+        straight = haversine_m(origin[0], origin[1], coords[:, 0], coords[:, 1])
+
+        seconds = {}
+        for mode, model in self.models.items():
+            overhead, seconds_per_meter = self._calibrated.get(
+                mode, (model.overhead, self.detour_factor / model.speed)
+            )
+            seconds[mode] = overhead + straight * seconds_per_meter
+
+        self.estimates += 1
+        return TravelEstimate(
+            straight_m=straight,
+            road_m=straight * self.detour_factor,
+            seconds=seconds
+        )
+
+    def borderline(self, estimate: TravelEstimate, margin: float) -> List[int]:
+        """
+        Indices whose recommended transport could flip within `margin`
+
+        A place is borderline when its estimated walk time is within the
+        relative margin of the walking threshold, or when walking is clearly
+        too long and the bike time is near the cycling threshold.
+        """
+        walk = estimate.seconds["walking"]
+        bike = estimate.seconds["bicycling"]
+
+        walk_near = np.abs(walk - WALK_THRESHOLD_SECONDS) <= margin * WALK_THRESHOLD_SECONDS
+        walk_over = walk > WALK_THRESHOLD_SECONDS * (1 + margin)
+        bike_near = np.abs(bike - BIKE_THRESHOLD_SECONDS) <= margin * BIKE_THRESHOLD_SECONDS
+        return np.flatnonzero(walk_near | (walk_over & bike_near)).tolist()
+
+    def observe(self, mode: str, straight_m: float, road_m: float, seconds: float) -> None:
+        """
+        Feed one Distance Matrix element back into the model
+
+        Args:
+            mode: Travel mode of the element
+            straight_m: Haversine distance between origin and destination
+            road_m: Distance reported by Distance Matrix
+            seconds: Duration reported by Distance Matrix
+        """
+        if not self.calibrate or mode not in self._time_fits or straight_m <= 0:
+            return
+
+        self.observations += 1
+        self._detour_fit.add(straight_m, road_m)
+
+        fit = self._time_fits[mode]
+        fit.add(straight_m, seconds)
+        if fit.n >= self.min_samples:
+            overhead, slope = fit.solve()
+            if slope > 0:
+                self._calibrated[mode] = (max(overhead, 0.0), slope)
+
+        if self._detour_fit.n >= self.min_samples and self._detour_fit.sxx > 0:
+            # Ratio through the origin: road distance scales with straight distance
+            self.detour_factor = max(self._detour_fit.sxy / self._detour_fit.sxx, 1.0)
+
+    def stats(self) -> dict:
+        """Return model parameters and usage counters"""
+        models = {}
+        for mode, model in self.models.items():
+            overhead, seconds_per_meter = self._calibrated.get(
+                mode, (model.overhead, self.detour_factor / model.speed)
+            )
+            models[mode] = {
+                "overhead_s": round(overhead, 1),
+                "straight_line_mps": round(1 / seconds_per_meter, 3),
+                "calibrated": mode in self._calibrated,
+            }
+        return {
+            "detour_factor": round(self.detour_factor, 3),
+            "estimates": self.estimates,
+            "observations": self.observations,
+            "models": models,
+        }
@@ -0,0 +1,196 @@
+"""
+Priority admission control for a scarce upstream
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, List, Optional, Tuple
+from app.utils.metrics import ADMISSION_SHED, ADMISSION_WAIT
+
+# Lower values are served first
+INTERACTIVE = 0
+BATCH = 1
+BACKGROUND = 2
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", BACKGROUND: "background"}
+
+# Priority of the current request; tasks inherit it like the deadline
+_priority: ContextVar[int] = ContextVar("priority", default=INTERACTIVE)
+
+
+def set_priority(priority: int) -> None:
+    """Set the priority of the current request"""
+    _priority.set(priority)
+
+
+def current_priority() -> int:
+    """Priority of the current request (interactive unless set)"""
+    return _priority.get()
+
+
+class LoadShed(Exception):
+    """Raised when a call is turned away instead of queued"""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        super().__init__(f"load shed: {reason}")
+
+
+class AdmissionController:
+    """
+    Concurrency limit with a bounded priority queue in front of it
+
+    At most `limit` calls hold a slot at once; the rest wait in a queue of at
+    most `max_queue`, served by priority and then arrival order. Calls are
+    shed instead of queued when:
+
+    - the queue is full and holds nothing of lower priority to displace
+      ("queue_full"; a displaced waiter is shed with "displaced")
+    - the predicted wait plus a typical slot hold time exceeds the caller's
+      budget, or the budget runs out while waiting ("deadline")
+
+    The prediction uses an exponentially weighted average of how long slots
+    are held, so it follows the upstream's current speed.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, alpha: float = 0.2):
+        self.name = name
+        self.limit = max(limit, 1)
+        self.max_queue = max_queue
+        self.alpha = alpha
+        self.active = 0
+        self.service_time: Optional[float] = None
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._queued = 0
+        self._seq = itertools.count()
+
+        self.admitted = 0
+
+    @asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE, budget: float = math.inf) -> AsyncIterator[None]:
+        """
+        Hold one slot for the duration of the block
+
+        Args:
+            priority: INTERACTIVE, BATCH or BACKGROUND
+            budget: Seconds the caller can afford to wait and be served
+
+        Raises:
+            LoadShed: If the call was turned away
+        """
+        await self._acquire(priority, budget)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            held = time.perf_counter() - start
+            self.service_time = held if self.service_time is None else (
+                self.alpha * held + (1 - self.alpha) * self.service_time
+            )
+            self._release()
+
+    def predicted_wait(self, priority: int) -> float:
+        """Expected seconds until a new call of this priority gets a slot"""
+        if self.active < self.limit and not self._queued:
+            return 0.0
+        if self.service_time is None:
+            return 0.0
+        ahead = sum(1 for p, _, future in self._waiters if p <= priority and not future.done())
+        # Slots free up limit at a time, each after about one service time
+        return (ahead // self.limit + 1) * self.service_time
+
+    def queue_depths(self) -> dict:
+        """Number of queued calls per priority name"""
+        depths = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                depths[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        return depths
+
+    def stats(self) -> dict:
+        """Return slot usage, queue depth and the service time estimate"""
+        return {
+            "name": self.name,
+            "active": self.active,
+            "limit": self.limit,
+            "queued": self._queued,
+            "admitted": self.admitted,
+            "service_time": round(self.service_time, 3) if self.service_time is not None else None,
+        }
+
+    async def _acquire(self, priority: int, budget: float) -> None:
+        label = PRIORITY_NAMES.get(priority, str(priority))
+        if self.active < self.limit and not self._queued:
+            self.active += 1
+            self.admitted += 1
+            ADMISSION_WAIT.labels(self.name, label).observe(0.0)
+            return
+
+        if self.predicted_wait(priority) + (self.service_time or 0.0) > budget:
+            self._shed(label, "deadline")
+        if self._queued >= self.max_queue and not self._displace(priority):
+            self._shed(label, "queue_full")
+
+        if len(self._waiters) > 2 * self.max_queue + self.limit:
+            # Drop entries of abandoned and displaced waiters
+            self._waiters = [entry for entry in self._waiters if not entry[2].done()]
+            heapq.heapify(self._waiters)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._queued += 1
+        start = time.perf_counter()
+        # Give up once there would be no time left to be served
+        timeout = max(budget - (self.service_time or 0.0), 0.0) if budget != math.inf else None
+        try:
+            # asyncio.wait leaves the future alone on timeout, so a slot
+            # handed over at the last moment is never lost
+            await asyncio.wait({future}, timeout=timeout)
+        except asyncio.CancelledError:
+            self._abandon(future)
+            raise
+
+        if not future.done():
+            self._abandon(future)
+            self._shed(label, "deadline")
+        future.result()
+        self.admitted += 1
+        ADMISSION_WAIT.labels(self.name, label).observe(time.perf_counter() - start)
+
+    def _release(self) -> None:
+        # Hand the slot straight to the best waiter, if any
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._queued -= 1
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def _abandon(self, future: asyncio.Future) -> None:
+        """Withdraw a waiter, passing on a slot it was given but will not use"""
+        if not future.done():
+            future.cancel()
+            self._queued -= 1
+        elif not future.cancelled() and future.exception() is None:
+            self._release()
+
+    def _displace(self, priority: int) -> bool:
+        """Shed the newest lowest-priority waiter if it ranks below `priority`"""
+        live = [entry for entry in self._waiters if not entry[2].done()]
+        if not live:
+            return False
+        worst = max(live, key=lambda entry: (entry[0], entry[1]))
+        if worst[0] <= priority:
+            return False
+        worst[2].set_exception(LoadShed("displaced"))
+        self._queued -= 1
+        ADMISSION_SHED.labels(self.name, PRIORITY_NAMES.get(worst[0], str(worst[0])), "displaced").inc()
+        return True
+
+    def _shed(self, label: str, reason: str) -> None:
+        ADMISSION_SHED.labels(self.name, label, reason).inc()
+        raise LoadShed(reason)
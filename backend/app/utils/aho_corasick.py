@@ -0,0 +1,92 @@
+"""
+Aho-Corasick multi-pattern matcher
+"""
+from collections import deque
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+class AhoCorasick:
+    """
+    Compiled automaton that finds every occurrence of many patterns in one pass
+
+    Matching cost is linear in the text length plus the number of matches,
+    independent of how many patterns were added, so large gazetteers stay cheap.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Pattern ids ending at each state (including via failure links)
+        self._out: List[List[int]] = [[]]
+        self._patterns: List[Tuple[int, Any]] = []
+        self._built = False
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def add(self, pattern: str, value: Any) -> None:
+        """Add a pattern and the value reported when it matches"""
+        if not pattern:
+            return
+
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+
+        self._out[state].append(len(self._patterns))
+        self._patterns.append((len(pattern), value))
+        self._built = False
+
+    def build(self) -> None:
+        """Compute failure links; called automatically before the first search"""
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                inherited = self._out[self._fail[next_state]]
+                if inherited:
+                    self._out[next_state] = self._out[next_state] + inherited
+
+        self._built = True
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """
+        Yield every pattern occurrence in text
+
+        Yields:
+            (start, end, value) tuples where text[start:end] is the match
+        """
+        if not self._built:
+            self.build()
+
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        patterns = self._patterns
+
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_id in out[state]:
+                length, value = patterns[pattern_id]
+                yield index + 1 - length, index + 1, value
@@ -0,0 +1,160 @@
+"""
+In-process caching utilities
+"""
+import json
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+# Sentinel returned by TTLCache.lookup when there is no usable entry
+MISSING = object()
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate the memory footprint of a JSON-like value in bytes"""
+    try:
+        return len(json.dumps(value, separators=(",", ":"), default=str))
+    except (TypeError, ValueError):
+        return sys.getsizeof(value)
+
+
+class TTLCache:
+    """
+    LRU cache with per-entry expiry, an entry limit and a memory cap
+
+    Entries are fresh for `ttl` seconds after they are written and may then
+    be served as stale for another `stale_ttl` seconds through `lookup`,
+    which lets callers refresh them in the background. When either the
+    entry limit or the byte budget is exceeded, least recently used entries
+    are evicted first.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int,
+        ttl: float,
+        max_bytes: Optional[int] = None,
+        stale_ttl: float = 0.0,
+        sizeof: Callable[[Any], int] = estimate_size
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+
+        # key -> (value, size_in_bytes, fresh_until, stale_until)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a fresh cached value, or `default` if missing or expired"""
+        value, is_stale = self.lookup(key)
+        if value is MISSING or is_stale:
+            return default
+        return value
+
+    def lookup(self, key: Hashable) -> Tuple[Any, bool]:
+        """
+        Look up an entry, including stale ones
+
+        Returns:
+            (value, is_stale) tuple; value is MISSING when there is no entry
+            or it is past its stale window
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING, False
+
+        value, _, fresh_until, stale_until = entry
+        now = time.monotonic()
+        if now >= stale_until:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return MISSING, False
+
+        self._entries.move_to_end(key)
+        if now >= fresh_until:
+            self.stale_hits += 1
+            return value, True
+
+        self.hits += 1
+        return value, False
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        stale_ttl: Optional[float] = None
+    ) -> None:
+        """
+        Store a value, evicting least recently used entries if needed
+
+        Args:
+            key: Cache key
+            value: Value to store
+            ttl: Freshness lifetime overriding the cache default
+            stale_ttl: Stale window overriding the cache default
+        """
+        size = self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Larger than the whole budget; caching it would flush everything
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        fresh_until = time.monotonic() + (self.ttl if ttl is None else ttl)
+        stale_until = fresh_until + (self.stale_ttl if stale_ttl is None else stale_ttl)
+        self._entries[key] = (value, size, fresh_until, stale_until)
+        self._bytes += size
+        self._evict()
+
+    def clear(self) -> None:
+        """Drop every entry"""
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current usage"""
+        hits = self.hits + self.stale_hits
+        lookups = hits + self.misses
+        return {
+            "name": self.name,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        size = self._entries.pop(key)[1]
+        self._bytes -= size
+
+    def _evict(self) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry[1]
+            self.evictions += 1
@@ -0,0 +1,93 @@
+"""
+Per-request latency budget shared by every stage of a query
+"""
+import asyncio
+import contextvars
+import math
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Optional
+
+# Absolute time.monotonic() deadline of the current request; tasks copy the
+# context when they are created, so every stage sees the same deadline
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when the request has no time left for another upstream call"""
+
+
+def start_deadline(budget: float) -> None:
+    """
+    Give the current request `budget` seconds (0 or less means no deadline)
+
+    Must be called before the request spawns its tasks.
+    """
+    _deadline.set(time.monotonic() + budget if budget > 0 else None)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget, or None without a deadline"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def bounded_timeout(timeout: float, reserve: float = 0.0) -> float:
+    """
+    Shrink a timeout so it ends before the request deadline
+
+    Args:
+        timeout: Timeout the caller would use without a deadline
+        reserve: Seconds to leave for stages that still have to run afterwards
+
+    Raises:
+        DeadlineExceeded: If no time is left
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    # The reserve is a preference; never squeeze a call below half the budget left
+    left = max(left - reserve, left / 2)
+    if left <= 0:
+        raise DeadlineExceeded("request deadline exceeded")
+    return min(timeout, left)
+
+
+def create_detached_task(coro: Awaitable[Any]) -> asyncio.Task:
+    """
+    Start a task that is not bound by the current request's deadline
+
+    For work shared with other requests or outliving this one, which would
+    otherwise be cut short by whichever request happened to start it.
+    Requests waiting on it bound their own wait with wait_within_deadline.
+    """
+    context = contextvars.copy_context()
+    context.run(_deadline.set, None)
+    return asyncio.create_task(coro, context=context)
+
+
+async def wait_within_deadline(future: asyncio.Future, reserve: float = 0.0) -> Any:
+    """
+    Wait for a shared future, giving up when the current request runs out of time
+
+    The future keeps running for its other waiters.
+
+    Args:
+        future: Future or task to wait for
+        reserve: Seconds of the request deadline to leave for later stages
+
+    Raises:
+        DeadlineExceeded: If the request's time ran out first
+    """
+    if remaining() is None:
+        return await asyncio.shield(future)
+    timeout = bounded_timeout(math.inf, reserve)
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+    except TimeoutError:
+        if future.done():
+            # The future itself timed out, or finished just as the wait did
+            return future.result()
+        raise DeadlineExceeded("request deadline exceeded") from None
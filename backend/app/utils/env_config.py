@@ -2,8 +2,12 @@
 Utility functions for the backend
 """
 import os
+import tempfile
 from dotenv import load_dotenv
 
+# Default location of bundled data files (gazetteer)
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
 # Load environment variables
 load_dotenv()
 
@@ -29,3 +33,423 @@ def get_ollama_base_url() -> str:
 def get_llm_model() -> str:
     """Get LLM model name from environment"""
     return get_env("LLM_MODEL", "llama3.2:latest")
+
+
+def get_env_int(key: str, default: int) -> int:
+    """Get integer environment variable with a default"""
+    return int(get_env(key, str(default)))
+
+
+def get_env_bool(key: str, default: bool) -> bool:
+    """Get boolean environment variable with a default"""
+    return get_env(key, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_env_float(key: str, default: float) -> float:
+    """Get float environment variable with a default"""
+    return float(get_env(key, str(default)))
+
+
+def get_google_maps_base_url() -> str:
+    """Get Google Maps web services base URL from environment"""
+    return get_env("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com")
+
+
+def get_maps_max_connections() -> int:
+    """Get maximum pooled connections to the Google Maps host"""
+    return get_env_int("MAPS_MAX_CONNECTIONS", 20)
+
+
+def get_maps_max_keepalive_connections() -> int:
+    """Get maximum idle keep-alive connections to the Google Maps host"""
+    return get_env_int("MAPS_MAX_KEEPALIVE_CONNECTIONS", 10)
+
+
+def get_maps_keepalive_expiry() -> float:
+    """Get idle keep-alive expiry for Google Maps connections in seconds"""
+    return get_env_float("MAPS_KEEPALIVE_EXPIRY", 30.0)
+
+
+def get_maps_connect_timeout() -> float:
+    """Get Google Maps connect timeout in seconds"""
+    return get_env_float("MAPS_CONNECT_TIMEOUT", 3.0)
+
+
+def get_maps_read_timeout() -> float:
+    """Get Google Maps read timeout in seconds"""
+    return get_env_float("MAPS_READ_TIMEOUT", 10.0)
+
+
+def get_distance_mode_timeout() -> float:
+    """Get per-mode Distance Matrix deadline in seconds"""
+    return get_env_float("DISTANCE_MODE_TIMEOUT", 5.0)
+
+
+def get_reverse_geocode_cache_precision() -> int:
+    """Get geohash precision used to snap reverse geocode cache keys"""
+    return get_env_int("REVERSE_GEOCODE_CACHE_PRECISION", 7)
+
+
+def get_reverse_geocode_cache_ttl() -> float:
+    """Get reverse geocode cache TTL in seconds"""
+    return get_env_float("REVERSE_GEOCODE_CACHE_TTL", 86400.0)
+
+
+def get_reverse_geocode_cache_max_entries() -> int:
+    """Get maximum number of cached reverse geocode results"""
+    return get_env_int("REVERSE_GEOCODE_CACHE_MAX_ENTRIES", 10000)
+
+
+def get_reverse_geocode_cache_max_bytes() -> int:
+    """Get memory cap for the reverse geocode cache in bytes"""
+    return get_env_int("REVERSE_GEOCODE_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+
+
+def get_places_cache_ttl() -> float:
+    """Get how long places search results stay fresh in seconds"""
+    return get_env_float("PLACES_CACHE_TTL", 900.0)
+
+
+def get_places_cache_stale_ttl() -> float:
+    """Get how long expired places results may be served while refreshing"""
+    return get_env_float("PLACES_CACHE_STALE_TTL", 3600.0)
+
+
+def get_places_cache_negative_ttl() -> float:
+    """Get how long empty or failed places searches are cached in seconds"""
+    return get_env_float("PLACES_CACHE_NEGATIVE_TTL", 60.0)
+
+
+def get_places_cache_max_entries() -> int:
+    """Get maximum number of cached places searches"""
+    return get_env_int("PLACES_CACHE_MAX_ENTRIES", 5000)
+
+
+def get_places_cache_max_bytes() -> int:
+    """Get memory cap for the places search cache in bytes"""
+    return get_env_int("PLACES_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+
+def get_places_cache_precision() -> int:
+    """Get geohash precision for caching searches made around coordinates"""
+    return get_env_int("PLACES_CACHE_PRECISION", 7)
+
+
+def get_places_search_mode() -> str:
+    """Get places search mode: upstream (Places API) or local_first (place index, then Places API)"""
+    return get_env("PLACES_SEARCH_MODE", "upstream").strip().lower()
+
+
+def get_place_index_path() -> str:
+    """Get SQLite file for the spatial index of seen places; empty (the default) disables it"""
+    return get_env("PLACE_INDEX_PATH", "")
+
+
+def get_place_index_min_results() -> int:
+    """Get how many indexed places a local-first search needs to skip the Places API"""
+    return get_env_int("PLACE_INDEX_MIN_RESULTS", 5)
+
+
+def get_place_index_max_age() -> float:
+    """Get how long an indexed place counts as fresh, in seconds"""
+    return get_env_float("PLACE_INDEX_MAX_AGE", 7 * 24 * 3600.0)
+
+
+def get_intent_cache_path() -> str:
+    """Get SQLite file for the persistent intent cache (empty disables the disk tier)"""
+    return get_env("INTENT_CACHE_PATH", "intent_cache.sqlite3")
+
+
+def get_intent_cache_max_entries() -> int:
+    """Get maximum number of intents held in memory"""
+    return get_env_int("INTENT_CACHE_MAX_ENTRIES", 5000)
+
+
+def get_intent_cache_ttl() -> float:
+    """Get how long cached intents are served in seconds (0 keeps them forever)"""
+    return get_env_float("INTENT_CACHE_TTL", 30 * 24 * 3600.0)
+
+
+def get_gazetteer_path() -> str:
+    """Get gazetteer JSON file used by the rule-based intent classifier"""
+    return get_env("GAZETTEER_PATH", os.path.join(DATA_DIR, "gazetteer.json"))
+
+
+def get_rule_intent_min_confidence() -> float:
+    """Get the confidence at which rule-based intents skip the LLM"""
+    return get_env_float("RULE_INTENT_MIN_CONFIDENCE", 0.75)
+
+
+def get_llm_streaming() -> bool:
+    """Get whether Ollama generations are streamed and stopped early"""
+    return get_env_bool("LLM_STREAMING", True)
+
+
+def get_llm_max_tokens() -> int:
+    """Get the maximum number of tokens generated per intent"""
+    return get_env_int("LLM_MAX_TOKENS", 128)
+
+
+def get_llm_keep_alive() -> str:
+    """Get how long Ollama keeps the model loaded after a request (e.g. 30m, -1 for forever)"""
+    return get_env("LLM_KEEP_ALIVE", "30m")
+
+
+def get_llm_warmup() -> bool:
+    """Get whether the model is loaded with a warm-up request at startup"""
+    return get_env_bool("LLM_WARMUP", True)
+
+
+def get_ollama_max_connections() -> int:
+    """Get maximum pooled connections to Ollama"""
+    return get_env_int("OLLAMA_MAX_CONNECTIONS", 10)
+
+
+def get_ollama_max_keepalive_connections() -> int:
+    """Get maximum idle keep-alive connections to Ollama"""
+    return get_env_int("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", 5)
+
+
+def get_ollama_keepalive_expiry() -> float:
+    """Get idle keep-alive expiry for Ollama connections in seconds"""
+    return get_env_float("OLLAMA_KEEPALIVE_EXPIRY", 60.0)
+
+
+def get_ollama_connect_timeout() -> float:
+    """Get Ollama connect timeout in seconds"""
+    return get_env_float("OLLAMA_CONNECT_TIMEOUT", 2.0)
+
+
+def get_ollama_read_timeout() -> float:
+    """Get Ollama read timeout in seconds"""
+    return get_env_float("OLLAMA_READ_TIMEOUT", 30.0)
+
+
+def get_rate_limit_requests() -> int:
+    """Get default number of requests allowed per window per client"""
+    return get_env_int("RATE_LIMIT_REQUESTS", 20)
+
+
+def get_rate_limit_window() -> float:
+    """Get default rate limit window in seconds"""
+    return get_env_float("RATE_LIMIT_WINDOW", 60.0)
+
+
+def get_rate_limit_max_keys() -> int:
+    """Get maximum number of tracked rate limit keys before LRU eviction"""
+    return get_env_int("RATE_LIMIT_MAX_KEYS", 100000)
+
+
+def get_rate_limit_routes() -> str:
+    """Get per-route rate limits as comma-separated path=requests/window pairs"""
+    return get_env("RATE_LIMIT_ROUTES", "/health=120/60,/api/geocode=60/60")
+
+
+def get_rate_limit_backend() -> str:
+    """Get rate limit storage backend: memory (per worker) or redis (shared)"""
+    return get_env("RATE_LIMIT_BACKEND", "memory").strip().lower()
+
+
+def get_rate_limit_redis_url() -> str:
+    """Get Redis URL for the shared rate limit backend"""
+    return get_env("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+
+
+def get_rate_limit_redis_timeout() -> float:
+    """Get Redis socket timeout for rate limit checks in seconds"""
+    return get_env_float("RATE_LIMIT_REDIS_TIMEOUT", 0.05)
+
+
+def get_rate_limit_redis_retry_interval() -> float:
+    """Get how long to count locally after Redis fails before retrying it"""
+    return get_env_float("RATE_LIMIT_REDIS_RETRY_INTERVAL", 5.0)
+
+
+def get_maps_cache_backend() -> str:
+    """Get Maps cache backend: memory (per worker) or shared (memory-mapped, per host)"""
+    return get_env("MAPS_CACHE_BACKEND", "memory").strip().lower()
+
+
+def get_maps_shared_cache_dir() -> str:
+    """Get directory for shared cache files (tmpfs by default)"""
+    default = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return get_env("MAPS_SHARED_CACHE_DIR", default)
+
+
+def get_maps_shared_cache_slots() -> int:
+    """Get number of slots in each shared Maps cache"""
+    return get_env_int("MAPS_SHARED_CACHE_SLOTS", 16384)
+
+
+def get_maps_shared_cache_slot_bytes() -> int:
+    """Get size of each shared cache slot; larger values are not cached"""
+    return get_env_int("MAPS_SHARED_CACHE_SLOT_BYTES", 4096)
+
+
+def get_travel_time_mode() -> str:
+    """Get travel time source: exact (Distance Matrix), estimate (local model) or hybrid"""
+    return get_env("TRAVEL_TIME_MODE", "exact").strip().lower()
+
+
+def get_travel_time_hybrid_margin() -> float:
+    """Get relative band around the walk/bike thresholds that hybrid mode verifies upstream"""
+    return get_env_float("TRAVEL_TIME_HYBRID_MARGIN", 0.25)
+
+
+def get_travel_time_calibration() -> bool:
+    """Get whether Distance Matrix responses calibrate the local travel time model"""
+    return get_env_bool("TRAVEL_TIME_CALIBRATION", True)
+
+
+def get_travel_walk_speed() -> float:
+    """Get assumed walking speed in meters per second"""
+    return get_env_float("TRAVEL_WALK_SPEED", 1.3)
+
+
+def get_travel_bike_speed() -> float:
+    """Get assumed cycling speed in meters per second"""
+    return get_env_float("TRAVEL_BIKE_SPEED", 4.0)
+
+
+def get_travel_drive_speed() -> float:
+    """Get assumed urban driving speed in meters per second"""
+    return get_env_float("TRAVEL_DRIVE_SPEED", 6.0)
+
+
+def get_travel_detour_factor() -> float:
+    """Get ratio of road distance to straight-line distance"""
+    return get_env_float("TRAVEL_DETOUR_FACTOR", 1.3)
+
+
+def get_distance_cache_precision() -> int:
+    """Get geohash precision used to snap Distance Matrix origins for caching"""
+    return get_env_int("DISTANCE_CACHE_PRECISION", 7)
+
+
+def get_distance_cache_ttls() -> dict:
+    """Get Distance Matrix cache TTL in seconds per travel mode"""
+    return {
+        "walking": get_env_float("DISTANCE_CACHE_TTL_WALKING", 604800.0),
+        "bicycling": get_env_float("DISTANCE_CACHE_TTL_BICYCLING", 86400.0),
+        "driving": get_env_float("DISTANCE_CACHE_TTL_DRIVING", 900.0),
+    }
+
+
+def get_distance_cache_max_entries() -> int:
+    """Get maximum number of cached Distance Matrix elements per mode"""
+    return get_env_int("DISTANCE_CACHE_MAX_ENTRIES", 50000)
+
+
+def get_distance_cache_max_bytes() -> int:
+    """Get approximate memory budget per Distance Matrix cache in bytes"""
+    return get_env_int("DISTANCE_CACHE_MAX_BYTES", 33554432)
+
+
+def get_distance_batch_window() -> float:
+    """Get how long batched Distance Matrix lookups wait to be grouped, in seconds"""
+    return get_env_float("DISTANCE_BATCH_WINDOW", 0.02)
+
+
+def get_distance_batch_min_fill() -> float:
+    """Get minimum share of a grouped Distance Matrix that must be needed elements"""
+    return get_env_float("DISTANCE_BATCH_MIN_FILL", 0.5)
+
+
+def get_batch_query_concurrency() -> int:
+    """Get how many queries of a batch are processed at once"""
+    return get_env_int("BATCH_QUERY_CONCURRENCY", 8)
+
+
+def get_batch_query_max_items() -> int:
+    """Get maximum number of queries accepted in one batch request"""
+    return get_env_int("BATCH_QUERY_MAX_ITEMS", 1000)
+
+
+def get_metrics_loop_lag_interval() -> float:
+    """Get how often event loop lag is sampled, in seconds (0 disables it)"""
+    return get_env_float("METRICS_LOOP_LAG_INTERVAL", 0.5)
+
+
+def get_request_deadline() -> float:
+    """Get the latency budget of one query in seconds (0 disables it)"""
+    return get_env_float("REQUEST_DEADLINE", 10.0)
+
+
+def get_intent_deadline_reserve() -> float:
+    """Get seconds of the query budget kept for places search and distances while the LLM runs"""
+    return get_env_float("INTENT_DEADLINE_RESERVE", 3.0)
+
+
+def get_upstream_timeout_percentile() -> float:
+    """Get the latency percentile adaptive upstream timeouts are based on"""
+    return get_env_float("UPSTREAM_TIMEOUT_PERCENTILE", 99.0)
+
+
+def get_upstream_timeout_multiplier() -> float:
+    """Get the factor applied to that percentile to get the timeout"""
+    return get_env_float("UPSTREAM_TIMEOUT_MULTIPLIER", 2.0)
+
+
+def get_upstream_timeout_floor() -> float:
+    """Get the lowest adaptive upstream timeout in seconds"""
+    return get_env_float("UPSTREAM_TIMEOUT_FLOOR", 0.25)
+
+
+def get_circuit_failure_threshold() -> int:
+    """Get consecutive upstream failures that open its circuit"""
+    return get_env_int("CIRCUIT_FAILURE_THRESHOLD", 5)
+
+
+def get_circuit_reset_timeout() -> float:
+    """Get seconds an open circuit waits before letting a probe through"""
+    return get_env_float("CIRCUIT_RESET_TIMEOUT", 10.0)
+
+
+def get_llm_max_concurrency() -> int:
+    """Get how many generations are sent to Ollama at once"""
+    return get_env_int("LLM_MAX_CONCURRENCY", 2)
+
+
+def get_llm_max_queue() -> int:
+    """Get how many extractions may wait for an Ollama slot"""
+    return get_env_int("LLM_MAX_QUEUE", 32)
+
+
+def get_llm_small_model() -> str:
+    """Get the fast model tried first for simple queries (empty disables routing)"""
+    return get_env("LLM_SMALL_MODEL", "")
+
+
+def get_llm_small_max_words() -> int:
+    """Get the longest query, in words, routed to the small model"""
+    return get_env_int("LLM_SMALL_MAX_WORDS", 8)
+
+
+def get_llm_escalation_min_confidence() -> float:
+    """Get the grounding confidence below which a small-model intent is escalated"""
+    return get_env_float("LLM_ESCALATION_MIN_CONFIDENCE", 0.5)
+
+
+def get_rank_rating_weight() -> float:
+    """Get the weight of the confidence-weighted rating in place ranking"""
+    return get_env_float("RANK_RATING_WEIGHT", 1.0)
+
+
+def get_rank_distance_weight() -> float:
+    """Get the weight of straight-line closeness to the user in place ranking"""
+    return get_env_float("RANK_DISTANCE_WEIGHT", 1.0)
+
+
+def get_rank_relevance_weight() -> float:
+    """Get the weight of query words matched in the place name in place ranking"""
+    return get_env_float("RANK_RELEVANCE_WEIGHT", 0.5)
+
+
+def get_rank_ratings_prior() -> float:
+    """Get how many ratings a place needs before its own rating counts as much as the mean"""
+    return get_env_float("RANK_RATINGS_PRIOR", 50.0)
+
+
+def get_rank_distance_scale() -> float:
+    """Get the distance in meters over which closeness decays by a factor of e"""
+    return get_env_float("RANK_DISTANCE_SCALE", 1500.0)
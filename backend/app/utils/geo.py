@@ -0,0 +1,130 @@
+"""
+Geospatial helpers shared by the caching layers and travel estimates
+"""
+import math
+from typing import List, Tuple
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat: float, lng: float, precision: int = 7) -> str:
+    """
+    Encode coordinates as a geohash string
+
+    Every coordinate inside the same cell maps to the same hash, so the
+    hash can be used to snap nearby points onto one cache key.
+    Precision 6 is roughly 1.2 km x 0.6 km, precision 7 roughly 150 m x 150 m.
+
+    Args:
+        lat: Latitude in degrees
+        lng: Longitude in degrees
+        precision: Number of geohash characters
+
+    Returns:
+        Geohash string of the given length
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if lng >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if lat >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def haversine_m(lat: float, lng: float, lats, lngs) -> np.ndarray:
+    """
+    Great-circle distances from one point to many, in meters
+
+    Vectorized over the destination arrays, so a whole candidate list is
+    measured in a handful of NumPy operations.
+
+    Args:
+        lat: Origin latitude in degrees
+        lng: Origin longitude in degrees
+        lats: Destination latitudes in degrees
+        lngs: Destination longitudes in degrees
+
+    Returns:
+        Array of distances in meters, one per destination
+    """
+    lat1 = np.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    dlat = lat2 - lat1
+    dlng = np.radians(np.asarray(lngs, dtype=np.float64) - lng)
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """Return the (lat, lng) size in degrees of a geohash cell"""
+    bits = 5 * precision
+    lng_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def geohash_cover(lat: float, lng: float, radius_m: float, max_cells: int = 16) -> List[str]:
+    """
+    Geohash cells that together cover a circle
+
+    Picks the finest precision whose covering set of the circle's bounding
+    box stays within `max_cells`, so callers can range-scan each cell as a
+    string prefix.
+
+    Args:
+        lat: Centre latitude in degrees
+        lng: Centre longitude in degrees
+        radius_m: Radius in meters
+        max_cells: Upper bound on the number of cells returned
+
+    Returns:
+        Geohash prefixes covering the circle
+    """
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    west, east = max(lng - dlng, -180.0), min(lng + dlng, 180.0 - 1e-9)
+
+    for precision in range(9, 0, -1):
+        cell_lat, cell_lng = geohash_cell_size(precision)
+        rows = math.ceil((north - south) / cell_lat) + 1
+        cols = math.ceil((east - west) / cell_lng) + 1
+        if rows * cols <= max_cells or precision == 1:
+            break
+
+    # Sample points no further apart than one cell, plus the far edges,
+    # so every cell the box touches is hit at least once
+    lats = [min(south + i * cell_lat, north) for i in range(rows)]
+    lngs = [min(west + j * cell_lng, east) for j in range(cols)]
+    return sorted({geohash_encode(a, b, precision) for a in lats for b in lngs})
@@ -0,0 +1,59 @@
+"""
+Incremental JSON object scanning for streamed LLM output
+"""
+from typing import List
+
+
+class JsonObjectScanner:
+    """
+    Detects complete top-level JSON objects in a stream of text chunks
+
+    Only brace depth, strings and escapes are tracked, which is enough to
+    know where an object ends without re-parsing the whole buffer per token.
+    Text outside of objects is ignored.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> List[str]:
+        """
+        Consume a chunk of text
+
+        Returns:
+            Source text of every object completed by this chunk
+        """
+        completed = []
+        for char in chunk:
+            if self._depth == 0:
+                if char != "{":
+                    continue
+                self._buffer = []
+
+            self._buffer.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.append("".join(self._buffer))
+                    self._buffer = []
+
+        return completed
+
+    def text(self) -> str:
+        """Return the partial object buffered so far"""
+        return "".join(self._buffer)
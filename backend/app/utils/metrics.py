@@ -0,0 +1,350 @@
+"""
+Lightweight Prometheus-format metrics
+"""
+import asyncio
+import logging
+import math
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans cache hits (sub-millisecond) up to slow LLM generations
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _escape_help(text: str) -> str:
+    # HELP text escapes backslashes and newlines, but not quotes
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    """A named metric family rendered in the Prometheus text format"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {_escape_help(self.documentation)}", f"# TYPE {self.name} {self.type}"]
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        """Return the exposition lines for this metric family"""
+
+
+class _ChildMetric(_Metric):
+    """Metric that keeps one child per combination of label values"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._children: Dict[LabelValues, object] = {}
+
+    def labels(self, *values: str):
+        """Return the child for these label values, creating it on first use"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """Create the value holder for a new combination of label values"""
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for values, child in self._children.items():
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    @abstractmethod
+    def _render_child(self, values: LabelValues, child) -> List[str]:
+        """Return the sample lines of one child"""
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Counter(_ChildMetric):
+    """Monotonically increasing count"""
+
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increment the unlabelled counter"""
+        self.labels().inc(amount)
+
+    def _render_child(self, values: LabelValues, child: _CounterChild) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "count")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        # One slot per bucket plus the +Inf overflow
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        # Per-bucket counts; cumulative totals are only computed when scraped
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_ChildMetric):
+    """Distribution of observed values in fixed buckets"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        """Observe a value on the unlabelled histogram"""
+        self.labels().observe(value)
+
+    def _render_child(self, values: LabelValues, child: _HistogramChild) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), child.counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Gauge(_ChildMetric):
+    """Value that can go up and down"""
+
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        """Set the unlabelled gauge"""
+        self.labels().set(value)
+
+    def _render_child(self, values: LabelValues, child: _GaugeChild) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class CallbackMetric(_Metric):
+    """
+    Metric whose samples are read from existing counters at scrape time
+
+    Used for statistics services already keep (cache hits, limiter
+    rejections), so the hot path pays nothing extra for exporting them.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        type: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Iterable[Tuple[LabelValues, float]]]
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.type = type
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        try:
+            for values, value in self.collect():
+                lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+        except Exception as e:
+            logger.warning(f"Could not collect metric {self.name}: {e}")
+        return lines
+
+
+class Registry:
+    """Set of metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "heypico_stage_duration_seconds",
+    "Duration of each query pipeline stage",
+    ("stage",)
+))
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "heypico_http_request_duration_seconds",
+    "Time to response headers per route",
+    ("method", "path", "status")
+))
+UPSTREAM_ERRORS = REGISTRY.register(Counter(
+    "heypico_upstream_errors_total",
+    "Failed upstream API calls, excluding timeouts",
+    ("api",)
+))
+UPSTREAM_TIMEOUTS = REGISTRY.register(Counter(
+    "heypico_upstream_timeouts_total",
+    "Upstream API calls that timed out or missed their deadline",
+    ("api",)
+))
+RATE_LIMIT_REJECTIONS = REGISTRY.register(Counter(
+    "heypico_rate_limit_rejections_total",
+    "Requests rejected by the rate limiter",
+    ("bucket",)
+))
+ADMISSION_WAIT = REGISTRY.register(Histogram(
+    "heypico_admission_wait_seconds",
+    "Time spent queued for an upstream slot",
+    ("upstream", "priority")
+))
+ADMISSION_SHED = REGISTRY.register(Counter(
+    "heypico_admission_shed_total",
+    "Calls turned away before reaching the upstream",
+    ("upstream", "priority", "reason")
+))
+LLM_GENERATION_DURATION = REGISTRY.register(Histogram(
+    "heypico_llm_generation_seconds",
+    "Intent generation time per model tier and outcome",
+    ("tier", "outcome")
+))
+LLM_TIME_TO_INTENT = REGISTRY.register(Histogram(
+    "heypico_llm_time_to_intent_seconds",
+    "Time from sending a generation until a valid intent was parsed, per model tier",
+    ("tier",)
+))
+LLM_EARLY_STOPS = REGISTRY.register(Counter(
+    "heypico_llm_early_stops_total",
+    "Streamed generations closed before Ollama finished, per model tier",
+    ("tier",)
+))
+LLM_ESCALATIONS = REGISTRY.register(Counter(
+    "heypico_llm_escalations_total",
+    "Small-model intents handed to the large model, by reason",
+    ("reason",)
+))
+EVENT_LOOP_LAG = REGISTRY.register(Histogram(
+    "heypico_event_loop_lag_seconds",
+    "Delay between when a periodic timer was due and when it ran",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+))
+
+# Stage durations of the current request, for the Server-Timing header
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def track_request_timings() -> Dict[str, float]:
+    """Start collecting stage durations (ms) for the current request"""
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def request_timings() -> Dict[str, float]:
+    """Stage timings dict of the current request, or a fresh one if untracked"""
+    timings = _request_timings.get()
+    return timings if timings is not None else {}
+
+
+def observe_stage_timings(timings: Dict[str, float]) -> None:
+    """Record a finished query's stage durations, given in milliseconds"""
+    for stage, ms in timings.items():
+        STAGE_LATENCY.labels(stage).observe(ms / 1000)
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    """Format stage durations (ms) as a Server-Timing header value"""
+    return ", ".join(f"{stage};dur={ms}" for stage, ms in timings.items())
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    """Measure how late a periodic sleep wakes up; runs until cancelled"""
+    loop = asyncio.get_running_loop()
+    while True:
+        due = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(loop.time() - due, 0.0))
@@ -0,0 +1,141 @@
+"""
+Dependency-graph executor for request pipelines
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Results = Dict[str, Any]
+
+
+@dataclass
+class Stage:
+    """
+    A pipeline stage
+
+    `run` receives the results of every finished stage and starts once all
+    `deps` are done. A stage may also `speculate`: start right away on a
+    guessed input, before its deps finish. Once the deps are done,
+    `keep_speculation(results)` can cancel a speculation that is no longer
+    worth finishing, and `accept(value, results)` decides whether its output
+    stands. A rejected, cancelled or failed speculation falls back to `run`.
+    """
+    name: str
+    run: Callable[[Results], Awaitable[Any]]
+    deps: Tuple[str, ...] = ()
+    speculate: Optional[Callable[[], Awaitable[Any]]] = None
+    keep_speculation: Optional[Callable[[Results], bool]] = None
+    accept: Optional[Callable[[Any, Results], bool]] = None
+
+
+class StageGraph:
+    """
+    Runs stages concurrently as soon as their dependencies are satisfied
+
+    End-to-end latency approaches the critical path of the graph rather
+    than the sum of all stages. Each stage's duration in milliseconds is
+    written to `timings`; speculation outcomes go to `speculation`.
+    `on_stage_done(name, results)` is called as each stage succeeds, so
+    callers can publish partial results before the whole graph finishes.
+    """
+
+    def __init__(
+        self,
+        timings: Optional[Dict[str, float]] = None,
+        on_stage_done: Optional[Callable[[str, Results], None]] = None
+    ):
+        self.stages: Dict[str, Stage] = {}
+        self.results: Results = {}
+        self.timings: Dict[str, float] = timings if timings is not None else {}
+        self.speculation: Dict[str, str] = {}
+        self.on_stage_done = on_stage_done
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def add(self, stage: Stage) -> None:
+        """Register a stage; its deps must already be registered"""
+        for dep in stage.deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+        self.stages[stage.name] = stage
+
+    async def run(self) -> Results:
+        """
+        Execute the graph
+
+        Returns:
+            Mapping of stage name to result
+
+        Raises:
+            The first exception raised by any stage; all other stages are
+            cancelled when that happens
+        """
+        self._tasks = {
+            name: asyncio.create_task(self._run_stage(stage), name=f"stage:{name}")
+            for name, stage in self.stages.items()
+        }
+        try:
+            await asyncio.gather(*self._tasks.values())
+        except BaseException:
+            for task in self._tasks.values():
+                task.cancel()
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+            raise
+        return self.results
+
+    async def _run_stage(self, stage: Stage) -> None:
+        spec_task = None
+        if stage.speculate is not None:
+            spec_start = time.perf_counter()
+            spec_task = asyncio.create_task(stage.speculate())
+
+        try:
+            for dep in stage.deps:
+                await asyncio.shield(self._tasks[dep])
+        except BaseException:
+            if spec_task is not None:
+                spec_task.cancel()
+            raise
+
+        if spec_task is not None:
+            value, outcome = await self._resolve_speculation(stage, spec_task)
+            self.speculation[stage.name] = outcome
+            if outcome == "hit":
+                self.results[stage.name] = value
+                self.timings[stage.name] = round((time.perf_counter() - spec_start) * 1000, 1)
+                self._stage_done(stage.name)
+                return
+            logger.info(f"Speculation for stage '{stage.name}' {outcome}, running it again")
+
+        start = time.perf_counter()
+        try:
+            self.results[stage.name] = await stage.run(self.results)
+        finally:
+            self.timings[stage.name] = round((time.perf_counter() - start) * 1000, 1)
+        self._stage_done(stage.name)
+
+    def _stage_done(self, name: str) -> None:
+        if self.on_stage_done is not None:
+            self.on_stage_done(name, self.results)
+
+    async def _resolve_speculation(self, stage: Stage, spec_task: asyncio.Task) -> Tuple[Any, str]:
+        """Decide whether a speculative result can be used"""
+        if stage.keep_speculation is not None and not stage.keep_speculation(self.results):
+            spec_task.cancel()
+            await asyncio.gather(spec_task, return_exceptions=True)
+            return None, "cancelled"
+
+        try:
+            value = await spec_task
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Speculation for stage '{stage.name}' failed: {e}")
+            return None, "failed"
+
+        if stage.accept is not None and not stage.accept(value, self.results):
+            return None, "rejected"
+        return value, "hit"
@@ -0,0 +1,257 @@
+"""
+Adaptive timeouts and circuit breaking for upstream services
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+from app.utils.deadline import bounded_timeout
+from app.utils.metrics import UPSTREAM_TIMEOUTS
+from app.utils.env_config import (
+    get_upstream_timeout_percentile,
+    get_upstream_timeout_multiplier,
+    get_upstream_timeout_floor,
+    get_circuit_failure_threshold,
+    get_circuit_reset_timeout,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, name: str):
+        self.name = name
+        super().__init__(f"{name} circuit is open")
+
+
+class LatencyTracker:
+    """
+    Timeout derived from recent latency percentiles
+
+    The timeout is `multiplier` times the chosen percentile of the last
+    `window` latencies, clamped to [floor, ceiling]. Until `min_samples`
+    latencies are known the ceiling is used. The percentile is recomputed
+    every few observations rather than on every call.
+    """
+
+    _RECOMPUTE_EVERY = 16
+
+    def __init__(
+        self,
+        ceiling: float,
+        floor: float = 0.2,
+        percentile: float = 99.0,
+        multiplier: float = 2.0,
+        window: int = 256,
+        min_samples: int = 20
+    ):
+        self.ceiling = ceiling
+        self.floor = min(floor, ceiling)
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self._samples: deque = deque(maxlen=window)
+        self._since_recompute = 0
+        self._timeout = ceiling
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._since_recompute += 1
+        if self._since_recompute >= self._RECOMPUTE_EVERY and len(self._samples) >= self.min_samples:
+            self._since_recompute = 0
+            ordered = sorted(self._samples)
+            index = min(math.ceil(len(ordered) * self.percentile / 100) - 1, len(ordered) - 1)
+            self._timeout = min(max(ordered[max(index, 0)] * self.multiplier, self.floor), self.ceiling)
+
+    def timeout(self) -> float:
+        """Current adaptive timeout in seconds"""
+        return self._timeout
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker with half-open probing
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls are rejected without reaching the upstream. Once `reset_timeout`
+    seconds have passed a single probe call is let through: success closes
+    the circuit, failure opens it for another `reset_timeout`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 10.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+        self.opens = 0
+        self.rejections = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now; claims the probe when half-open"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejections += 1
+        return False
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            logger.info(f"{self.name} circuit closed")
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opens += 1
+                logger.warning(f"{self.name} circuit opened after {self.failures} consecutive failures")
+            self.state = OPEN
+            self.opened_at = self.clock()
+            self._probing = False
+
+    def is_open(self) -> bool:
+        """Whether calls are being rejected (open and not yet due for a probe)"""
+        return self.state == OPEN and self.clock() - self.opened_at < self.reset_timeout
+
+    def release(self) -> None:
+        """Give back a claimed probe whose call ended without an outcome"""
+        self._probing = False
+
+
+class UpstreamGuard:
+    """
+    Circuit breaker plus adaptive, deadline-bounded timeout for one upstream
+
+    Args:
+        name: Upstream name, used in logs and metric labels
+        tracker: Latency tracker that sets the timeout
+        breaker: Circuit breaker for the upstream
+        is_failure: Whether an exception means the upstream is unhealthy;
+            errors caused by the request itself should not open the circuit
+    """
+
+    def __init__(
+        self,
+        name: str,
+        tracker: LatencyTracker,
+        breaker: CircuitBreaker,
+        is_failure: Callable[[Exception], bool] = lambda e: True
+    ):
+        self.name = name
+        self.tracker = tracker
+        self.breaker = breaker
+        self.is_failure = is_failure
+
+    def available(self) -> bool:
+        """Whether calls are currently reaching the upstream"""
+        return not self.breaker.is_open()
+
+    async def call(self, fn: Callable[[], Awaitable[T]], reserve: float = 0.0) -> T:
+        """
+        Run an upstream call under the breaker and a timeout
+
+        Args:
+            fn: Creates the upstream call
+            reserve: Seconds of the request deadline to leave for later stages
+
+        Raises:
+            CircuitOpenError: The circuit is open; nothing was sent
+            DeadlineExceeded: The request has no time left; nothing was sent
+            asyncio.TimeoutError: The call did not finish in time
+        """
+        adaptive = self.tracker.timeout()
+        timeout = bounded_timeout(adaptive, reserve)
+        # A timeout forced by the request deadline says nothing about the upstream
+        deadline_bound = timeout < adaptive
+
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.name)
+
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(fn(), timeout)
+        except asyncio.TimeoutError:
+            UPSTREAM_TIMEOUTS.labels(self.name).inc()
+            if deadline_bound:
+                self.breaker.release()
+            else:
+                # Censored sample: persistent timeouts push the timeout up towards the ceiling
+                self.tracker.observe(time.perf_counter() - start)
+                self.breaker.record_failure()
+            logger.warning(f"{self.name} timed out after {timeout:.2f}s")
+            raise
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+
+        self.tracker.observe(time.perf_counter() - start)
+        self.breaker.record_success()
+        return result
+
+    def stats(self) -> dict:
+        """Return breaker state and the current timeout"""
+        return {
+            "name": self.name,
+            "state": self.breaker.state,
+            "timeout": round(self.tracker.timeout(), 3),
+            "failures": self.breaker.failures,
+            "opens": self.breaker.opens,
+            "rejections": self.breaker.rejections,
+        }
+
+
+def create_guard(
+    name: str,
+    ceiling: float,
+    is_failure: Callable[[Exception], bool] = lambda e: True
+) -> UpstreamGuard:
+    """Build a guard configured from the UPSTREAM_TIMEOUT_* and CIRCUIT_* settings"""
+    return UpstreamGuard(
+        name,
+        LatencyTracker(
+            ceiling=ceiling,
+            floor=get_upstream_timeout_floor(),
+            percentile=get_upstream_timeout_percentile(),
+            multiplier=get_upstream_timeout_multiplier()
+        ),
+        CircuitBreaker(
+            name,
+            failure_threshold=get_circuit_failure_threshold(),
+            reset_timeout=get_circuit_reset_timeout()
+        ),
+        is_failure=is_failure
+    )
@@ -0,0 +1,305 @@
+"""
+Cross-process cache in a memory-mapped file
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import Any, Hashable, Optional, Tuple
+from app.utils.cache import MISSING
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"HPSC"
+_VERSION = 1
+# magic, version, slot count, slot size
+_HEADER = struct.Struct("<4sIII")
+_HEADER_SIZE = 64
+
+# seq, key hash, fresh_until, stale_until, key length, flags, value length
+_SLOT = struct.Struct("<QQddHBxI")
+
+_FLAG_COMPRESSED = 1
+_COMPRESS_THRESHOLD = 512
+
+# Slots probed per key; bounds both lookup cost and eviction work
+_PROBE = 8
+# Seqlock read attempts before treating a slot under heavy writes as a miss
+_READ_RETRIES = 4
+
+
+def _encode_key(key: Hashable) -> bytes:
+    if isinstance(key, tuple):
+        key = list(key)
+    return json.dumps(key, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class SharedMemoryCache:
+    """
+    Fixed-size hash table in a memory-mapped file shared by all workers on a host
+
+    Values are stored as compact JSON, zlib-compressed when large. Writers
+    hold an exclusive flock on the file; readers take no lock and use a
+    per-slot sequence counter (seqlock) to detect and retry torn reads.
+    Slot headers and keys are inspected in place in the mapping without
+    copying. Each key may live in one of a few neighbouring slots; when they
+    are all taken, the entry closest to expiry is evicted, so both memory
+    and eviction work stay bounded.
+
+    The file name carries the format version and table layout, so workers
+    started with different settings use separate files instead of resizing
+    one that others have mapped (which would crash them with SIGBUS).
+    Files of layouts no longer in use can be deleted once no worker runs.
+
+    Exposes the same get/lookup/set/stats interface as TTLCache.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: str,
+        slots: int,
+        slot_size: int,
+        ttl: float,
+        stale_ttl: float = 0.0
+    ):
+        if slot_size <= _SLOT.size + 16:
+            raise ValueError(f"slot_size must be larger than {_SLOT.size + 16} bytes")
+
+        self.name = name
+        self.path = f"{path}.v{_VERSION}-{slots}x{slot_size}"
+        self.slots = slots
+        self.slot_size = slot_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self._map = self._open_mapping()
+        except BaseException:
+            os.close(self._fd)
+            raise
+        self._view = memoryview(self._map)
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.oversized = 0
+
+    def _open_mapping(self) -> mmap.mmap:
+        size = _HEADER_SIZE + self.slots * self.slot_size
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            current = os.fstat(self._fd).st_size
+            if current == 0:
+                # A new file; nobody can have an empty file mapped, so it is
+                # safe to size it
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, _HEADER.pack(_MAGIC, _VERSION, self.slots, self.slot_size), 0)
+                logger.info(f"Initialized shared cache '{self.name}' at {self.path} ({size} bytes)")
+            elif current != size or _HEADER.unpack(os.pread(self._fd, _HEADER.size, 0)) != (
+                _MAGIC, _VERSION, self.slots, self.slot_size
+            ):
+                # Other workers may have this file mapped; truncating or
+                # rewriting it under them would crash them
+                raise OSError(f"{self.path} is not a shared cache with the expected layout")
+
+            return mmap.mmap(self._fd, size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _slot_offsets(self, key_hash: int):
+        start = key_hash % self.slots
+        for i in range(min(_PROBE, self.slots)):
+            yield _HEADER_SIZE + ((start + i) % self.slots) * self.slot_size
+
+    @staticmethod
+    def _hash(key_bytes: bytes) -> int:
+        # Zero marks an empty slot, so never hand it out as a hash
+        return int.from_bytes(hashlib.blake2b(key_bytes, digest_size=8).digest(), "little") or 1
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a fresh cached value, or `default` if missing or expired"""
+        value, is_stale = self.lookup(key)
+        if value is MISSING or is_stale:
+            return default
+        return value
+
+    def lookup(self, key: Hashable) -> Tuple[Any, bool]:
+        """
+        Look up an entry, including stale ones
+
+        Returns:
+            (value, is_stale) tuple; value is MISSING when there is no entry
+            or it is past its stale window
+        """
+        key_bytes = _encode_key(key)
+        key_hash = self._hash(key_bytes)
+        now = time.time()
+
+        for offset in self._slot_offsets(key_hash):
+            found = self._read_slot(offset, key_hash, key_bytes)
+            if found is None:
+                continue
+
+            payload, flags, fresh_until, stale_until = found
+            if now >= stale_until:
+                self.expirations += 1
+                break
+
+            if flags & _FLAG_COMPRESSED:
+                payload = zlib.decompress(payload)
+            value = json.loads(payload)
+
+            if now >= fresh_until:
+                self.stale_hits += 1
+                return value, True
+            self.hits += 1
+            return value, False
+
+        self.misses += 1
+        return MISSING, False
+
+    def _read_slot(self, offset: int, key_hash: int, key_bytes: bytes):
+        """Seqlock read of one slot; None if it holds a different key"""
+        view = self._view
+        for _ in range(_READ_RETRIES):
+            seq, slot_hash, fresh_until, stale_until, key_len, flags, value_len = _SLOT.unpack_from(view, offset)
+            if seq & 1:
+                continue
+            if slot_hash != key_hash or key_len != len(key_bytes):
+                return None
+
+            data_start = offset + _SLOT.size
+            if view[data_start:data_start + key_len] != key_bytes:
+                return None
+            value_start = data_start + key_len
+            payload = bytes(view[value_start:value_start + value_len])
+
+            if _SLOT.unpack_from(view, offset)[0] == seq:
+                return payload, flags, fresh_until, stale_until
+        return None
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        stale_ttl: Optional[float] = None
+    ) -> None:
+        """
+        Store a value, evicting the neighbouring entry closest to expiry if needed
+
+        Args:
+            key: Cache key
+            value: JSON-serializable value
+            ttl: Freshness lifetime overriding the cache default
+            stale_ttl: Stale window overriding the cache default
+        """
+        key_bytes = _encode_key(key)
+        payload = json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+        flags = 0
+        if len(payload) > _COMPRESS_THRESHOLD:
+            payload = zlib.compress(payload, 1)
+            flags |= _FLAG_COMPRESSED
+
+        if _SLOT.size + len(key_bytes) + len(payload) > self.slot_size:
+            self.oversized += 1
+            return
+
+        key_hash = self._hash(key_bytes)
+        now = time.time()
+        fresh_until = now + (self.ttl if ttl is None else ttl)
+        stale_until = fresh_until + (self.stale_ttl if stale_ttl is None else stale_ttl)
+
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            offset, evicting = self._choose_slot(key_hash, key_bytes, now)
+            if evicting:
+                self.evictions += 1
+
+            seq = _SLOT.unpack_from(self._map, offset)[0]
+            # Odd sequence tells readers the slot is being rewritten
+            struct.pack_into("<Q", self._map, offset, seq + 1)
+            data_start = offset + _SLOT.size
+            self._map[data_start:data_start + len(key_bytes)] = key_bytes
+            value_start = data_start + len(key_bytes)
+            self._map[value_start:value_start + len(payload)] = payload
+            _SLOT.pack_into(
+                self._map, offset,
+                seq + 2, key_hash, fresh_until, stale_until,
+                len(key_bytes), flags, len(payload)
+            )
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _choose_slot(self, key_hash: int, key_bytes: bytes, now: float) -> Tuple[int, bool]:
+        """Pick the slot to write: same key, then empty or expired, then closest to expiry"""
+        victim = None
+        victim_expiry = float("inf")
+        free = None
+
+        for offset in self._slot_offsets(key_hash):
+            _, slot_hash, _, stale_until, key_len, _, _ = _SLOT.unpack_from(self._map, offset)
+            if slot_hash == key_hash and key_len == len(key_bytes):
+                data_start = offset + _SLOT.size
+                if self._map[data_start:data_start + key_len] == key_bytes:
+                    return offset, False
+            if free is None and (slot_hash == 0 or stale_until <= now):
+                free = offset
+            if stale_until < victim_expiry:
+                victim, victim_expiry = offset, stale_until
+
+        if free is not None:
+            return free, False
+        return victim, True
+
+    def __len__(self) -> int:
+        now = time.time()
+        count = 0
+        for i in range(self.slots):
+            _, slot_hash, _, stale_until, _, _, _ = _SLOT.unpack_from(self._view, _HEADER_SIZE + i * self.slot_size)
+            if slot_hash and stale_until > now:
+                count += 1
+        return count
+
+    def clear(self) -> None:
+        """Drop every entry, for all processes"""
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            for i in range(self.slots):
+                offset = _HEADER_SIZE + i * self.slot_size
+                seq = _SLOT.unpack_from(self._map, offset)[0]
+                _SLOT.pack_into(self._map, offset, seq + 2, 0, 0.0, 0.0, 0, 0, 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def stats(self) -> dict:
+        """Return this process's hit/miss counters and shared table usage"""
+        hits = self.hits + self.stale_hits
+        lookups = hits + self.misses
+        return {
+            "name": self.name,
+            "entries": len(self),
+            "bytes": self.slots * self.slot_size,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "oversized": self.oversized,
+        }
+
+    def close(self) -> None:
+        """Unmap the file; the shared data stays for other workers"""
+        self._view.release()
+        self._map.close()
+        os.close(self._fd)
@@ -0,0 +1,91 @@
+"""
+Single-flight coalescing of concurrent identical calls
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from app.utils.deadline import create_detached_task, wait_within_deadline
+
+
+class _Call:
+    """An in-flight call and the number of callers waiting on it"""
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time
+
+    Callers that arrive while a call with the same key is in flight wait on
+    that call instead of starting their own, and all of them receive its
+    result or exception. A caller being cancelled does not cancel the shared
+    call unless it was the last one waiting for it.
+
+    The shared call runs without a request deadline, since its callers have
+    different ones; each caller stops waiting when its own deadline passes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], reserve: float = 0.0) -> Any:
+        """
+        Run fn() unless an identical call is already in flight
+
+        Args:
+            key: Identity of the call; equal keys share one execution
+            fn: Zero-argument coroutine factory that performs the work
+            reserve: Seconds of the caller's deadline to leave for later stages
+
+        Returns:
+            Result of the (possibly shared) call
+
+        Raises:
+            DeadlineExceeded: If the caller's deadline passed before the call finished
+        """
+        self.calls += 1
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(create_detached_task(fn()))
+            self._calls[key] = call
+            self.executions += 1
+            call.task.add_done_callback(lambda task: self._finish(key, call))
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await wait_within_deadline(call.task, reserve)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Every caller gave up, so nobody needs the result any more
+                self.cancelled += 1
+                call.task.cancel()
+
+    def _finish(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Mark the exception as retrieved; waiters already re-raised it
+        if not call.task.cancelled():
+            call.task.exception()
+
+    def stats(self) -> dict:
+        """Return call and coalescing counters"""
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+            "in_flight": len(self._calls),
+        }
@@ -0,0 +1,30 @@
+"""
+Per-request accounting of upstream API calls
+"""
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# Tasks copy the context when they are created, so every stage of a request
+# sees the same dict and increments land in one place
+_calls: ContextVar[Optional[Dict[str, int]]] = ContextVar("upstream_calls", default=None)
+
+
+def track_upstream_calls() -> Dict[str, int]:
+    """
+    Start counting upstream calls made by the current request
+
+    Must be called before the request spawns its tasks.
+
+    Returns:
+        Dict of service name to call count, filled in as calls are made
+    """
+    calls: Dict[str, int] = {}
+    _calls.set(calls)
+    return calls
+
+
+def record_upstream_call(service: str) -> None:
+    """Count one upstream call against the current request, if it is tracked"""
+    calls = _calls.get()
+    if calls is not None:
+        calls[service] = calls.get(service, 0) + 1
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark the rule-based intent matcher on large synthetic gazetteers
+
+Usage (from backend/):
+    python -m benchmarks.bench_intent_matcher --sizes 1000 10000 100000
+"""
+import argparse
+import random
+import string
+import time
+
+from app.services.rule_intent import RuleIntentExtractor
+
+SAMPLE_QUERIES = [
+    "Where can I eat ramen near Blok M?",
+    "coffee near Menteng",
+    "best sushi or pizza in Kemang",
+    "I want something spicy and cheap for my birthday near Kuningan",
+    "good padang food near Tebet",
+    "romantic dinner spot with a view of the city skyline",
+]
+
+
+def random_term(rng: random.Random, words: int) -> str:
+    return " ".join(
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+        for _ in range(words)
+    )
+
+
+def synthetic_gazetteer(size: int, seed: int = 7) -> dict:
+    """Build a gazetteer with `size` aliases split between types and locations"""
+    rng = random.Random(seed)
+    place_types = [{"term": "ramen", "aliases": ["ramen"]}, {"term": "coffee", "aliases": ["coffee"]}]
+    locations = [{"name": "Blok M Jakarta", "aliases": ["blok m"]}, {"name": "Menteng Jakarta", "aliases": ["menteng"]}]
+
+    for i in range(size // 2):
+        place_types.append({"term": f"type{i}", "aliases": [random_term(rng, rng.randint(1, 2))]})
+        locations.append({"name": f"Location {i}", "aliases": [random_term(rng, rng.randint(1, 3))]})
+
+    return {"place_types": place_types, "locations": locations}
+
+
+def bench(size: int, iterations: int) -> None:
+    gazetteer = synthetic_gazetteer(size)
+
+    start = time.perf_counter()
+    extractor = RuleIntentExtractor(gazetteer)
+    build_seconds = time.perf_counter() - start
+
+    for query in SAMPLE_QUERIES:
+        extractor.classify(query)
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        extractor.classify(SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)])
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{len(extractor.matcher):>9} patterns | build {build_seconds * 1000:8.1f} ms | "
+        f"{iterations / elapsed:>10.0f} queries/s | {elapsed / iterations * 1e6:7.1f} us/query"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    print("  Rule-based intent matcher")
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    for size in args.sizes:
+        bench(size, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
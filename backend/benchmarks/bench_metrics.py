@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark hot-path overhead of metrics collection and the cost of a scrape
+
+Usage (from backend/):
+    python -m benchmarks.bench_metrics --ops 1000000
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.middleware.metrics import MetricsMiddleware
+from app.utils.metrics import (
+    Counter,
+    Histogram,
+    Registry,
+    observe_stage_timings,
+    server_timing_header,
+)
+
+STAGES = [
+    "reverse_geocode", "intent", "places_search", "distance_walking",
+    "distance_bicycling", "distance_driving", "distances", "response", "total",
+]
+
+
+def report(label: str, elapsed: float, ops: int) -> None:
+    print(f"{label:<34} | {elapsed / ops * 1e9:8.0f} ns/op")
+
+
+def bench_primitives(ops: int) -> None:
+    registry = Registry()
+    counter = registry.register(Counter("bench_total", "Bench counter", ("api",)))
+    histogram = registry.register(Histogram("bench_seconds", "Bench histogram", ("stage",)))
+    rng = random.Random(5)
+    values = [rng.lognormvariate(-4, 1.5) for _ in range(ops)]
+
+    start = time.perf_counter()
+    for _ in range(ops):
+        counter.labels("places").inc()
+    report("counter inc", time.perf_counter() - start, ops)
+
+    start = time.perf_counter()
+    for value in values:
+        histogram.labels("places_search").observe(value)
+    report("histogram observe", time.perf_counter() - start, ops)
+
+
+def bench_query_bookkeeping(ops: int) -> None:
+    # What a finished /api/query adds: every stage observed, plus the header
+    rng = random.Random(7)
+    timings = [{stage: round(rng.uniform(0.1, 400.0), 1) for stage in STAGES} for _ in range(1000)]
+
+    start = time.perf_counter()
+    for i in range(ops):
+        sample = timings[i % len(timings)]
+        observe_stage_timings(sample)
+        server_timing_header(sample)
+    report(f"query bookkeeping ({len(STAGES)} stages)", time.perf_counter() - start, ops)
+
+
+def bench_render(scrapes: int) -> None:
+    registry = Registry()
+    histogram = registry.register(Histogram("bench_seconds", "Bench histogram", ("method", "path", "status")))
+    for path in ("/api/query", "/api/query/stream", "/api/query/batch", "/health", "/metrics", "other"):
+        for status in ("200", "400", "429", "500"):
+            histogram.labels("POST", path, status).observe(0.05)
+
+    start = time.perf_counter()
+    for _ in range(scrapes):
+        body = registry.render()
+    elapsed = time.perf_counter() - start
+    print(f"{'render 24 histograms':<34} | {elapsed / scrapes * 1e6:8.0f} us/scrape | {len(body)} bytes")
+
+
+async def bench_middleware(requests: int) -> None:
+    def build(with_metrics: bool) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/health")
+        async def health():
+            return {"status": "healthy"}
+
+        if with_metrics:
+            app.add_middleware(MetricsMiddleware)
+        return app
+
+    async def run(app: FastAPI) -> float:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for _ in range(200):
+                await client.get("/health")
+            start = time.perf_counter()
+            for _ in range(requests):
+                await client.get("/health")
+            return (time.perf_counter() - start) / requests
+
+    baseline = await run(build(False))
+    instrumented = await run(build(True))
+    print(
+        f"{'GET /health, no middleware':<34} | {baseline * 1e6:8.0f} us/request\n"
+        f"{'GET /health, metrics middleware':<34} | {instrumented * 1e6:8.0f} us/request "
+        f"(+{(instrumented - baseline) * 1e6:.0f} us)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ops", type=int, default=1_000_000)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    print("  Metrics overhead")
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    bench_primitives(args.ops)
+    bench_query_bookkeeping(args.ops // 10)
+    bench_render(1000)
+    asyncio.run(bench_middleware(args.requests))
+
+
+if __name__ == "__main__":
+    main()
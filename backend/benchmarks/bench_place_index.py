@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark bulk loading and query latency of the place spatial index
+
+Usage (from backend/):
+    python -m benchmarks.bench_place_index --places 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from app.services.place_index import PlaceIndex
+
+CATEGORIES = [
+    "ramen", "sushi", "coffee", "bakery", "pizza", "burger", "satay", "bakso",
+    "padang", "martabak", "noodles", "dim sum", "steak", "seafood", "tea",
+    "pharmacy", "atm", "gym", "bookstore", "laundry", "barber", "hotel",
+    "museum", "park", "mall", "supermarket", "hospital", "bank", "cinema", "spa",
+]
+
+# Rough bounding box of greater Jakarta
+SOUTH, NORTH = -6.45, -6.05
+WEST, EAST = 106.65, 107.05
+
+
+def generate(count: int, seed: int):
+    rng = random.Random(seed)
+    # Skewed category popularity, like real search traffic
+    weights = [1 / (rank + 1) for rank in range(len(CATEGORIES))]
+    for i in range(count):
+        category = rng.choices(CATEGORIES, weights)[0]
+        name = f"{category.title()} {i}"
+        place = {
+            "place_id": f"bench-{i}",
+            "name": name,
+            "address": f"Jl. Bench No. {i}",
+            "lat": rng.uniform(SOUTH, NORTH),
+            "lng": rng.uniform(WEST, EAST),
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+            "user_ratings_total": rng.randint(1, 5000),
+        }
+        yield place, [category, *category.split()]
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def bench_queries(index: PlaceIndex, label: str, term: str, radius: float, queries: int) -> None:
+    rng = random.Random(7)
+    latencies = []
+    found = 0
+    for _ in range(queries):
+        lat = rng.uniform(SOUTH, NORTH)
+        lng = rng.uniform(WEST, EAST)
+        start = time.perf_counter()
+        # Synchronous core of PlaceIndex.search, without the thread hop
+        results = index._search(term, lat, lng, radius, 0.0, 20)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found += len(results)
+
+    print(
+        f"{label:<26} | p50 {percentile(latencies, 50):6.2f} ms | p95 {percentile(latencies, 95):6.2f} ms | "
+        f"p99 {percentile(latencies, 99):6.2f} ms | mean {statistics.fmean(latencies):6.2f} ms | "
+        f"{found / queries:5.1f} results"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--places", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--path", help="Index file to build (default: a temporary file)")
+    args = parser.parse_args()
+
+    directory = None
+    path = args.path
+    if path is None:
+        directory = tempfile.TemporaryDirectory()
+        path = os.path.join(directory.name, "place_index.sqlite3")
+
+    index = PlaceIndex(path)
+    try:
+        print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+        print(f"  Place index, {args.places} places")
+        print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+
+        start = time.perf_counter()
+        loaded = index.bulk_load(generate(args.places, seed=11))
+        elapsed = time.perf_counter() - start
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"bulk load: {loaded} places in {elapsed:.1f}s ({loaded / elapsed:,.0f}/s), {size_mb:.0f} MB on disk")
+
+        bench_queries(index, "popular term, 1 km", "ramen", 1000, args.queries)
+        bench_queries(index, "popular term, 5 km", "ramen", 5000, args.queries)
+        bench_queries(index, "rare term, 5 km", "spa", 5000, args.queries)
+        bench_queries(index, "unknown term, 5 km", "fondue", 5000, args.queries)
+
+        start = time.perf_counter()
+        removed = index.compact(max_age=3600)
+        print(f"compact (nothing expired): removed {removed} in {(time.perf_counter() - start) * 1000:.0f} ms")
+    finally:
+        index.close()
+        if directory is not None:
+            directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
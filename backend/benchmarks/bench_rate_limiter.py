@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-request overhead of the sliding-window rate limiter
+
+Usage (from backend/):
+    python -m benchmarks.bench_rate_limiter --keys 100000
+"""
+import argparse
+import random
+import time
+
+from app.middleware.rate_limit_backends import RateLimit, SlidingWindowLimiter
+
+
+def bench(label: str, limiter: SlidingWindowLimiter, keys: list, requests: int) -> None:
+    limit = RateLimit(requests=20, window=60.0)
+    rng = random.Random(11)
+    sequence = [rng.choice(keys) for _ in range(requests)]
+
+    now = time.time()
+    start = time.perf_counter()
+    for i, key in enumerate(sequence):
+        limiter.hit(key, limit, now + i * 1e-4)
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{label:<28} | {len(limiter):>8} tracked | {elapsed / requests * 1e9:7.0f} ns/request | "
+        f"{limiter.evictions:>8} evictions"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    keys = [("*", f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}") for i in range(args.keys)]
+
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    print(f"  Rate limiter, {args.keys} distinct keys")
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    bench("all keys fit", SlidingWindowLimiter(max_keys=args.keys), keys, args.requests)
+    bench("cap at 10% of keys (LRU)", SlidingWindowLimiter(max_keys=args.keys // 10), keys, args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the Google Maps web services and Ollama
+
+Serves geocode, reverse geocode, Places text search, Distance Matrix and
+Ollama /api/generate (streaming and not) on one port, with configurable
+latency distributions, error rates and payload sizes, so the backend can be
+load tested without network access or API keys.
+
+Usage (from backend/):
+    python -m benchmarks.fake_upstreams --port 9100 --maps-latency lognormal:40:0.4
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+# Centre of the synthetic city (Jakarta)
+CENTER = (-6.2, 106.82)
+
+QUERIES = ["ramen", "coffee", "sushi", "bakery", "pizza", "satay", "noodles", "dim sum", "burger", "tea"]
+CATEGORIES = ["restaurant", "cafe", "restaurant", "bakery", "restaurant", "restaurant", "restaurant",
+              "restaurant", "restaurant", "cafe"]
+AREAS = ["Blok M", "Kemang", "Senopati", "Menteng", "Kota Tua", "Kelapa Gading", "PIK", "Cikini"]
+
+# Rough speeds in m/s, used to derive Distance Matrix durations
+SPEEDS = {"walking": 1.3, "bicycling": 4.2, "driving": 7.5}
+
+
+@dataclass
+class Latency:
+    """
+    Latency distribution parsed from a spec string
+
+    "fixed:MS", "uniform:LOW_MS:HIGH_MS" or "lognormal:MEDIAN_MS:SIGMA";
+    a bare number is a fixed latency.
+    """
+    kind: str = "fixed"
+    params: Tuple[float, ...] = (0.0,)
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        kind, *values = spec.split(":")
+        try:
+            if not values:
+                return cls("fixed", (float(kind),))
+            params = tuple(float(value) for value in values)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid latency spec '{spec}'")
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}.get(kind)
+        if expected != len(params):
+            raise argparse.ArgumentTypeError(f"invalid latency spec '{spec}'")
+        return cls(kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw one latency in seconds"""
+        if self.kind == "uniform":
+            return rng.uniform(*self.params) / 1000
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return rng.lognormvariate(math.log(max(median, 1e-3)), sigma) / 1000
+        return self.params[0] / 1000
+
+    def __str__(self) -> str:
+        return ":".join([self.kind, *(f"{value:g}" for value in self.params)])
+
+
+@dataclass
+class UpstreamProfile:
+    """Behaviour of the fake upstreams"""
+    maps_latency: Latency = field(default_factory=lambda: Latency.parse("lognormal:40:0.4"))
+    maps_error_rate: float = 0.0
+    places_results: int = 20
+    place_padding: int = 512
+    llm_latency: Latency = field(default_factory=lambda: Latency.parse("lognormal:150:0.3"))
+    llm_token_latency: Latency = field(default_factory=lambda: Latency.parse("fixed:15"))
+    llm_trailing_tokens: int = 20
+    llm_error_rate: float = 0.0
+    seed: int = 1
+
+    @staticmethod
+    def add_arguments(parser: argparse.ArgumentParser) -> None:
+        defaults = UpstreamProfile()
+        group = parser.add_argument_group("fake upstreams")
+        group.add_argument("--maps-latency", type=Latency.parse, default=defaults.maps_latency,
+                           help="Maps API latency, e.g. fixed:20, uniform:10:60, lognormal:40:0.4")
+        group.add_argument("--maps-error-rate", type=float, default=defaults.maps_error_rate,
+                           help="Share of Maps API calls answered with HTTP 500")
+        group.add_argument("--places-results", type=int, default=defaults.places_results,
+                           help="Places per text search response (the API returns at most 20)")
+        group.add_argument("--place-padding", type=int, default=defaults.place_padding,
+                           help="Extra bytes per place, standing in for photos, reviews and the like")
+        group.add_argument("--llm-latency", type=Latency.parse, default=defaults.llm_latency,
+                           help="Ollama time to first token")
+        group.add_argument("--llm-token-latency", type=Latency.parse, default=defaults.llm_token_latency,
+                           help="Ollama time per generated token")
+        group.add_argument("--llm-trailing-tokens", type=int, default=defaults.llm_trailing_tokens,
+                           help="Tokens the model keeps generating after the intent JSON")
+        group.add_argument("--llm-error-rate", type=float, default=defaults.llm_error_rate,
+                           help="Share of Ollama calls answered with HTTP 500")
+        group.add_argument("--upstream-seed", type=int, default=defaults.seed)
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "UpstreamProfile":
+        return cls(
+            maps_latency=args.maps_latency,
+            maps_error_rate=args.maps_error_rate,
+            places_results=args.places_results,
+            place_padding=args.place_padding,
+            llm_latency=args.llm_latency,
+            llm_token_latency=args.llm_token_latency,
+            llm_trailing_tokens=args.llm_trailing_tokens,
+            llm_error_rate=args.llm_error_rate,
+            seed=args.upstream_seed,
+        )
+
+    def to_argv(self) -> List[str]:
+        """Command line flags that reproduce this profile"""
+        return [
+            "--maps-latency", str(self.maps_latency),
+            "--maps-error-rate", str(self.maps_error_rate),
+            "--places-results", str(self.places_results),
+            "--place-padding", str(self.place_padding),
+            "--llm-latency", str(self.llm_latency),
+            "--llm-token-latency", str(self.llm_token_latency),
+            "--llm-trailing-tokens", str(self.llm_trailing_tokens),
+            "--llm-error-rate", str(self.llm_error_rate),
+            "--upstream-seed", str(self.seed),
+        ]
+
+    def describe(self) -> dict:
+        return {
+            "maps_latency": str(self.maps_latency),
+            "maps_error_rate": self.maps_error_rate,
+            "places_results": self.places_results,
+            "place_padding": self.place_padding,
+            "llm_latency": str(self.llm_latency),
+            "llm_token_latency": str(self.llm_token_latency),
+            "llm_trailing_tokens": self.llm_trailing_tokens,
+            "llm_error_rate": self.llm_error_rate,
+        }
+
+
+def _stable_rng(*parts) -> random.Random:
+    """RNG seeded from request content, so repeated requests get the same answer"""
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode()).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def _parse_latlng(value: str) -> Tuple[float, float]:
+    lat, lng = value.split(",")
+    return float(lat), float(lng)
+
+
+def _ground_distance(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    dlat = (a[0] - b[0]) * 111_000
+    dlng = (a[1] - b[1]) * 111_000 * math.cos(math.radians(a[0]))
+    return math.hypot(dlat, dlng)
+
+
+def create_app(profile: UpstreamProfile) -> Starlette:
+    """Build the fake upstream ASGI app"""
+    rng = random.Random(profile.seed)
+    padding = "x" * profile.place_padding
+
+    async def maps_delay() -> bool:
+        """Sleep for one Maps call; False if this call should fail"""
+        await asyncio.sleep(profile.maps_latency.sample(rng))
+        return rng.random() >= profile.maps_error_rate
+
+    def maps_error() -> JSONResponse:
+        return JSONResponse({"status": "UNKNOWN_ERROR", "error_message": "injected failure"}, status_code=500)
+
+    async def geocode(request: Request):
+        if not await maps_delay():
+            return maps_error()
+        params = request.query_params
+        if "latlng" in params:
+            area = AREAS[_stable_rng(params["latlng"][:6]).randrange(len(AREAS))]
+            return JSONResponse({"status": "OK", "results": [{
+                "formatted_address": f"Jl. Bench, {area}, Jakarta",
+                "address_components": [
+                    {"long_name": area, "types": ["sublocality_level_1", "sublocality"]},
+                    {"long_name": "South Jakarta", "types": ["administrative_area_level_2"]},
+                    {"long_name": "Jakarta", "types": ["locality"]},
+                ],
+            }]})
+        local = _stable_rng(params.get("address", ""))
+        location = {"lat": CENTER[0] + local.uniform(-0.1, 0.1), "lng": CENTER[1] + local.uniform(-0.1, 0.1)}
+        return JSONResponse({"status": "OK", "results": [{"geometry": {"location": location}}]})
+
+    async def text_search(request: Request):
+        if not await maps_delay():
+            return maps_error()
+        params = request.query_params
+        query = params.get("query", "")
+        centre = _parse_latlng(params["location"]) if "location" in params else CENTER
+        # Same query in the same ~1 km area yields the same places
+        local = _stable_rng(query, round(centre[0], 2), round(centre[1], 2))
+        results = []
+        for i in range(profile.places_results):
+            place_id = f"fake-{local.getrandbits(48):012x}"
+            results.append({
+                "place_id": place_id,
+                "name": f"{query.title()} {place_id[-4:]}",
+                "formatted_address": f"Jl. Bench No. {i}, Jakarta",
+                "geometry": {"location": {
+                    "lat": centre[0] + local.uniform(-0.02, 0.02),
+                    "lng": centre[1] + local.uniform(-0.02, 0.02),
+                }},
+                "rating": round(local.uniform(3.0, 5.0), 1),
+                "user_ratings_total": local.randint(1, 5000),
+                "types": ["restaurant", "food"],
+                "padding": padding,
+            })
+        return JSONResponse({"status": "OK", "results": results})
+
+    async def distance_matrix(request: Request):
+        if not await maps_delay():
+            return maps_error()
+        params = request.query_params
+        speed = SPEEDS.get(params.get("mode", "driving"), SPEEDS["driving"])
+        origins = [_parse_latlng(value) for value in params["origins"].split("|")]
+        destinations = [_parse_latlng(value) for value in params["destinations"].split("|")]
+        rows = []
+        for origin in origins:
+            elements = []
+            for destination in destinations:
+                meters = int(_ground_distance(origin, destination) * 1.3) + 50
+                seconds = int(meters / speed)
+                elements.append({
+                    "status": "OK",
+                    "distance": {"text": f"{meters / 1000:.1f} km", "value": meters},
+                    "duration": {"text": f"{max(seconds // 60, 1)} mins", "value": seconds},
+                })
+            rows.append({"elements": elements})
+        return JSONResponse({"status": "OK", "rows": rows})
+
+    async def generate(request: Request):
+        body = await request.json()
+        await asyncio.sleep(profile.llm_latency.sample(rng))
+        if rng.random() < profile.llm_error_rate:
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+
+        local = _stable_rng(body.get("prompt", ""))
+        choice = local.randrange(len(QUERIES))
+        intent = json.dumps({
+            "query": QUERIES[choice],
+            "location": f"{AREAS[local.randrange(len(AREAS))]} Jakarta",
+            "category": CATEGORIES[choice],
+        })
+        # Roughly four characters per token, then some chatter after the JSON
+        tokens = [intent[i:i + 4] for i in range(0, len(intent), 4)]
+        tokens += [" ok"] * profile.llm_trailing_tokens
+
+        if not body.get("stream"):
+            await asyncio.sleep(sum(profile.llm_token_latency.sample(rng) for _ in tokens))
+            return JSONResponse({"model": body.get("model"), "response": intent, "done": True})
+
+        async def stream():
+            for token in tokens:
+                await asyncio.sleep(profile.llm_token_latency.sample(rng))
+                yield json.dumps({"response": token, "done": False}) + "\n"
+            yield json.dumps({"response": "", "done": True}) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    async def health(request: Request):
+        return JSONResponse({"status": "ok"})
+
+    return Starlette(routes=[
+        Route("/maps/api/geocode/json", geocode),
+        Route("/maps/api/place/textsearch/json", text_search),
+        Route("/maps/api/distancematrix/json", distance_matrix),
+        Route("/api/generate", generate, methods=["POST"]),
+        Route("/health", health),
+    ])
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    UpstreamProfile.add_arguments(parser)
+    args = parser.parse_args()
+
+    app = create_app(UpstreamProfile.from_args(args))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Offline load test of the backend against local upstream stand-ins
+
+Starts benchmarks.fake_upstreams and the real app under uvicorn, drives the
+app with a concurrent closed-loop load generator, and reports throughput and
+p50/p95/p99 latency per endpoint and per pipeline stage. Results can be
+saved as a baseline and later runs compared against it; the exit status is
+1 when a metric regressed beyond the tolerance.
+
+Usage (from backend/):
+    python -m benchmarks.load_test --duration 30 --save-baseline baseline.json
+    python -m benchmarks.load_test --duration 30 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.fake_upstreams import CENTER, UpstreamProfile
+
+# Mix of phrasings: some the rule-based extractor answers, some that need the LLM
+QUERIES = [
+    "ramen near me",
+    "Where can I eat ramen near Blok M?",
+    "coffee shop in Kemang",
+    "sushi around Senopati",
+    "best pizza near me",
+    "somewhere quiet to work with good wifi",
+    "a cozy place for a first date",
+    "late night food that is still open",
+    "bakery near me",
+    "where do locals go for breakfast",
+]
+
+DEFAULT_MIX = "query=70,stream=20,batch=5,health=5"
+
+# Latency differences smaller than this are noise, whatever the ratio
+MIN_REGRESSION_MS = 2.0
+
+
+@dataclass
+class Sample:
+    """One finished request"""
+    endpoint: str
+    latency_ms: float
+    ok: bool
+    ttfb_ms: Optional[float] = None
+    stages: List[Dict[str, float]] = field(default_factory=list)
+
+
+@dataclass
+class Workload:
+    """Generates request bodies from a fixed pool of locations"""
+    rng: random.Random
+    locations: List[tuple]
+    batch_size: int
+
+    @classmethod
+    def create(cls, seed: int, locations: int, batch_size: int) -> "Workload":
+        rng = random.Random(seed)
+        points = [
+            (round(CENTER[0] + rng.uniform(-0.15, 0.15), 5), round(CENTER[1] + rng.uniform(-0.15, 0.15), 5))
+            for _ in range(locations)
+        ]
+        return cls(rng, points, batch_size)
+
+    def query(self) -> dict:
+        lat, lng = self.rng.choice(self.locations)
+        return {"query": self.rng.choice(QUERIES), "user_lat": lat, "user_lng": lng}
+
+    def batch(self) -> dict:
+        return {"queries": [self.query() for _ in range(self.batch_size)]}
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint '{name}' (choose from {', '.join(ENDPOINTS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def _post_query(client: httpx.AsyncClient, workload: Workload) -> Sample:
+    start = time.perf_counter()
+    response = await client.post("/api/query", json=workload.query())
+    latency = (time.perf_counter() - start) * 1000
+    ok = response.status_code == 200
+    stages = [response.json()["timings"]] if ok else []
+    return Sample("query", latency, ok, stages=stages)
+
+
+async def _post_stream(client: httpx.AsyncClient, workload: Workload) -> Sample:
+    start = time.perf_counter()
+    ttfb = None
+    final = None
+    async with client.stream("POST", "/api/query/stream", json=workload.query()) as response:
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            if ttfb is None:
+                ttfb = (time.perf_counter() - start) * 1000
+            final = json.loads(line)
+    latency = (time.perf_counter() - start) * 1000
+    ok = response.status_code == 200 and final is not None and final["type"] == "response"
+    return Sample("stream", latency, ok, ttfb, [final["timings"]] if ok else [])
+
+
+async def _post_batch(client: httpx.AsyncClient, workload: Workload) -> Sample:
+    start = time.perf_counter()
+    ttfb = None
+    stages = []
+    errors = 0
+    async with client.stream("POST", "/api/query/batch", json=workload.batch()) as response:
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            if ttfb is None:
+                ttfb = (time.perf_counter() - start) * 1000
+            event = json.loads(line)
+            if event["type"] == "result":
+                stages.append(event["response"]["timings"])
+            elif event["type"] == "error":
+                errors += 1
+    latency = (time.perf_counter() - start) * 1000
+    return Sample("batch", latency, response.status_code == 200 and not errors, ttfb, stages)
+
+
+async def _get_health(client: httpx.AsyncClient, workload: Workload) -> Sample:
+    start = time.perf_counter()
+    response = await client.get("/health")
+    return Sample("health", (time.perf_counter() - start) * 1000, response.status_code == 200)
+
+
+ENDPOINTS = {
+    "query": _post_query,
+    "stream": _post_stream,
+    "batch": _post_batch,
+    "health": _get_health,
+}
+
+
+async def generate_load(
+    base_url: str,
+    mix: Dict[str, float],
+    workload: Workload,
+    concurrency: int,
+    duration: float,
+    warmup: float
+) -> List[Sample]:
+    """
+    Run `concurrency` closed-loop clients for `warmup` + `duration` seconds
+
+    Returns:
+        Samples of requests that started after the warm-up
+    """
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples: List[Sample] = []
+    loop = asyncio.get_running_loop()
+    measure_from = loop.time() + warmup
+    deadline = measure_from + duration
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        async def client_loop() -> None:
+            while (started := loop.time()) < deadline:
+                endpoint = workload.rng.choices(names, weights)[0]
+                try:
+                    sample = await ENDPOINTS[endpoint](client, workload)
+                except httpx.HTTPError:
+                    sample = Sample(endpoint, (loop.time() - started) * 1000, False)
+                if started >= measure_from:
+                    samples.append(sample)
+
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return samples
+
+
+def summarize(samples: List[Sample], duration: float) -> dict:
+    """Throughput, error rate and latency percentiles per endpoint and stage"""
+    endpoints = {}
+    for name in ENDPOINTS:
+        selected = [sample for sample in samples if sample.endpoint == name]
+        if not selected:
+            continue
+        latencies = [sample.latency_ms for sample in selected]
+        summary = {
+            "requests": len(selected),
+            "throughput": round(len(selected) / duration, 2),
+            "error_rate": round(sum(not sample.ok for sample in selected) / len(selected), 4),
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+        }
+        ttfbs = [sample.ttfb_ms for sample in selected if sample.ttfb_ms is not None]
+        if ttfbs:
+            summary["ttfb_p50"] = round(percentile(ttfbs, 50), 2)
+        endpoints[name] = summary
+
+    by_stage: Dict[str, List[float]] = {}
+    for sample in samples:
+        for timings in sample.stages:
+            for stage, ms in timings.items():
+                by_stage.setdefault(stage, []).append(ms)
+    stages = {
+        stage: {
+            "count": len(values),
+            "p50": round(percentile(values, 50), 2),
+            "p95": round(percentile(values, 95), 2),
+            "p99": round(percentile(values, 99), 2),
+        }
+        for stage, values in sorted(by_stage.items())
+    }
+    return {
+        "throughput": round(len(samples) / duration, 2),
+        "endpoints": endpoints,
+        "stages": stages,
+    }
+
+
+def print_report(results: dict) -> None:
+    print(f"\n{'endpoint':<10} | {'reqs':>6} | {'req/s':>8} | {'errors':>7} | "
+          f"{'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | {'ttfb p50':>8}")
+    for name, summary in results["endpoints"].items():
+        ttfb = f"{summary['ttfb_p50']:8.1f}" if "ttfb_p50" in summary else f"{'-':>8}"
+        print(
+            f"{name:<10} | {summary['requests']:>6} | {summary['throughput']:>8.1f} | "
+            f"{summary['error_rate']:>7.2%} | {summary['p50']:>8.1f} | {summary['p95']:>8.1f} | "
+            f"{summary['p99']:>8.1f} | {ttfb}"
+        )
+    print(f"{'all':<10} | {'':>6} | {results['throughput']:>8.1f} |")
+
+    print(f"\n{'stage':<20} | {'count':>6} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8}")
+    for stage, summary in results["stages"].items():
+        print(
+            f"{stage:<20} | {summary['count']:>6} | {summary['p50']:>8.1f} | "
+            f"{summary['p95']:>8.1f} | {summary['p99']:>8.1f}"
+        )
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Compare a run against a baseline
+
+    Latencies regress when they grow by more than `tolerance` (and by more
+    than MIN_REGRESSION_MS); throughput when it drops by more than
+    `tolerance`; error rates when they rise by more than a percentage point.
+
+    Returns:
+        Descriptions of every regressed metric
+    """
+    regressions = []
+
+    def check_latency(label: str, current: float, previous: float) -> None:
+        if current > previous * (1 + tolerance) and current - previous > MIN_REGRESSION_MS:
+            regressions.append(f"{label}: {previous:.1f} ms -> {current:.1f} ms")
+
+    for name, previous in baseline.get("endpoints", {}).items():
+        current = results["endpoints"].get(name)
+        if current is None:
+            continue
+        for key in ("p50", "p95", "p99"):
+            check_latency(f"{name} {key}", current[key], previous[key])
+        if current["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(f"{name} throughput: {previous['throughput']:.1f}/s -> {current['throughput']:.1f}/s")
+        if current["error_rate"] > previous["error_rate"] + 0.01:
+            regressions.append(f"{name} error rate: {previous['error_rate']:.2%} -> {current['error_rate']:.2%}")
+
+    for stage, previous in baseline.get("stages", {}).items():
+        current = results["stages"].get(stage)
+        if current is None:
+            continue
+        for key in ("p50", "p95"):
+            check_latency(f"stage {stage} {key}", current[key], previous[key])
+
+    return regressions
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode} before becoming ready")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not become ready within {timeout:g}s")
+
+
+def start_servers(args: argparse.Namespace, profile: UpstreamProfile) -> tuple:
+    """Start the fake upstreams and the app; returns (app base URL, processes)"""
+    upstream_port = _free_port()
+    app_port = _free_port()
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+
+    upstreams = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(upstream_port), *profile.to_argv()],
+        cwd=backend_dir
+    )
+    processes = [upstreams]
+    try:
+        _wait_ready(f"{upstream_url}/health", upstreams)
+
+        env = {
+            **os.environ,
+            "GOOGLE_MAPS_API_KEY": "load-test",
+            "GOOGLE_MAPS_BASE_URL": upstream_url,
+            "OLLAMA_BASE_URL": upstream_url,
+            "LLM_WARMUP": "false",
+            # Every run starts cold and leaves nothing behind
+            "INTENT_CACHE_PATH": "",
+            "PLACE_INDEX_PATH": "",
+            "MAPS_CACHE_BACKEND": "memory",
+            # All load comes from one address
+            "RATE_LIMIT_REQUESTS": "1000000000",
+            "RATE_LIMIT_ROUTES": "",
+            "RATE_LIMIT_BACKEND": "memory",
+            **dict(item.split("=", 1) for item in args.app_env),
+        }
+        app = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--host", "127.0.0.1", "--port", str(app_port),
+                "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+            ],
+            cwd=backend_dir,
+            env=env
+        )
+        processes.append(app)
+        app_url = f"http://127.0.0.1:{app_port}"
+        _wait_ready(f"{app_url}/health", app)
+    except Exception:
+        stop_servers(processes)
+        raise
+    return app_url, processes
+
+
+def stop_servers(processes: List[subprocess.Popen]) -> None:
+    for process in reversed(processes):
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds of load before measuring")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Endpoint weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--locations", type=int, default=200,
+                        help="Distinct user locations; fewer means more cache hits")
+    parser.add_argument("--batch-size", type=int, default=10, help="Queries per batch request")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the app")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the app, e.g. TRAVEL_TIME_MODE=hybrid (repeatable)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--save-baseline", help="Write results as the baseline for later runs")
+    parser.add_argument("--baseline", help="Compare against this baseline and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Allowed relative slowdown before a metric counts as regressed")
+    UpstreamProfile.add_arguments(parser)
+    args = parser.parse_args()
+
+    profile = UpstreamProfile.from_args(args)
+    workload = Workload.create(args.seed, args.locations, args.batch_size)
+
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    print(f"  Load test, {args.concurrency} clients for {args.duration:g}s")
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    print(f"upstreams: {profile.describe()}")
+
+    app_url, processes = start_servers(args, profile)
+    try:
+        samples = asyncio.run(generate_load(
+            app_url, args.mix, workload, args.concurrency, args.duration, args.warmup
+        ))
+    finally:
+        stop_servers(processes)
+
+    results = summarize(samples, args.duration)
+    results["config"] = {
+        "duration": args.duration,
+        "concurrency": args.concurrency,
+        "mix": args.mix,
+        "locations": args.locations,
+        "batch_size": args.batch_size,
+        "workers": args.workers,
+        "app_env": args.app_env,
+        "upstreams": profile.describe(),
+    }
+    print_report(results)
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nwrote {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != results["config"]:
+            print("\nwarning: baseline was recorded with a different configuration")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nno regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
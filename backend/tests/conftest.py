@@ -0,0 +1,14 @@
+"""
+Shared test setup
+
+Services are module-level singletons configured from the environment at
+import time, so the environment is fixed here before any app module loads:
+no API key is needed and nothing is written to disk.
+"""
+import os
+
+os.environ.setdefault("GOOGLE_MAPS_API_KEY", "test-key")
+os.environ["INTENT_CACHE_PATH"] = ""
+os.environ["PLACE_INDEX_PATH"] = ""
+os.environ["LLM_WARMUP"] = "false"
+os.environ["RATE_LIMIT_BACKEND"] = "memory"
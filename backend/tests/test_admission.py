@@ -0,0 +1,178 @@
+"""
+Tests for priority admission control
+"""
+import asyncio
+import pytest
+from app.utils.admission import BACKGROUND, BATCH, INTERACTIVE, AdmissionController, LoadShed
+
+
+async def _hold(controller, gate: asyncio.Event, log: list, name: str, priority: int = INTERACTIVE, budget=None):
+    """Take a slot, note the admission and keep the slot until the gate opens"""
+    kwargs = {} if budget is None else {"budget": budget}
+    async with controller.slot(priority, **kwargs):
+        log.append(name)
+        await gate.wait()
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_admits_immediately_below_the_limit():
+    async def scenario():
+        controller = AdmissionController("test", limit=2, max_queue=4)
+        gate, log = asyncio.Event(), []
+        tasks = [asyncio.create_task(_hold(controller, gate, log, name)) for name in "ab"]
+        await _settle()
+        stats = controller.stats()
+        gate.set()
+        await asyncio.gather(*tasks)
+        return controller, log, stats
+
+    controller, log, stats = asyncio.run(scenario())
+    assert log == ["a", "b"]
+    assert stats["active"] == 2 and stats["queued"] == 0
+    assert controller.active == 0
+    assert controller.stats()["admitted"] == 2
+    assert controller.service_time is not None
+
+
+def test_waiters_are_served_by_priority_then_arrival():
+    async def scenario():
+        controller = AdmissionController("test", limit=1, max_queue=8)
+        gate, log = asyncio.Event(), []
+        tasks = [asyncio.create_task(_hold(controller, gate, log, "holder"))]
+        await _settle()
+        for name, priority in (
+            ("background", BACKGROUND), ("batch-1", BATCH), ("interactive", INTERACTIVE), ("batch-2", BATCH),
+        ):
+            tasks.append(asyncio.create_task(_hold(controller, gate, log, name, priority)))
+            await _settle()
+        depths = controller.queue_depths()
+        gate.set()
+        await asyncio.gather(*tasks)
+        return log, depths
+
+    log, depths = asyncio.run(scenario())
+    assert depths == {"interactive": 1, "batch": 2, "background": 1}
+    assert log == ["holder", "interactive", "batch-1", "batch-2", "background"]
+
+
+def test_sheds_up_front_when_the_predicted_wait_exceeds_the_budget():
+    async def scenario():
+        controller = AdmissionController("test", limit=1, max_queue=8)
+        controller.service_time = 1.0
+        gate, log = asyncio.Event(), []
+        holder = asyncio.create_task(_hold(controller, gate, log, "holder"))
+        await _settle()
+
+        # One service time until the slot frees plus one to be served
+        assert controller.predicted_wait(INTERACTIVE) == 1.0
+        with pytest.raises(LoadShed) as shed:
+            async with controller.slot(INTERACTIVE, budget=1.5):
+                pass
+        queued = controller.stats()["queued"]
+        gate.set()
+        await holder
+        return shed.value, queued
+
+    shed, queued = asyncio.run(scenario())
+    assert shed.reason == "deadline"
+    assert queued == 0
+
+
+def test_sheds_a_waiter_whose_budget_runs_out_in_the_queue():
+    async def scenario():
+        controller = AdmissionController("test", limit=1, max_queue=8)
+        gate, log = asyncio.Event(), []
+        holder = asyncio.create_task(_hold(controller, gate, log, "holder"))
+        await _settle()
+
+        # No service time is known yet, so the call is queued rather than shed
+        with pytest.raises(LoadShed) as shed:
+            await _hold(controller, gate, log, "late", budget=0.01)
+        queued = controller.stats()["queued"]
+        gate.set()
+        await holder
+        return controller, log, shed.value, queued
+
+    controller, log, shed, queued = asyncio.run(scenario())
+    assert shed.reason == "deadline"
+    assert log == ["holder"]
+    assert queued == 0
+    # The holder's slot went back to the pool instead of to the shed waiter
+    assert controller.active == 0
+
+
+def test_full_queue_displaces_lower_priority_waiters_only():
+    async def scenario():
+        controller = AdmissionController("test", limit=1, max_queue=1)
+        gate, log = asyncio.Event(), []
+        holder = asyncio.create_task(_hold(controller, gate, log, "holder"))
+        await _settle()
+        batch = asyncio.create_task(_hold(controller, gate, log, "batch", BATCH))
+        await _settle()
+
+        with pytest.raises(LoadShed) as full:
+            await _hold(controller, gate, log, "batch-2", BATCH)
+        interactive = asyncio.create_task(_hold(controller, gate, log, "interactive", INTERACTIVE))
+        await _settle()
+        displaced = await asyncio.gather(batch, return_exceptions=True)
+        gate.set()
+        await asyncio.gather(holder, interactive)
+        return log, full.value, displaced[0]
+
+    log, full, displaced = asyncio.run(scenario())
+    assert full.reason == "queue_full"
+    assert isinstance(displaced, LoadShed) and displaced.reason == "displaced"
+    assert log == ["holder", "interactive"]
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        controller = AdmissionController("test", limit=1, max_queue=8)
+        gate, log = asyncio.Event(), []
+        holder = asyncio.create_task(_hold(controller, gate, log, "holder"))
+        await _settle()
+        waiter = asyncio.create_task(_hold(controller, gate, log, "waiter"))
+        await _settle()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        queued = controller.stats()["queued"]
+        gate.set()
+        await holder
+        return controller, log, queued
+
+    controller, log, queued = asyncio.run(scenario())
+    assert queued == 0
+    assert log == ["holder"]
+    assert controller.active == 0
+
+
+def test_slot_handed_to_a_cancelled_waiter_is_passed_on():
+    async def scenario():
+        controller = AdmissionController("test", limit=1, max_queue=8)
+        first_gate, gate, log = asyncio.Event(), asyncio.Event(), []
+        holder = asyncio.create_task(_hold(controller, first_gate, log, "holder"))
+        await _settle()
+        first = asyncio.create_task(_hold(controller, gate, log, "first"))
+        await _settle()
+        second = asyncio.create_task(_hold(controller, gate, log, "second"))
+        await _settle()
+
+        # Let the holder release, which hands its slot to "first", then
+        # cancel "first" before it gets to run
+        first_gate.set()
+        await holder
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await _settle()
+        gate.set()
+        await second
+        return controller, log
+
+    controller, log = asyncio.run(scenario())
+    assert log == ["holder", "second"]
+    assert controller.active == 0
+    assert controller.stats()["queued"] == 0
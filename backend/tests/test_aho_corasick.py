@@ -0,0 +1,57 @@
+"""
+Tests for the Aho-Corasick multi-pattern matcher
+"""
+from app.utils.aho_corasick import AhoCorasick
+
+
+def _matches(patterns, text):
+    matcher = AhoCorasick()
+    for pattern in patterns:
+        matcher.add(pattern, pattern)
+    return sorted((start, end, value) for start, end, value in matcher.iter_matches(text))
+
+
+def test_finds_every_occurrence():
+    assert _matches(["ramen", "sushi"], "ramen or sushi or ramen") == [
+        (0, 5, "ramen"), (9, 14, "sushi"), (18, 23, "ramen"),
+    ]
+
+
+def test_overlapping_and_nested_patterns_are_all_reported():
+    assert _matches(["he", "she", "his", "hers"], "ushers") == [
+        (1, 4, "she"), (2, 4, "he"), (2, 6, "hers"),
+    ]
+
+
+def test_shorter_pattern_inside_a_longer_one():
+    # Callers pick the longest match; the matcher reports both
+    assert _matches(["coffee", "coffee shop"], "coffee shop") == [
+        (0, 6, "coffee"), (0, 11, "coffee shop"),
+    ]
+
+
+def test_matches_ignore_word_boundaries():
+    # Whole-word filtering is left to the caller
+    assert _matches(["kemang"], "kemangan") == [(0, 6, "kemang")]
+
+
+def test_failure_links_recover_after_a_partial_match():
+    assert _matches(["abcd", "bce"], "abce") == [(1, 4, "bce")]
+
+
+def test_patterns_added_after_a_search_are_found():
+    matcher = AhoCorasick()
+    matcher.add("ramen", 1)
+    assert list(matcher.iter_matches("sushi")) == []
+
+    matcher.add("sushi", 2)
+    assert list(matcher.iter_matches("sushi")) == [(0, 5, 2)]
+    assert len(matcher) == 2
+
+
+def test_empty_pattern_and_text():
+    matcher = AhoCorasick()
+    matcher.add("", "empty")
+
+    assert len(matcher) == 0
+    assert list(matcher.iter_matches("")) == []
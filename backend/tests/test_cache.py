@@ -0,0 +1,74 @@
+"""
+Tests for the in-process TTL cache
+"""
+import pytest
+from app.utils import cache as cache_module
+from app.utils.cache import MISSING, TTLCache
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr(cache_module, "time", clock)
+    return clock
+
+
+def test_entry_is_fresh_then_stale_then_expired(clock):
+    cache = TTLCache("test", max_entries=10, ttl=10.0, stale_ttl=5.0)
+    cache.set("key", "value")
+
+    assert cache.lookup("key") == ("value", False)
+    clock.now += 10.0
+    assert cache.lookup("key") == ("value", True)
+    # get() only returns fresh values
+    assert cache.get("key") is None
+    clock.now += 4.9
+    assert cache.lookup("key") == ("value", True)
+    clock.now += 0.1
+    assert cache.lookup("key") == (MISSING, False)
+    assert len(cache) == 0
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["stale_hits"], stats["misses"], stats["expirations"]) == (1, 3, 1, 1)
+
+
+def test_per_entry_ttl_and_stale_window_override_the_defaults(clock):
+    cache = TTLCache("test", max_entries=10, ttl=10.0, stale_ttl=60.0)
+    cache.set("negative", [], ttl=2.0, stale_ttl=0.0)
+
+    clock.now += 1.9
+    assert cache.lookup("negative") == ([], False)
+    clock.now += 0.1
+    assert cache.lookup("negative") == (MISSING, False)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache("test", max_entries=2, ttl=10.0)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_budget_evicts_and_skips_oversized_values(clock):
+    cache = TTLCache("test", max_entries=10, ttl=10.0, max_bytes=10, sizeof=len)
+    cache.set("a", "12345")
+    cache.set("b", "123456")
+
+    assert cache.get("a") is None
+    assert cache.get("b") == "123456"
+    cache.set("huge", "x" * 11)
+    assert cache.get("huge") is None
+    assert cache.get("b") == "123456"
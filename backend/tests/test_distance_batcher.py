@@ -0,0 +1,159 @@
+"""
+Tests for batching Distance Matrix lookups across queries
+"""
+import asyncio
+from app.services.distance_batcher import MAX_DESTINATIONS, DistanceMatrixBatcher
+from app.utils.deadline import remaining, start_deadline
+
+
+class FakeClient:
+    """Distance Matrix whose elements name the origin and destination they are for"""
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.requests = []
+        self.deadlines = []
+
+    async def distance_matrix(self, origins, destinations, mode):
+        self.requests.append((list(origins), list(destinations), mode))
+        self.deadlines.append(remaining())
+        if self.error is not None:
+            raise self.error
+        return {"rows": [
+            {"elements": [{"origin": origin, "destination": destination} for destination in destinations]}
+            for origin in origins
+        ]}
+
+
+def _point(i: int) -> tuple:
+    return (-6.0 - i / 1000, 106.0)
+
+
+def _run(batcher, lookups, mode="walking"):
+    async def scenario():
+        return await asyncio.gather(
+            *(batcher.elements_for(origin, destinations, mode) for origin, destinations in lookups),
+            return_exceptions=True
+        )
+    return asyncio.run(scenario())
+
+
+def _assert_rows(results, lookups):
+    for elements, (origin, destinations) in zip(results, lookups):
+        assert elements == [{"origin": origin, "destination": d} for d in destinations]
+
+
+def test_concurrent_lookups_share_a_request_and_get_their_own_rows():
+    client = FakeClient()
+    batcher = DistanceMatrixBatcher(client, window=0.01, min_fill=0.5)
+    o1, o2 = _point(1), _point(2)
+    d1, d2, d3 = _point(11), _point(12), _point(13)
+    lookups = [(o1, [d1, d2]), (o2, [d3, d2])]
+
+    results = _run(batcher, lookups)
+
+    # The shared destination is sent once
+    assert client.requests == [([o1, o2], [d1, d2, d3], "walking")]
+    _assert_rows(results, lookups)
+    assert batcher.stats() == {"lookups": 2, "requests": 1, "elements": 6, "lookups_per_request": 2.0}
+
+
+def test_modes_are_batched_separately():
+    client = FakeClient()
+    batcher = DistanceMatrixBatcher(client, window=0.01)
+
+    async def scenario():
+        await asyncio.gather(
+            batcher.elements_for(_point(1), [_point(11)], "walking"),
+            batcher.elements_for(_point(1), [_point(11)], "driving"),
+        )
+
+    asyncio.run(scenario())
+    assert sorted(mode for _, _, mode in client.requests) == ["driving", "walking"]
+
+
+def test_sparse_merges_below_min_fill_get_their_own_request():
+    client = FakeClient()
+    batcher = DistanceMatrixBatcher(client, window=0.01, min_fill=0.6)
+    # Merged, only 4 of the 2 x 4 elements would be wanted
+    lookups = [(_point(1), [_point(11), _point(12)]), (_point(2), [_point(13), _point(14)])]
+
+    results = _run(batcher, lookups)
+
+    assert len(client.requests) == 2
+    _assert_rows(results, lookups)
+
+
+def test_requests_stay_within_the_origin_limit():
+    client = FakeClient()
+    batcher = DistanceMatrixBatcher(client, window=0.01, min_fill=0.0)
+    lookups = [(_point(i), [_point(100)]) for i in range(26)]
+
+    results = _run(batcher, lookups)
+
+    assert sorted(len(origins) for origins, _, _ in client.requests) == [1, 25]
+    _assert_rows(results, lookups)
+
+
+def test_requests_stay_within_the_element_limit():
+    client = FakeClient()
+    batcher = DistanceMatrixBatcher(client, window=0.01, min_fill=0.0)
+    destinations = [_point(100 + j) for j in range(25)]
+    lookups = [(_point(i), destinations) for i in range(5)]
+
+    results = _run(batcher, lookups)
+
+    # 4 origins x 25 destinations is the 100-element maximum
+    assert sorted(len(origins) * len(dests) for origins, dests, _ in client.requests) == [25, 100]
+    _assert_rows(results, lookups)
+
+
+def test_lookup_wider_than_the_destination_limit_is_split():
+    client = FakeClient()
+    batcher = DistanceMatrixBatcher(client, window=0.01)
+    lookups = [(_point(1), [_point(100 + j) for j in range(MAX_DESTINATIONS + 5)])]
+
+    results = _run(batcher, lookups)
+
+    assert sorted(len(dests) for _, dests, _ in client.requests) == [5, 25]
+    _assert_rows(results, lookups)
+
+
+def test_failed_request_raises_in_every_waiter():
+    error = RuntimeError("OVER_QUERY_LIMIT")
+    batcher = DistanceMatrixBatcher(FakeClient(error=error), window=0.01)
+
+    results = _run(batcher, [(_point(1), [_point(11)]), (_point(2), [_point(11)])])
+
+    assert results == [error, error]
+
+
+def test_cancelled_lookup_does_not_break_the_batch():
+    client = FakeClient()
+    batcher = DistanceMatrixBatcher(client, window=0.01)
+
+    async def scenario():
+        gone = asyncio.create_task(batcher.elements_for(_point(1), [_point(11)], "walking"))
+        kept = asyncio.create_task(batcher.elements_for(_point(2), [_point(12)], "walking"))
+        await asyncio.sleep(0)
+        gone.cancel()
+        return await kept
+
+    assert asyncio.run(scenario()) == [{"origin": _point(2), "destination": _point(12)}]
+    assert client.requests == [([_point(2)], [_point(12)], "walking")]
+
+
+def test_shared_request_is_not_bound_by_the_first_callers_deadline():
+    client = FakeClient()
+    batcher = DistanceMatrixBatcher(client, window=0.01)
+
+    async def lookup(budget, i):
+        start_deadline(budget)
+        return await batcher.elements_for(_point(i), [_point(11)], "walking")
+
+    async def scenario():
+        return await asyncio.gather(lookup(0.5, 1), lookup(0, 2))
+
+    asyncio.run(scenario())
+    assert len(client.requests) == 1
+    assert client.deadlines == [None]
@@ -0,0 +1,364 @@
+"""
+Tests for places search and travel times in the Google Maps service
+"""
+import asyncio
+import math
+import time
+import pytest
+from app.schemas.models import Place
+from app.services.google_maps_service import GoogleMapsService
+from app.services.travel_estimator import format_distance, format_duration
+from app.utils.geo import EARTH_RADIUS_M, haversine_m
+from app.utils.deadline import DeadlineExceeded, remaining, start_deadline
+from app.utils.resilience import CircuitOpenError
+
+
+def _result(i: int, lat: float, lng: float) -> dict:
+    return {
+        "place_id": f"p{i}",
+        "name": f"Ramen {i}",
+        "formatted_address": "Jakarta",
+        "geometry": {"location": {"lat": lat, "lng": lng}},
+        "rating": 4.5,
+        "user_ratings_total": 100,
+    }
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = GoogleMapsService()
+    service.calls = []
+
+    async def geocode(address):
+        service.calls.append(("geocode", address))
+        return [{"geometry": {"location": {"lat": -6.24, "lng": 106.80}}}]
+
+    async def places(query, location=None, radius=None):
+        service.calls.append(("places", query, location))
+        return {"results": [_result(i, location[0], location[1]) for i in range(3)]}
+
+    monkeypatch.setattr(service.client, "geocode", geocode)
+    monkeypatch.setattr(service.client, "places", places)
+    return service
+
+
+def test_coordinates_search_skips_the_forward_geocode(service):
+    places = asyncio.run(service.search_places("ramen", coordinates=(-6.2001, 106.8001)))
+
+    assert len(places) == 3
+    assert service.calls == [("places", "ramen", (-6.2001, 106.8001))]
+
+
+def test_coordinates_in_the_same_cell_share_a_cached_search(service):
+    async def scenario():
+        await service.search_places("ramen", coordinates=(-6.20010, 106.80010))
+        await service.search_places("Ramen", coordinates=(-6.20012, 106.80012))
+
+    asyncio.run(scenario())
+    assert [call[0] for call in service.calls] == ["places"]
+
+
+def test_location_search_geocodes_first(service):
+    asyncio.run(service.search_places("ramen", location="Blok M"))
+
+    assert service.calls == [
+        ("geocode", "Blok M"),
+        ("places", "ramen near Blok M", (-6.24, 106.80)),
+    ]
+
+
+def test_search_needs_a_location_or_coordinates(service):
+    with pytest.raises(ValueError):
+        asyncio.run(service.search_places("ramen"))
+
+
+def _places_entry(service) -> tuple:
+    """The single places cache entry as (value, size, fresh_until, stale_until)"""
+    (entry,) = service.places_cache._entries.values()
+    return entry
+
+
+def test_empty_search_is_cached_briefly_and_never_served_stale(service, monkeypatch):
+    async def no_places(query, location=None, radius=None):
+        service.calls.append(("places", query, location))
+        return {"results": []}
+
+    monkeypatch.setattr(service.client, "places", no_places)
+
+    async def scenario():
+        first = await service.search_places("ramen", coordinates=(-6.2, 106.8))
+        second = await service.search_places("ramen", coordinates=(-6.2, 106.8))
+        return first, second
+
+    assert asyncio.run(scenario()) == ([], [])
+    assert len(service.calls) == 1
+    value, _, fresh_until, stale_until = _places_entry(service)
+    assert value == []
+    assert fresh_until - time.monotonic() == pytest.approx(service.places_negative_ttl, abs=1.0)
+    assert stale_until == fresh_until
+
+
+def test_found_places_keep_the_normal_ttl_and_stale_window(service):
+    asyncio.run(service.search_places("ramen", coordinates=(-6.2, 106.8)))
+
+    _, _, fresh_until, stale_until = _places_entry(service)
+    assert fresh_until - time.monotonic() == pytest.approx(service.places_cache.ttl, abs=1.0)
+    assert stale_until - fresh_until == pytest.approx(service.places_cache.stale_ttl)
+
+
+@pytest.mark.parametrize("error", [CircuitOpenError("places"), DeadlineExceeded("request deadline exceeded")])
+def test_searches_that_never_reached_the_upstream_are_not_cached(service, monkeypatch, error):
+    async def refused(query, location=None, radius=None):
+        service.calls.append(("places", query, location))
+        raise error
+
+    monkeypatch.setattr(service.client, "places", refused)
+
+    async def scenario():
+        await service.search_places("ramen", coordinates=(-6.2, 106.8))
+        await service.search_places("ramen", coordinates=(-6.2, 106.8))
+
+    asyncio.run(scenario())
+    assert len(service.places_cache) == 0
+    assert len(service.calls) == 2
+
+
+def test_failed_search_is_cached_as_a_negative_entry(service, monkeypatch):
+    async def broken(query, location=None, radius=None):
+        raise RuntimeError("upstream returned 500")
+
+    monkeypatch.setattr(service.client, "places", broken)
+
+    assert asyncio.run(service.search_places("ramen", coordinates=(-6.2, 106.8))) == []
+    value, _, fresh_until, stale_until = _places_entry(service)
+    assert value == []
+    assert stale_until == fresh_until
+
+
+def test_stale_search_is_served_while_one_background_refresh_runs(service, monkeypatch):
+    release = asyncio.Event()
+
+    async def slow_places(query, location=None, radius=None):
+        service.calls.append(("places", query, location))
+        await release.wait()
+        return {"results": [_result(9, location[0], location[1])]}
+
+    async def scenario():
+        await service.search_places("ramen", coordinates=(-6.2, 106.8))
+        # Make the cached entry stale but still within its stale window
+        (key,) = service.places_cache._entries
+        value = service.places_cache.lookup(key)[0]
+        service.places_cache.set(key, value, ttl=0.0, stale_ttl=60.0)
+        monkeypatch.setattr(service.client, "places", slow_places)
+
+        stale = await asyncio.gather(*(
+            service.search_places("ramen", coordinates=(-6.2, 106.8)) for _ in range(3)
+        ))
+        await asyncio.sleep(0)
+        refreshing = len(service._places_refreshes)
+        release.set()
+        await asyncio.gather(*service._places_refreshes.values())
+        fresh = await service.search_places("ramen", coordinates=(-6.2, 106.8))
+        return stale, refreshing, fresh
+
+    stale, refreshing, fresh = asyncio.run(scenario())
+    assert all(len(places) == 3 for places in stale)
+    assert refreshing == 1
+    assert [call[0] for call in service.calls] == ["places", "places"]
+    assert [place.place_id for place in fresh] == ["p9"]
+
+
+def test_background_refresh_is_not_bound_by_the_request_deadline(service, monkeypatch):
+    deadlines = []
+
+    async def places(query, location=None, radius=None):
+        deadlines.append(remaining())
+        return {"results": [_result(9, location[0], location[1])]}
+
+    async def scenario():
+        monkeypatch.setattr(service.client, "places", places)
+        start_deadline(0.5)
+        service._schedule_places_refresh(("ramen", "@qqguwg", 5000), "ramen", None, 5000, (-6.2, 106.8))
+        await asyncio.gather(*service._places_refreshes.values())
+
+    asyncio.run(scenario())
+    assert deadlines == [None]
+
+
+def test_aclose_cancels_background_refreshes_before_closing_the_client(service, monkeypatch):
+    order = []
+
+    async def hanging_places(query, location=None, radius=None):
+        try:
+            await asyncio.sleep(60)
+        finally:
+            order.append("refresh ended")
+
+    async def client_aclose():
+        order.append("client closed")
+
+    async def scenario():
+        monkeypatch.setattr(service.client, "places", hanging_places)
+        monkeypatch.setattr(service.client, "aclose", client_aclose)
+        service._schedule_places_refresh(("ramen", "@qqguwg", 5000), "ramen", None, 5000, (-6.2, 106.8))
+        await asyncio.sleep(0)
+        await service.aclose()
+
+    asyncio.run(scenario())
+    assert order == ["refresh ended", "client closed"]
+    assert service._places_refreshes == {}
+
+
+# Seconds per straight-line meter the fake Distance Matrix reports per mode
+_FAKE_PACE = {"walking": 1.0, "bicycling": 0.3, "driving": 0.15}
+
+
+def _place_at(i: int, meters: float) -> Place:
+    lat = math.degrees(meters / EARTH_RADIUS_M)
+    return Place(name=f"Place {i}", address="Jakarta", place_id=f"p{i}", lat=lat, lng=0.0, maps_url="")
+
+
+@pytest.fixture
+def matrix(service, monkeypatch):
+    """Fake Distance Matrix; records (mode, destination count) per request"""
+    requests = []
+    gates = {}
+
+    async def distance_matrix(origins, destinations, mode):
+        requests.append((mode, len(destinations)))
+        if mode in gates:
+            await gates[mode].wait()
+        meters = haversine_m(origins[0][0], origins[0][1], *zip(*destinations))
+        elements = [
+            {
+                "status": "OK",
+                "duration": {"value": int(m * _FAKE_PACE[mode]), "text": format_duration(m * _FAKE_PACE[mode])},
+                "distance": {"value": int(m * 1.3), "text": format_distance(m * 1.3)},
+            }
+            for m in meters
+        ]
+        return {"rows": [{"elements": elements}]}
+
+    monkeypatch.setattr(service.client, "distance_matrix", distance_matrix)
+    return requests, gates
+
+
+def test_exact_mode_asks_distance_matrix_for_every_place(service, matrix):
+    requests, _ = matrix
+    places = [_place_at(0, 200), _place_at(1, 1500), _place_at(2, 8000)]
+
+    asyncio.run(service.calculate_distances(0.0, 0.0, places))
+
+    assert sorted(requests) == [("bicycling", 3), ("driving", 3), ("walking", 3)]
+    assert [place.recommended_transport for place in places] == ["walk", "bike", "drive"]
+    assert {place.travel_time_source for place in places} == {"exact"}
+    assert places[0].walk_seconds == 200
+    # Every element calibrates the local model
+    assert service.travel_estimator.observations == 9
+
+
+def test_estimate_mode_never_calls_upstream(service, matrix):
+    requests, _ = matrix
+    service.travel_time_mode = "estimate"
+    places = [_place_at(0, 200), _place_at(1, 1500), _place_at(2, 8000)]
+    updates = []
+
+    asyncio.run(service.calculate_distances(0.0, 0.0, places, on_update=updates.append))
+
+    assert requests == []
+    assert updates == ["estimate"]
+    assert [place.recommended_transport for place in places] == ["walk", "bike", "drive"]
+    assert {place.travel_time_source for place in places} == {"estimate"}
+    assert places[0].walk_time == "3 mins"
+
+
+def test_hybrid_mode_verifies_only_borderline_places(service, matrix):
+    requests, _ = matrix
+    service.travel_time_mode = "hybrid"
+    # Estimated walks of 100 s, 420 s (at the walk threshold), 1000 s and 8000 s
+    places = [_place_at(0, 100), _place_at(1, 420), _place_at(2, 1000), _place_at(3, 8000)]
+
+    asyncio.run(service.calculate_distances(0.0, 0.0, places))
+
+    assert sorted(requests) == [("bicycling", 1), ("driving", 1), ("walking", 1)]
+    assert [place.travel_time_source for place in places] == ["estimate", "exact", "estimate", "estimate"]
+    assert places[1].walk_seconds == 420
+    assert places[1].recommended_transport == "walk"
+
+
+def test_hybrid_mode_uses_estimates_while_the_circuit_is_open(service, matrix, monkeypatch):
+    requests, _ = matrix
+    service.travel_time_mode = "hybrid"
+    monkeypatch.setattr(service.client, "available", lambda api: False)
+    places = [_place_at(0, 420)]
+
+    asyncio.run(service.calculate_distances(0.0, 0.0, places))
+
+    assert requests == []
+    assert places[0].travel_time_source == "estimate"
+
+
+def test_borderline_place_settles_as_soon_as_a_short_walk_arrives(service, matrix):
+    requests, gates = matrix
+    service.travel_time_mode = "hybrid"
+    places = [_place_at(0, 400), _place_at(1, 500)]
+    settled = {}
+
+    def on_update(mode):
+        settled[mode] = [place.recommended_transport for place in places]
+        if mode == "walking":
+            # Bicycling and driving are still held back here
+            gates["bicycling"].set()
+            gates["driving"].set()
+
+    async def scenario():
+        gates["bicycling"] = asyncio.Event()
+        gates["driving"] = asyncio.Event()
+        await service.calculate_distances(0.0, 0.0, places, on_update=on_update)
+
+    asyncio.run(scenario())
+    # Both places are near the walk threshold, so both are verified upstream
+    assert sorted(requests) == [("bicycling", 2), ("driving", 2), ("walking", 2)]
+    # The 400 s walk decides it; the 500 s walk needs the bike time first
+    assert settled["walking"] == ["walk", None]
+    assert places[1].recommended_transport == "bike"
+
+
+def test_partial_cache_hit_requests_only_missing_places_and_keeps_order(service, monkeypatch):
+    requested = []
+
+    async def distance_matrix(origins, destinations, mode):
+        requested.append((mode, [round(lat, 6) for lat, _ in destinations]))
+        meters = haversine_m(origins[0][0], origins[0][1], *zip(*destinations))
+        return {"rows": [{"elements": [
+            {"status": "OK", "duration": {"value": int(m), "text": "x"}, "distance": {"value": int(m), "text": "y"}}
+            for m in meters
+        ]}]}
+
+    monkeypatch.setattr(service.client, "distance_matrix", distance_matrix)
+    a, b, c = _place_at(0, 100), _place_at(1, 2000), _place_at(2, 5000)
+
+    async def scenario():
+        await service.calculate_distances(0.0, 0.0, [a.model_copy(), c.model_copy()])
+        requested.clear()
+        places = [a.model_copy(), b.model_copy(), c.model_copy()]
+        await service.calculate_distances(0.0, 0.0, places)
+        return places
+
+    places = asyncio.run(scenario())
+    assert sorted(requested) == [(mode, [round(b.lat, 6)]) for mode in ("bicycling", "driving", "walking")]
+    assert [place.walk_seconds for place in places] == [100, 2000, 5000]
+    stats = service.distance_cache_stats()["walking"]
+    assert (stats["miss_requests"], stats["partial_hit_requests"], stats["full_hit_requests"]) == (1, 1, 0)
+
+
+def test_distance_cache_ttl_is_set_per_mode(monkeypatch):
+    monkeypatch.setenv("DISTANCE_CACHE_TTL_WALKING", "1000")
+    monkeypatch.setenv("DISTANCE_CACHE_TTL_DRIVING", "60")
+    service = GoogleMapsService()
+
+    assert service.distance_caches["walking"].ttl == 1000.0
+    assert service.distance_caches["driving"].ttl == 60.0
+    service.distance_caches["driving"].set(("cell", "p1"), {"status": "OK"})
+    _, _, fresh_until, _ = service.distance_caches["driving"]._entries[("cell", "p1")]
+    assert fresh_until - time.monotonic() == pytest.approx(60.0, abs=1.0)
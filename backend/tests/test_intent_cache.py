@@ -0,0 +1,144 @@
+"""
+Tests for the two-tier intent cache
+"""
+import asyncio
+import pytest
+from app.schemas.models import LLMIntent
+from app.services import intent_cache as intent_cache_module
+from app.services.intent_cache import IntentCache, normalize_query
+from app.utils import cache as cache_module
+
+INTENT = LLMIntent(query="ramen", location="Blok M", category="restaurant")
+
+
+class FakeTime:
+    """Stands in for the time module: wall clock and monotonic clock move together"""
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr(cache_module, "time", clock)
+    monkeypatch.setattr(intent_cache_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "intents.sqlite3")
+
+
+def test_normalize_query_ignores_case_spacing_and_trailing_punctuation():
+    assert normalize_query("  Ramen   near Blok M?! ") == "ramen near blok m"
+
+
+def test_round_trip_through_memory_and_disk(path):
+    async def scenario():
+        writer = IntentCache(path, max_entries=10)
+        await writer.set("ramen near blok m", "llama", "v1", INTENT)
+        from_memory = await writer.get("ramen near blok m", "llama", "v1")
+        writer.close()
+
+        # A new instance, as after a restart, only has the disk tier
+        reader = IntentCache(path, max_entries=10)
+        from_disk = await reader.get("Ramen near Blok M?", "llama", "v1")
+        again = await reader.get("ramen near blok m", "llama", "v1")
+        stats = reader.stats()
+        reader.close()
+        return from_memory, from_disk, again, stats
+
+    from_memory, from_disk, again, stats = asyncio.run(scenario())
+    assert from_memory == from_disk == again == INTENT
+    assert stats["disk_hits"] == 1
+    assert stats["hits"] == 1
+
+
+def test_model_and_prompt_version_are_part_of_the_key(path):
+    async def scenario():
+        cache = IntentCache(path, max_entries=10)
+        await cache.set("ramen", "llama", "v1", INTENT)
+        results = [
+            await cache.get("ramen", "mistral", "v1"),
+            await cache.get("ramen", "llama", "v2"),
+        ]
+        cache.close()
+        return results
+
+    assert asyncio.run(scenario()) == [None, None]
+
+
+def test_entries_expire_in_both_tiers(path, clock):
+    async def scenario():
+        cache = IntentCache(path, max_entries=10, ttl=3600.0)
+        await cache.set("ramen", "llama", "v1", INTENT)
+        clock.now += 3599.0
+        fresh = await cache.get("ramen", "llama", "v1")
+        clock.now += 1.0
+        expired = await cache.get("ramen", "llama", "v1")
+        cache.close()
+        return fresh, expired, cache.disk_hits
+
+    fresh, expired, disk_hits = asyncio.run(scenario())
+    assert fresh == INTENT
+    assert expired is None
+    # The disk row was too old as well, so it was not served instead
+    assert disk_hits == 0
+
+
+def test_disk_hit_keeps_the_entry_original_expiry(path, clock):
+    async def scenario():
+        writer = IntentCache(path, max_entries=10, ttl=3600.0)
+        await writer.set("ramen", "llama", "v1", INTENT)
+        writer.close()
+
+        clock.now += 3000.0
+        reader = IntentCache(path, max_entries=10, ttl=3600.0)
+        loaded = await reader.get("ramen", "llama", "v1")
+        clock.now += 600.0
+        expired = await reader.get("ramen", "llama", "v1")
+        reader.close()
+        return loaded, expired
+
+    assert asyncio.run(scenario()) == (INTENT, None)
+
+
+def test_preload_warms_memory_with_recent_unexpired_entries(path, clock):
+    async def scenario():
+        writer = IntentCache(path, max_entries=10, ttl=3600.0)
+        await writer.set("old", "llama", "v1", INTENT)
+        clock.now += 3000.0
+        for query in ("sushi", "ramen", "pizza"):
+            await writer.set(query, "llama", "v1", INTENT)
+            clock.now += 1.0
+        await writer.set("other model", "mistral", "v1", INTENT)
+        writer.close()
+
+        clock.now += 700.0
+        # Room for two entries: the two most recent ones are loaded
+        reader = IntentCache(path, max_entries=2, ttl=3600.0)
+        loaded = await reader.preload("llama", "v1")
+        keys = set(reader.memory._entries)
+        reader.close()
+        return loaded, keys
+
+    loaded, keys = asyncio.run(scenario())
+    assert loaded == 2
+    assert keys == {IntentCache.make_key(query, "llama", "v1") for query in ("ramen", "pizza")}
+
+
+def test_memory_only_cache_without_a_path():
+    async def scenario():
+        cache = IntentCache("", max_entries=10)
+        await cache.set("ramen", "llama", "v1", INTENT)
+        return await cache.get("ramen", "llama", "v1"), await cache.preload("llama", "v1")
+
+    assert asyncio.run(scenario()) == (INTENT, 0)
@@ -0,0 +1,66 @@
+"""
+Tests for incremental JSON object scanning
+"""
+import json
+import pytest
+from app.utils.json_stream import JsonObjectScanner
+
+
+def _feed_all(chunks):
+    scanner = JsonObjectScanner()
+    completed = []
+    for chunk in chunks:
+        completed.extend(scanner.feed(chunk))
+    return scanner, completed
+
+
+def test_complete_object_in_one_chunk():
+    _, completed = _feed_all(['{"query": "ramen"}'])
+
+    assert completed == ['{"query": "ramen"}']
+
+
+def test_text_around_objects_is_ignored():
+    _, completed = _feed_all(['Sure! {"a": 1} and then {"b": 2} done'])
+
+    assert completed == ['{"a": 1}', '{"b": 2}']
+
+
+def test_nested_objects_complete_at_the_outer_brace():
+    _, completed = _feed_all(['{"a": {"b": {}}, "c": 1}'])
+
+    assert [json.loads(text) for text in completed] == [{"a": {"b": {}}, "c": 1}]
+
+
+@pytest.mark.parametrize("text", [
+    '{"query": "curly } brace"}',
+    '{"query": "open { brace"}',
+    '{"query": "say \\"hi\\" }"}',
+    '{"query": "back\\\\slash", "location": "x"}',
+])
+def test_braces_and_quotes_inside_strings_do_not_count(text):
+    _, completed = _feed_all([text])
+
+    assert completed == [text]
+    json.loads(completed[0])
+
+
+def test_object_split_across_chunks_at_every_position():
+    text = '{"query": "ra\\"men {x}", "location": "Blok M"}'
+    for cut in range(1, len(text)):
+        scanner, completed = _feed_all([text[:cut], text[cut:]])
+        assert completed == [text], cut
+
+
+def test_one_character_chunks():
+    text = '{"a": "\\\\", "b": "}"}'
+    _, completed = _feed_all(list(text))
+
+    assert completed == [text]
+
+
+def test_partial_object_is_available_as_text():
+    scanner, completed = _feed_all(['noise {"query": "ram'])
+
+    assert completed == []
+    assert scanner.text() == '{"query": "ram'
@@ -0,0 +1,232 @@
+"""
+Tests for LLM intent extraction routing
+"""
+import asyncio
+import json
+import httpx
+import pytest
+from app.schemas.models import LLMIntent
+from app.services.llm_service import IntentParseError, LLMService, grounding_confidence
+from app.services.rule_intent import RuleMatch
+from app.utils.admission import BATCH, INTERACTIVE, current_priority, set_priority
+from app.utils.deadline import start_deadline
+from app.utils.metrics import LLM_EARLY_STOPS, LLM_ESCALATIONS
+
+
+def _unmatched_service(monkeypatch) -> LLMService:
+    """Service whose rule extractor never answers, so every query reaches the LLM path"""
+    service = LLMService()
+    monkeypatch.setattr(
+        service.rule_extractor, "classify", lambda query: RuleMatch(None, None, "restaurant", 0.0)
+    )
+    return service
+
+
+def test_identical_queries_coalesce_only_within_a_priority(monkeypatch):
+    service = _unmatched_service(monkeypatch)
+    priorities = []
+
+    async def extract(user_query):
+        priorities.append(current_priority())
+        await asyncio.sleep(0.01)
+        return None
+
+    monkeypatch.setattr(service, "_extract_with_llm", extract)
+
+    async def batch_item():
+        set_priority(BATCH)
+        return await service.extract_intent("quiet place to read")
+
+    async def scenario():
+        await asyncio.gather(
+            batch_item(),
+            service.extract_intent("quiet place to read"),
+            service.extract_intent("Quiet place to read"),
+        )
+
+    asyncio.run(scenario())
+    assert sorted(priorities) == [INTERACTIVE, BATCH]
+    assert service.single_flight.coalesced == 1
+
+
+def test_caller_out_of_time_falls_back_while_the_shared_extraction_goes_on(monkeypatch):
+    service = _unmatched_service(monkeypatch)
+    release = asyncio.Event()
+    llm_intent = LLMIntent(query="library", location="Kemang Jakarta")
+
+    async def extract(user_query):
+        await release.wait()
+        return llm_intent
+
+    monkeypatch.setattr(service, "_extract_with_llm", extract)
+
+    async def caller(budget):
+        start_deadline(budget)
+        return await service.extract_intent("quiet place to read")
+
+    async def scenario():
+        hurried = asyncio.create_task(caller(0.02))
+        patient = asyncio.create_task(caller(0))
+        hurried_intent = await hurried
+        release.set()
+        return hurried_intent, await patient
+
+    hurried, patient = asyncio.run(scenario())
+    assert hurried == service._fallback_extraction("quiet place to read")
+    assert patient == llm_intent
+    assert service.path_counts["fallback"] == 1
+
+
+def test_grounding_confidence_counts_words_the_user_wrote():
+    assert grounding_confidence("ramen near blok m", LLMIntent(query="ramen", location="Blok M")) == 1.0
+    assert grounding_confidence("ramen near blok m", LLMIntent(query="sushi", location="Blok M")) == pytest.approx(2 / 3)
+    # Plural and singular forms match, and the default location is not held against the model
+    assert grounding_confidence("cafes", LLMIntent(query="cafe", location="Jakarta")) == 1.0
+    assert grounding_confidence("something good", LLMIntent(query="", location="Jakarta")) == 0.0
+
+
+def _tiered_service(monkeypatch, small_result) -> tuple:
+    """
+    Service with a small and a large model whose generations are faked
+
+    Args:
+        small_result: Intent the small model returns, or the exception it raises
+
+    Returns:
+        (service, names of the tiers that generated, in order)
+    """
+    monkeypatch.setenv("LLM_SMALL_MODEL", "small-model")
+    monkeypatch.setenv("LLM_SMALL_MAX_WORDS", "4")
+    service = LLMService()
+    tiers = []
+
+    async def generate_with(tier, user_query):
+        tiers.append(tier.name)
+        if tier is service.large_tier:
+            return LLMIntent(query="large", location="Jakarta")
+        if isinstance(small_result, Exception):
+            raise small_result
+        return small_result
+
+    monkeypatch.setattr(service, "_generate_with", generate_with)
+    return service, tiers
+
+
+def test_short_queries_route_to_the_small_model_while_it_is_up(monkeypatch):
+    service, _ = _tiered_service(monkeypatch, None)
+
+    assert service._route("ramen in blok m") is service.small_tier
+    assert service._route("a quiet cafe with good wifi near me") is service.large_tier
+    for _ in range(service.small_tier.guard.breaker.failure_threshold):
+        service.small_tier.guard.breaker.record_failure()
+    assert service._route("ramen in blok m") is service.large_tier
+
+
+def test_without_a_small_model_everything_goes_to_the_large_one(monkeypatch):
+    monkeypatch.setenv("LLM_SMALL_MODEL", "")
+    service = LLMService()
+
+    assert service.tiers == [service.large_tier]
+    assert service._route("ramen") is service.large_tier
+
+
+def test_grounded_small_model_intent_is_used(monkeypatch):
+    intent = LLMIntent(query="ramen", location="Blok M")
+    service, tiers = _tiered_service(monkeypatch, intent)
+
+    assert asyncio.run(service._generate_intent("ramen in blok m")) == intent
+    assert tiers == ["small"]
+
+
+@pytest.mark.parametrize("small_result, reason", [
+    (IntentParseError("no JSON object", "sure! here you go"), "invalid"),
+    (LLMIntent(query="sushi", location="Senayan"), "low_confidence"),
+])
+def test_unusable_small_model_intent_escalates(monkeypatch, small_result, reason):
+    service, tiers = _tiered_service(monkeypatch, small_result)
+    escalations = LLM_ESCALATIONS.labels(reason)
+    before = escalations.value
+
+    intent = asyncio.run(service._generate_intent("ramen in blok m"))
+    assert intent.query == "large"
+    assert tiers == ["small", "large"]
+    assert escalations.value == before + 1
+
+
+def test_escalation_falls_back_when_the_large_circuit_is_open(monkeypatch):
+    service, tiers = _tiered_service(monkeypatch, LLMIntent(query="sushi", location="Senayan"))
+    for _ in range(service.large_tier.guard.breaker.failure_threshold):
+        service.large_tier.guard.breaker.record_failure()
+
+    assert asyncio.run(service._generate_intent("ramen in blok m")) is None
+    assert tiers == ["small"]
+
+
+def _ollama_stream(service, texts, done_at=None):
+    """
+    Point the service at a fake Ollama that streams `texts` as NDJSON chunks
+
+    Returns:
+        List that records every chunk the fake server actually sent
+    """
+    sent = []
+
+    async def body():
+        for i, text in enumerate(texts):
+            sent.append(text)
+            done = done_at is not None and i >= done_at
+            yield (json.dumps({"response": text, "done": done}) + "\n").encode()
+
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, content=body())
+
+    service.streaming = True
+    service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://ollama")
+    return sent
+
+
+def test_stream_stops_after_the_first_complete_intent(monkeypatch):
+    service = _unmatched_service(monkeypatch)
+    stops = LLM_EARLY_STOPS.labels("large")
+    before = stops.value
+    sent = _ollama_stream(service, [
+        '{"query": "ra', 'men", "location"', ': "Blok M", "category": "restaurant"}', "\n\n", " ", " ",
+    ], done_at=5)
+
+    intent = asyncio.run(service._extract_with_llm("ramen near blok m"))
+    assert intent == LLMIntent(query="ramen", location="Blok M", category="restaurant")
+    # The whitespace Ollama would still have generated was never read
+    assert len(sent) == 3
+    assert stops.value == before + 1
+    assert service.path_counts["llm"] == 1
+
+
+def test_stream_skips_objects_that_are_not_intents(monkeypatch):
+    service = _unmatched_service(monkeypatch)
+    _ollama_stream(service, [
+        '{"note": "thinking"} ', '{"query": "sushi", "location": "Kemang"}',
+    ], done_at=1)
+
+    intent = asyncio.run(service._extract_with_llm("sushi in kemang"))
+    assert (intent.query, intent.location) == ("sushi", "Kemang")
+
+
+def test_stream_without_an_intent_falls_back_at_the_token_budget(monkeypatch):
+    service = _unmatched_service(monkeypatch)
+    service.max_tokens = 3
+    sent = _ollama_stream(service, ['{"query": ', '"ramen", ', '"location": ', '"Blok M"}'])
+
+    intent = asyncio.run(service._extract_with_llm("ramen near blok m"))
+    assert len(sent) == 3
+    # The fallback extractor answered instead, and its intent is not cached
+    assert service.path_counts == {"rules": 0, "cache": 0, "llm": 0, "fallback": 1}
+    assert intent is not None
+
+
+def test_stream_that_ends_without_an_object_falls_back(monkeypatch):
+    service = _unmatched_service(monkeypatch)
+    _ollama_stream(service, ["I cannot help", " with that."], done_at=1)
+
+    asyncio.run(service._extract_with_llm("ramen near blok m"))
+    assert service.path_counts["fallback"] == 1
@@ -0,0 +1,191 @@
+"""
+Tests for the Prometheus text rendering, Server-Timing and the /metrics route
+"""
+import asyncio
+import math
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.middleware import rate_limit
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.rate_limit_backends import RateLimitBackend, RateLimitResult
+from app.utils.metrics import (
+    CallbackMetric,
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+    request_timings,
+    server_timing_header,
+    _Metric,
+)
+
+
+def test_counter_renders_help_type_and_labelled_samples():
+    counter = Counter("test_requests_total", "Requests\nserved", ("path",))
+    counter.labels("/api").inc()
+    counter.labels("/api").inc(2)
+    counter.labels('say "hi"\\').inc(0.5)
+
+    assert counter.render() == [
+        "# HELP test_requests_total Requests\\nserved",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{path="/api"} 3',
+        'test_requests_total{path="say \\"hi\\"\\\\"} 0.5',
+    ]
+
+
+def test_unlabelled_metric_has_no_braces():
+    gauge = Gauge("test_depth", "Queue depth")
+    gauge.set(4)
+
+    assert gauge.render()[-1] == "test_depth 4"
+
+
+def test_histogram_buckets_are_cumulative_with_inf_sum_and_count():
+    histogram = Histogram("test_seconds", "Durations", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.labels("intent").observe(value)
+
+    assert histogram.render() == [
+        "# HELP test_seconds Durations",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{stage="intent",le="0.1"} 2',
+        'test_seconds_bucket{stage="intent",le="1"} 3',
+        'test_seconds_bucket{stage="intent",le="+Inf"} 4',
+        'test_seconds_sum{stage="intent"} 3.65',
+        'test_seconds_count{stage="intent"} 4',
+    ]
+
+
+def test_special_float_values_use_prometheus_spelling():
+    gauge = Gauge("test_value", "Value", ("case",))
+    gauge.labels("inf").set(math.inf)
+    gauge.labels("neg").set(-math.inf)
+    gauge.labels("nan").set(math.nan)
+
+    assert gauge.render()[2:] == [
+        'test_value{case="inf"} +Inf',
+        'test_value{case="neg"} -Inf',
+        'test_value{case="nan"} NaN',
+    ]
+
+
+def test_wrong_label_count_is_rejected():
+    counter = Counter("test_total", "Total", ("a", "b"))
+
+    with pytest.raises(ValueError):
+        counter.labels("only-one")
+
+
+def test_metric_base_is_abstract():
+    with pytest.raises(TypeError):
+        _Metric("test_total", "Total")
+
+
+def test_callback_metric_reads_samples_and_survives_collect_errors():
+    values = {"hits": 7}
+    metric = CallbackMetric(
+        "test_hits_total", "Hits", "counter", ("cache",), lambda: [(("places",), values["hits"])]
+    )
+    assert metric.render()[-1] == 'test_hits_total{cache="places"} 7'
+
+    broken = CallbackMetric("test_broken", "Broken", "gauge", (), lambda: 1 / 0)
+    assert broken.render() == ["# HELP test_broken Broken", "# TYPE test_broken gauge"]
+
+
+def test_registry_joins_families_and_rejects_duplicates():
+    registry = Registry()
+    registry.register(Counter("test_a_total", "A")).inc()
+    registry.register(Gauge("test_b", "B")).set(1)
+
+    with pytest.raises(ValueError):
+        registry.register(Counter("test_a_total", "A again"))
+    assert registry.render() == (
+        "# HELP test_a_total A\n# TYPE test_a_total counter\ntest_a_total 1\n"
+        "# HELP test_b B\n# TYPE test_b gauge\ntest_b 1\n"
+    )
+
+
+def test_server_timing_header_lists_stages_in_order():
+    assert server_timing_header({"intent": 12.5, "total": 20}) == "intent;dur=12.5, total;dur=20"
+
+
+def _run_asgi(inner, extensions=None):
+    """Call MetricsMiddleware around `inner` and return the messages it sent"""
+    scope = {"type": "http", "method": "GET", "path": "/stream", "headers": [], "extensions": extensions or {}}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(MetricsMiddleware(inner)(scope, receive, send))
+    return sent
+
+
+async def _streamed_app(scope, receive, send):
+    # Like a StreamingResponse: headers go out before the stage has run
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    request_timings()["intent"] = 5.0
+    await send({"type": "http.response.body", "body": b"a", "more_body": True})
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def test_server_timing_header_on_buffered_response():
+    async def inner(scope, receive, send):
+        request_timings()["intent"] = 5.0
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-length", b"2")]})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    start, body = _run_asgi(inner, extensions={"http.response.trailers": {}})
+    header = dict(start["headers"])[b"server-timing"].decode()
+
+    assert header.startswith("intent;dur=5.0, total;dur=")
+    assert "trailers" not in start
+    assert body["type"] == "http.response.body"
+
+
+def test_streamed_response_sends_stage_timings_as_trailer():
+    start, *bodies, trailers = _run_asgi(_streamed_app, extensions={"http.response.trailers": {}})
+    headers = dict(start["headers"])
+
+    assert start["trailers"] is True
+    assert headers[b"trailer"] == b"server-timing"
+    assert b"server-timing" not in headers
+    assert len(bodies) == 2
+    assert trailers["type"] == "http.response.trailers"
+    assert dict(trailers["headers"])[b"server-timing"].decode().startswith("intent;dur=5.0, total;dur=")
+
+
+def test_streamed_response_without_trailer_support_keeps_header():
+    start, *bodies = _run_asgi(_streamed_app)
+
+    assert dict(start["headers"])[b"server-timing"].startswith(b"total;dur=")
+    assert [message["type"] for message in bodies] == ["http.response.body"] * 2
+
+
+class _RecordingBackend(RateLimitBackend):
+    def __init__(self):
+        self.keys = []
+
+    async def hit(self, key, limit):
+        self.keys.append(key)
+        return RateLimitResult(allowed=True, limit=limit.requests, remaining=limit.requests - 1, retry_after=0.0)
+
+
+def test_metrics_route_is_not_rate_limited(monkeypatch):
+    recorder = _RecordingBackend()
+    monkeypatch.setattr(rate_limit, "backend", recorder)
+    client = TestClient(app)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "X-RateLimit-Limit" not in response.headers
+    assert "# TYPE heypico_http_request_duration_seconds histogram" in response.text
+    assert recorder.keys == []
+
+    client.get("/")
+    assert recorder.keys == [("*", "testclient")]
@@ -0,0 +1,125 @@
+"""
+Tests for the stage graph executor
+"""
+import asyncio
+import pytest
+from app.utils.pipeline import Stage, StageGraph
+
+
+def _value(value, delay: float = 0.0):
+    async def run(results=None):
+        await asyncio.sleep(delay)
+        return value
+    return run
+
+
+def test_stages_run_after_their_deps_and_overlap_otherwise():
+    order = []
+
+    def stage(name, delay):
+        async def run(results):
+            order.append(f"{name}:start")
+            await asyncio.sleep(delay)
+            order.append(f"{name}:end")
+            return name
+        return run
+
+    graph = StageGraph()
+    graph.add(Stage("a", stage("a", 0.02)))
+    graph.add(Stage("b", stage("b", 0.01)))
+    graph.add(Stage("c", stage("c", 0), deps=("a", "b")))
+    results = asyncio.run(graph.run())
+
+    assert results == {"a": "a", "b": "b", "c": "c"}
+    # a and b start together; c waits for both
+    assert order[:2] == ["a:start", "b:start"]
+    assert order.index("c:start") > order.index("a:end")
+    assert set(graph.timings) == {"a", "b", "c"}
+
+
+def test_unknown_dependency_is_rejected():
+    graph = StageGraph()
+    with pytest.raises(ValueError):
+        graph.add(Stage("b", _value(1), deps=("a",)))
+
+
+def test_accepted_speculation_skips_run():
+    ran = []
+
+    async def run(results):
+        ran.append(True)
+        return "fresh"
+
+    graph = StageGraph()
+    graph.add(Stage("dep", _value("x", 0.01)))
+    graph.add(Stage("spec", run, deps=("dep",), speculate=_value("guess"), accept=lambda value, results: True))
+    results = asyncio.run(graph.run())
+
+    assert results["spec"] == "guess"
+    assert graph.speculation == {"spec": "hit"}
+    assert not ran
+
+
+@pytest.mark.parametrize("keep, accept, outcome", [
+    (lambda results: False, None, "cancelled"),
+    (None, lambda value, results: False, "rejected"),
+])
+def test_unused_speculation_falls_back_to_run(keep, accept, outcome):
+    graph = StageGraph()
+    graph.add(Stage("dep", _value("x")))
+    graph.add(Stage(
+        "spec", _value("fresh"), deps=("dep",), speculate=_value("guess", 0.01),
+        keep_speculation=keep, accept=accept
+    ))
+    results = asyncio.run(graph.run())
+
+    assert results["spec"] == "fresh"
+    assert graph.speculation == {"spec": outcome}
+
+
+def test_failed_speculation_falls_back_to_run():
+    async def broken():
+        raise RuntimeError("guess failed")
+
+    graph = StageGraph()
+    graph.add(Stage("dep", _value("x")))
+    graph.add(Stage("spec", _value("fresh"), deps=("dep",), speculate=broken))
+    results = asyncio.run(graph.run())
+
+    assert results["spec"] == "fresh"
+    assert graph.speculation == {"spec": "failed"}
+
+
+def test_failing_stage_cancels_the_rest_and_its_speculation():
+    cancelled = []
+
+    async def slow(results=None):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def broken(results):
+        # Let the other stage and the speculation get going first
+        await asyncio.sleep(0.01)
+        raise RuntimeError("stage failed")
+
+    graph = StageGraph()
+    graph.add(Stage("broken", broken))
+    graph.add(Stage("other", slow))
+    graph.add(Stage("spec", _value("fresh"), deps=("broken",), speculate=slow))
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(graph.run())
+    assert len(cancelled) == 2
+
+
+def test_on_stage_done_sees_partial_results():
+    seen = []
+    graph = StageGraph(on_stage_done=lambda name, results: seen.append((name, dict(results))))
+    graph.add(Stage("a", _value(1)))
+    graph.add(Stage("b", _value(2), deps=("a",)))
+    asyncio.run(graph.run())
+
+    assert seen == [("a", {"a": 1}), ("b", {"a": 1, "b": 2})]
@@ -0,0 +1,50 @@
+"""
+Tests for the persistent place index
+"""
+import asyncio
+import time
+import pytest
+from app.services.place_index import PlaceIndex
+
+
+def _place(i: int, lat: float = -6.2, lng: float = 106.8) -> dict:
+    return {
+        "place_id": f"p{i}", "name": f"Ichiran {i}", "address": "Jakarta",
+        "lat": lat, "lng": lng, "rating": 4.0 + i / 10, "user_ratings_total": 10,
+    }
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = PlaceIndex(str(tmp_path / "places.sqlite3"))
+    yield index
+    index.close()
+
+
+def test_search_finds_places_by_term_within_the_radius(index):
+    async def scenario():
+        await index.add("ramen", [_place(1), _place(2), _place(3, lat=-6.5)])
+        return await index.search("ramen", -6.2, 106.8, radius=1000, max_age=60)
+
+    found = asyncio.run(scenario())
+    assert [place["place_id"] for place in found] == ["p2", "p1"]
+
+
+def test_size_counts_new_places_only(index):
+    async def scenario():
+        await index.add("ramen", [_place(1), _place(2)])
+        await index.add("noodles", [_place(2), _place(3)])
+
+    asyncio.run(scenario())
+    assert index.stats() == {"searches": 0, "writes": 2, "places": 3}
+    assert index.count() == 3
+
+
+def test_compaction_drops_old_places_and_updates_size(index):
+    asyncio.run(index.add("ramen", [_place(1)]))
+    index.bulk_load([(_place(2), ["ramen"])])
+    with index._lock:
+        index._connection().execute("UPDATE places SET seen_at = ? WHERE place_id = 'p1'", (time.time() - 100,))
+
+    assert index.compact(max_age=50) == 1
+    assert index.size == 1
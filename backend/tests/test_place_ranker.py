@@ -0,0 +1,96 @@
+"""
+Tests for re-ranking Places candidates
+"""
+import math
+import pytest
+from app.services.place_ranker import PlaceRanker, text_relevance
+from app.utils.geo import EARTH_RADIUS_M
+
+ORIGIN = (0.0, 0.0)
+
+
+def _place(name="Place", rating=None, reviews=None, meters=0.0) -> dict:
+    """Place dict `meters` due north of ORIGIN"""
+    return {
+        "name": name,
+        "lat": math.degrees(meters / EARTH_RADIUS_M),
+        "lng": 0.0,
+        "rating": rating,
+        "user_ratings_total": reviews,
+    }
+
+
+def _ratings_only() -> PlaceRanker:
+    return PlaceRanker(distance_weight=0.0, relevance_weight=0.0)
+
+
+def test_sparse_ratings_are_shrunk_towards_the_mean():
+    places = [_place(rating=5.0, reviews=3), _place(rating=4.6, reviews=3000), _place(rating=4.0, reviews=500)]
+
+    scores = _ratings_only().scores(places, "ramen")
+
+    mean = (5.0 + 4.6 + 4.0) / 3
+    assert scores[0] * 5 == pytest.approx((5.0 * 3 + mean * 50) / 53)
+    assert scores[1] * 5 == pytest.approx((4.6 * 3000 + mean * 50) / 3050)
+    assert _ratings_only().top(places, "ramen", 3) == [1, 0, 2]
+
+
+def test_unrated_places_score_the_mean_rating():
+    places = [_place(rating=4.0, reviews=10), _place(rating=None, reviews=None), _place(rating=5.0, reviews=10)]
+
+    scores = _ratings_only().scores(places, "ramen")
+
+    assert scores[1] * 5 == pytest.approx(4.5)
+
+
+def test_without_a_prior_ratings_are_taken_as_given():
+    places = [_place(rating=5.0, reviews=1), _place(rating=4.6, reviews=3000)]
+
+    assert PlaceRanker(distance_weight=0.0, relevance_weight=0.0, ratings_prior=0.0).top(places, "ramen", 2) == [0, 1]
+
+
+def test_nearer_places_rank_higher_with_exponential_decay():
+    ranker = PlaceRanker(rating_weight=0.0, relevance_weight=0.0, distance_scale=1000.0)
+    places = [_place(meters=3000), _place(meters=0), _place(meters=1000)]
+
+    scores = ranker.scores(places, "ramen", ORIGIN)
+
+    assert scores == pytest.approx([math.exp(-3), 1.0, math.exp(-1)], rel=1e-6)
+    assert ranker.top(places, "ramen", 3, ORIGIN) == [1, 2, 0]
+
+
+def test_distance_is_ignored_without_an_origin():
+    ranker = PlaceRanker(rating_weight=0.0, relevance_weight=0.0)
+
+    assert ranker.scores([_place(meters=3000), _place(meters=0)], "ramen").tolist() == [0.0, 0.0]
+
+
+def test_text_relevance_is_the_share_of_query_words_in_the_name():
+    names = ["Ichiran Ramen", "Ramen Shops of Blok M", "Sushi Tei", ""]
+
+    assert text_relevance("ramen shop", names).tolist() == [0.5, 1.0, 0.0, 0.0]
+    assert text_relevance("", names).tolist() == [0.0] * 4
+
+
+def test_relevance_breaks_a_tie_between_equal_places():
+    ranker = PlaceRanker(distance_weight=0.0)
+    places = [_place("Sushi Tei", rating=4.5, reviews=100), _place("Ramen Ya", rating=4.5, reviews=100)]
+
+    assert ranker.top(places, "ramen", 2) == [1, 0]
+
+
+def test_ties_keep_the_api_order():
+    places = [_place("A", rating=4.5, reviews=10), _place("B", rating=4.5, reviews=10), _place("C", rating=4.5, reviews=10)]
+
+    assert PlaceRanker().top(places, "ramen", 3, ORIGIN) == [0, 1, 2]
+
+
+@pytest.mark.parametrize("k, expected", [(10, [1, 0, 2]), (2, [1, 0]), (0, [])])
+def test_top_returns_at_most_k(k, expected):
+    places = [_place(rating=4.5, reviews=100), _place(rating=4.9, reviews=100), _place(rating=3.0, reviews=100)]
+
+    assert _ratings_only().top(places, "ramen", k) == expected
+
+
+def test_top_of_no_places_is_empty():
+    assert PlaceRanker().top([], "ramen", 5, ORIGIN) == []
@@ -0,0 +1,264 @@
+"""
+Tests for the query endpoints against fake upstreams
+"""
+import json
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.middleware import rate_limit
+from app.middleware.rate_limit_backends import InMemoryBackend
+from app.routers import query as query_router
+from app.schemas.models import LLMIntent, Place
+from app.services.google_maps_service import google_maps_service
+from app.services.llm_service import llm_service
+
+USER = {"user_lat": -6.2, "user_lng": 106.8}
+
+
+def _element(seconds: int) -> dict:
+    return {
+        "status": "OK",
+        "duration": {"value": seconds, "text": f"{max(seconds // 60, 1)} mins"},
+        "distance": {"value": seconds, "text": f"{seconds} m"},
+    }
+
+
+@pytest.fixture
+def upstreams(monkeypatch):
+    """Fake Ollama and Google Maps behind the real routes; records upstream calls"""
+    calls = []
+    for cache in (
+        google_maps_service.places_cache,
+        google_maps_service.reverse_geocode_cache,
+        *google_maps_service.distance_caches.values(),
+    ):
+        cache.clear()
+    monkeypatch.setattr(rate_limit, "backend", InMemoryBackend(max_keys=100))
+    monkeypatch.setattr(google_maps_service, "travel_time_mode", "exact")
+
+    async def extract_intent(text):
+        calls.append(("intent", text))
+        if "gibberish" in text:
+            return None
+        return LLMIntent(query=text.split()[0].lower(), location="Blok M Jakarta")
+
+    async def reverse_geocode(latlng):
+        calls.append(("reverse_geocode", latlng))
+        return [{"address_components": [{"long_name": "Jakarta", "types": ["locality"]}]}]
+
+    async def geocode(address):
+        calls.append(("geocode", address))
+        return [{"geometry": {"location": {"lat": -6.24, "lng": 106.80}}}]
+
+    async def places(query, location=None, radius=None):
+        calls.append(("places", query))
+        return {"results": [
+            {
+                "place_id": f"{query}-{i}",
+                "name": f"{query.title()} {i}",
+                "formatted_address": "Jakarta",
+                "geometry": {"location": {"lat": location[0] + 0.001 * i, "lng": location[1]}},
+                "rating": 4.0 + i / 10,
+                "user_ratings_total": 100,
+            }
+            for i in range(3)
+        ]}
+
+    async def distance_matrix(origins, destinations, mode):
+        calls.append(("distance_matrix", mode, len(origins), len(destinations)))
+        pace = {"walking": 300, "bicycling": 100, "driving": 60}[mode]
+        return {"rows": [
+            {"elements": [_element(pace * (j + 1)) for j in range(len(destinations))]}
+            for _ in origins
+        ]}
+
+    monkeypatch.setattr(llm_service, "extract_intent", extract_intent)
+    for name, fake in (
+        ("reverse_geocode", reverse_geocode),
+        ("geocode", geocode),
+        ("places", places),
+        ("distance_matrix", distance_matrix),
+    ):
+        monkeypatch.setattr(google_maps_service.client, name, fake)
+    return calls
+
+
+def _events(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_stream_sends_intent_places_distances_then_response(upstreams):
+    response = TestClient(app).post("/api/query/stream", json={"query": "ramen near me", **USER})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = _events(response)
+    types = [event["type"] for event in events]
+    assert types == ["intent", "places", "distances", "distances", "distances", "response"]
+
+    assert events[0]["intent"]["query"] == "ramen"
+    assert events[0]["location"] == "Jakarta"
+    assert len(events[1]["places"]) == 3
+    assert events[1]["places"][0]["walk_time"] is None
+    assert sorted(event["source"] for event in events[2:5]) == ["bicycling", "driving", "walking"]
+    # Each distances event carries every mode that has arrived so far
+    assert all(place["walk_time"] for place in events[4]["places"])
+
+    final = events[-1]
+    assert [place["name"] for place in final["places"]] == [place["name"] for place in events[4]["places"]]
+    assert {"intent", "places_search", "distances", "total"} <= set(final["timings"])
+    assert final["ai_response"].startswith("I found 3 great ramen places near Jakarta.")
+
+
+def test_stream_without_coordinates_has_no_distance_events(upstreams):
+    events = _events(TestClient(app).post("/api/query/stream", json={"query": "sushi in blok m"}))
+
+    assert [event["type"] for event in events] == ["intent", "places", "response"]
+    assert ("geocode", "Blok M Jakarta") in upstreams
+
+
+def test_stream_reports_a_failed_intent_as_an_error_event(upstreams):
+    response = TestClient(app).post("/api/query/stream", json={"query": "gibberish"})
+
+    # Headers are already sent, so the failure travels in the stream
+    assert response.status_code == 200
+    assert _events(response) == [{
+        "type": "error", "status": 400, "detail": "Could not understand the query. Please try rephrasing.",
+    }]
+
+
+def test_stream_error_after_earlier_events(upstreams, monkeypatch):
+    async def broken(*args, **kwargs):
+        raise RuntimeError("distance stage exploded")
+
+    monkeypatch.setattr(google_maps_service, "calculate_distances", broken)
+    events = _events(TestClient(app).post("/api/query/stream", json={"query": "pizza near me", **USER}))
+
+    assert [event["type"] for event in events] == ["intent", "places", "error"]
+    assert events[-1]["status"] == 500
+    assert "distance stage exploded" in events[-1]["detail"]
+
+
+def test_batch_reports_every_item_by_index_and_ends_with_a_summary(upstreams):
+    queries = [
+        {"query": "ramen near me", **USER},
+        {"query": "gibberish"},
+        {"query": "sushi near me", **USER},
+        {"query": "Ramen near me ", **USER},
+    ]
+    response = TestClient(app).post("/api/query/batch", json={"queries": queries})
+
+    assert response.status_code == 200
+    events = _events(response)
+    summary = events[-1]
+    assert summary["type"] == "summary"
+    assert (summary["queries"], summary["unique"]) == (4, 3)
+
+    by_index = {event["index"]: event for event in events[:-1]}
+    assert sorted(by_index) == [0, 1, 2, 3]
+    assert by_index[1] == {
+        "index": 1, "type": "error", "status": 400,
+        "detail": "Could not understand the query. Please try rephrasing.",
+    }
+    for index, query in ((0, "ramen"), (2, "sushi"), (3, "ramen")):
+        assert by_index[index]["type"] == "result"
+        assert by_index[index]["status"] == 200
+        assert f"great {query} places" in by_index[index]["response"]["ai_response"]
+    # The repeated query is answered from the same run
+    assert by_index[3]["response"] == by_index[0]["response"]
+    assert len([call for call in upstreams if call[0] == "intent"]) == 3
+
+
+def test_batch_item_failure_does_not_stop_the_others(upstreams, monkeypatch):
+    search_places = google_maps_service.search_places
+
+    async def flaky(query, *args, **kwargs):
+        if query.startswith("sushi"):
+            raise RuntimeError("places exploded")
+        return await search_places(query, *args, **kwargs)
+
+    monkeypatch.setattr(google_maps_service, "search_places", flaky)
+    queries = [{"query": "sushi near me", **USER}, {"query": "pizza near me", **USER}]
+    events = _events(TestClient(app).post("/api/query/batch", json={"queries": queries}))
+
+    by_index = {event["index"]: event for event in events[:-1]}
+    assert by_index[0]["status"] == 500
+    assert "places exploded" in by_index[0]["detail"]
+    assert by_index[1]["status"] == 200
+    assert events[-1]["type"] == "summary"
+
+
+def test_batch_over_the_item_limit_is_rejected(upstreams, monkeypatch):
+    monkeypatch.setenv("BATCH_QUERY_MAX_ITEMS", "2")
+    queries = [{"query": f"ramen {i}"} for i in range(3)]
+
+    response = TestClient(app).post("/api/query/batch", json={"queries": queries})
+
+    assert response.status_code == 400
+    assert upstreams == []
+
+
+@pytest.fixture
+def observed(monkeypatch):
+    """Stage timings passed to the stage latency histogram, one dict per query"""
+    recorded = []
+    monkeypatch.setattr(query_router, "observe_stage_timings", lambda timings: recorded.append(dict(timings)))
+    return recorded
+
+
+@pytest.mark.parametrize("path", ["/api/query", "/api/query/stream"])
+def test_stage_timings_are_recorded_once_per_query(upstreams, observed, path):
+    TestClient(app).post(path, json={"query": "ramen near me", **USER})
+
+    assert len(observed) == 1
+    assert {"intent", "places_search", "distances", "response", "total"} <= set(observed[0])
+
+
+@pytest.mark.parametrize("path", ["/api/query", "/api/query/stream"])
+def test_stage_timings_are_recorded_for_failed_queries(upstreams, observed, path):
+    TestClient(app).post(path, json={"query": "gibberish"})
+
+    assert len(observed) == 1
+    # The failing stage is timed too
+    assert {"intent", "total"} <= set(observed[0])
+    assert "places_search" not in observed[0]
+
+
+def test_batch_records_stage_timings_for_every_run(upstreams, observed):
+    queries = [{"query": "ramen near me", **USER}, {"query": "gibberish"}, {"query": "ramen near me", **USER}]
+    TestClient(app).post("/api/query/batch", json={"queries": queries})
+
+    # Duplicates share a run, so they are recorded once
+    assert len(observed) == 2
+    assert sorted("places_search" in timings for timings in observed) == [False, True]
+
+
+def _walkable(name: str, walk_seconds, transport: str = "walking") -> Place:
+    return Place(
+        name=name, address="Jakarta", place_id=name, lat=-6.2, lng=106.8, maps_url="https://maps.example",
+        walk_seconds=walk_seconds, recommended_transport=transport,
+    )
+
+
+def test_response_names_the_place_with_the_shortest_walk():
+    intent = LLMIntent(query="ramen", location="Jakarta")
+    # As text "1 hour 5 mins" would sort before "55 mins"
+    places = [
+        _walkable("Far Ramen", 3900, "driving"),
+        _walkable("Near Ramen", 3300, "bicycling"),
+        _walkable("Unknown Ramen", None),
+    ]
+
+    response = query_router._generate_response(intent, places, has_distances=True)
+
+    assert response == (
+        "I found 3 great ramen places near Jakarta. The closest is Near Ramen, best reached by bicycling."
+    )
+
+
+def test_response_without_distances_lists_recommendations():
+    intent = LLMIntent(query="ramen", location="Jakarta")
+
+    response = query_router._generate_response(intent, [_walkable("Ramen Ya", None)], has_distances=False)
+
+    assert response == "I found 1 great ramen place near Jakarta. Here are my top recommendations for you."
@@ -0,0 +1,170 @@
+"""
+Tests for the sliding-window rate limiter and its backends
+"""
+import asyncio
+import fakeredis
+import pytest
+from app.middleware.rate_limit_backends import (
+    RateLimit,
+    RateLimitBackend,
+    RedisBackend,
+    SlidingWindowLimiter,
+)
+
+LIMIT = RateLimit(requests=10, window=60.0)
+
+
+def test_allows_up_to_the_limit_then_rejects():
+    limiter = SlidingWindowLimiter(max_keys=100)
+    results = [limiter.hit("client", LIMIT, now=0.0) for _ in range(11)]
+
+    assert all(result.allowed for result in results[:10])
+    assert [result.remaining for result in results[:10]] == list(range(9, -1, -1))
+    assert not results[10].allowed
+    assert results[10].remaining == 0
+    # The rest of this window, then until the 10 requests weigh at most 9
+    assert results[10].retry_after == pytest.approx(66.0)
+    assert limiter.rejections == 1
+
+
+def test_previous_window_is_weighted_by_its_overlap():
+    limiter = SlidingWindowLimiter(max_keys=100)
+    for _ in range(10):
+        limiter.hit("client", LIMIT, now=0.0)
+
+    # A quarter into the next window, 75% of the previous 10 requests still count
+    result = limiter.hit("client", LIMIT, now=75.0)
+    assert result.allowed
+    assert result.remaining == 1
+    assert limiter.hit("client", LIMIT, now=75.0).allowed
+    rejected = limiter.hit("client", LIMIT, now=75.0)
+    assert not rejected.allowed
+    # 7.5 + 2 + 1 <= 10 once the previous window's weight drops to 0.7
+    assert rejected.retry_after == pytest.approx(3.0)
+
+
+def test_counts_older_than_one_window_are_dropped():
+    limiter = SlidingWindowLimiter(max_keys=100)
+    for _ in range(10):
+        limiter.hit("client", LIMIT, now=0.0)
+
+    assert limiter.hit("client", LIMIT, now=150.0).remaining == 9
+
+
+def test_keys_are_counted_separately():
+    limiter = SlidingWindowLimiter(max_keys=100)
+    for _ in range(10):
+        limiter.hit("a", LIMIT, now=0.0)
+
+    assert not limiter.hit("a", LIMIT, now=0.0).allowed
+    assert limiter.hit("b", LIMIT, now=0.0).allowed
+
+
+def test_least_recently_used_key_is_evicted():
+    limiter = SlidingWindowLimiter(max_keys=2)
+    for _ in range(10):
+        limiter.hit("old", LIMIT, now=0.0)
+    limiter.hit("recent", LIMIT, now=1.0)
+    # Touching "old" makes "recent" the least recently used key
+    limiter.hit("old", LIMIT, now=2.0)
+    limiter.hit("new", LIMIT, now=3.0)
+
+    assert len(limiter) == 2
+    assert limiter.evictions == 1
+    # "old" kept its count; "recent" starts again from scratch
+    assert not limiter.hit("old", LIMIT, now=4.0).allowed
+    assert limiter.hit("recent", LIMIT, now=4.0).remaining == 9
+
+
+def test_key_table_stays_bounded_under_scanning_traffic():
+    limiter = SlidingWindowLimiter(max_keys=50)
+    for i in range(1000):
+        limiter.hit(f"scanner-{i}", LIMIT, now=float(i))
+
+    assert len(limiter) == 50
+    assert limiter.evictions == 950
+
+
+def _redis_backend(server: "fakeredis.FakeServer", **kwargs) -> RedisBackend:
+    return RedisBackend(client=fakeredis.FakeAsyncRedis(server=server), retry_interval=30.0, **kwargs)
+
+
+def test_backend_without_hit_cannot_be_instantiated():
+    class Incomplete(RateLimitBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_redis_script_matches_the_local_limiter():
+    async def scenario():
+        backend = _redis_backend(fakeredis.FakeServer())
+        local = SlidingWindowLimiter(max_keys=100)
+        pairs = []
+        # Fill one window, then probe the sliding estimate in the next
+        for now in [0.0] * 11 + [75.0] * 3 + [150.0]:
+            pairs.append((await backend.hit(("*", "1.2.3.4"), LIMIT, now), local.hit("1.2.3.4", LIMIT, now)))
+        await backend.aclose()
+        return backend, pairs
+
+    backend, pairs = asyncio.run(scenario())
+    for remote, local in pairs:
+        assert remote.allowed == local.allowed
+        assert remote.remaining == local.remaining
+        assert remote.retry_after == pytest.approx(local.retry_after)
+    assert [remote.allowed for remote, _ in pairs].count(False) == 2
+    assert backend.fallbacks == 0
+
+
+def test_redis_counts_are_shared_between_backends():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        first, second = _redis_backend(server), _redis_backend(server)
+        for _ in range(5):
+            await first.hit(("*", "client"), LIMIT, 0.0)
+            await second.hit(("*", "client"), LIMIT, 0.0)
+        return await first.hit(("*", "client"), LIMIT, 0.0)
+
+    result = asyncio.run(scenario())
+    assert not result.allowed
+    assert result.retry_after == pytest.approx(66.0)
+
+
+def test_unreachable_redis_falls_back_to_local_counts():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        server.connected = False
+        backend = _redis_backend(server, max_local_keys=10)
+        results = [await backend.hit(("*", "client"), LIMIT, 0.0) for _ in range(11)]
+        return backend, results
+
+    backend, results = asyncio.run(scenario())
+    # Requests keep being limited, by the in-process limiter
+    assert all(result.allowed for result in results[:10])
+    assert not results[10].allowed
+    assert backend.fallbacks == 11
+    assert len(backend.local.limiter) == 1
+
+
+def test_redis_is_retried_after_the_retry_interval():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        server.connected = False
+        backend = RedisBackend(client=fakeredis.FakeAsyncRedis(server=server), retry_interval=0.05)
+        await backend.hit(("*", "client"), LIMIT, 0.0)
+
+        server.connected = True
+        # Still within the retry interval: counted locally without trying Redis
+        await backend.hit(("*", "client"), LIMIT, 0.0)
+        fallbacks = backend.fallbacks
+
+        await asyncio.sleep(0.06)
+        result = await backend.hit(("*", "client"), LIMIT, 0.0)
+        return fallbacks, backend.fallbacks, result
+
+    fallbacks_before, fallbacks_after, result = asyncio.run(scenario())
+    assert fallbacks_before == 2
+    assert fallbacks_after == 2
+    # Back on Redis, which has seen only this request
+    assert result.remaining == 9
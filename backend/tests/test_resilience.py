@@ -0,0 +1,222 @@
+"""
+Tests for the circuit breaker, adaptive timeouts and upstream guard
+"""
+import asyncio
+import pytest
+from app.utils.deadline import DeadlineExceeded, start_deadline
+from app.utils.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyTracker,
+    UpstreamGuard,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _breaker(clock: FakeClock) -> CircuitBreaker:
+    return CircuitBreaker("test", failure_threshold=3, reset_timeout=10.0, clock=clock)
+
+
+def test_opens_after_consecutive_failures_and_rejects():
+    breaker = _breaker(FakeClock())
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.is_open()
+    assert not breaker.allow()
+    assert not breaker.allow()
+    assert breaker.opens == 1
+    assert breaker.rejections == 2
+
+
+def test_success_resets_the_failure_count():
+    breaker = _breaker(FakeClock())
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_one_probe_through_and_success_closes():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    for _ in range(3):
+        breaker.record_failure()
+
+    clock.now += 9.9
+    assert not breaker.allow()
+    clock.now += 0.1
+    assert not breaker.is_open()
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only the probe goes upstream until it reports back
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_for_another_reset_timeout():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 10.0
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.opened_at == clock.now
+    assert breaker.opens == 2
+    clock.now += 5.0
+    assert not breaker.allow()
+    clock.now += 5.0
+    assert breaker.allow()
+
+
+def test_released_probe_can_be_claimed_again():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 10.0
+    assert breaker.allow()
+
+    breaker.release()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def test_latency_tracker_uses_ceiling_until_enough_samples():
+    tracker = LatencyTracker(ceiling=5.0, floor=0.1, percentile=99.0, multiplier=2.0, min_samples=20)
+    for _ in range(16):
+        tracker.observe(0.3)
+    assert tracker.timeout() == 5.0
+
+    for _ in range(16):
+        tracker.observe(0.3)
+    assert tracker.timeout() == pytest.approx(0.6)
+
+
+def test_latency_tracker_timeout_is_clamped():
+    fast = LatencyTracker(ceiling=5.0, floor=0.5, min_samples=16)
+    slow = LatencyTracker(ceiling=5.0, floor=0.5, min_samples=16)
+    for _ in range(16):
+        fast.observe(0.01)
+        slow.observe(4.0)
+
+    assert fast.timeout() == 0.5
+    assert slow.timeout() == 5.0
+
+
+def _guard(ceiling: float = 1.0, **kwargs) -> UpstreamGuard:
+    return UpstreamGuard(
+        "test",
+        LatencyTracker(ceiling=ceiling),
+        CircuitBreaker("test", failure_threshold=2, reset_timeout=60.0),
+        **kwargs
+    )
+
+
+def test_guard_timeouts_open_the_circuit_and_skip_the_upstream():
+    guard = _guard(ceiling=0.01)
+    calls = 0
+
+    async def slow():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(1)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(asyncio.TimeoutError):
+                await guard.call(slow)
+        with pytest.raises(CircuitOpenError):
+            await guard.call(slow)
+
+    asyncio.run(scenario())
+    assert calls == 2
+    assert not guard.available()
+    assert guard.stats()["state"] == OPEN
+
+
+def test_guard_ignores_errors_that_are_not_upstream_failures():
+    guard = _guard(is_failure=lambda e: not isinstance(e, ValueError))
+
+    async def bad_request():
+        raise ValueError("invalid query")
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(ValueError):
+                await guard.call(bad_request)
+
+    asyncio.run(scenario())
+    assert guard.breaker.state == CLOSED
+    assert guard.breaker.failures == 0
+
+
+def test_guard_timeout_forced_by_the_deadline_is_not_a_failure():
+    guard = _guard(ceiling=5.0)
+
+    async def scenario():
+        start_deadline(0.02)
+        with pytest.raises(asyncio.TimeoutError):
+            await guard.call(lambda: asyncio.sleep(1))
+
+    asyncio.run(scenario())
+    assert guard.breaker.failures == 0
+
+
+def test_guard_refuses_calls_once_the_deadline_has_passed():
+    guard = _guard()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+
+    async def scenario():
+        start_deadline(0.001)
+        await asyncio.sleep(0.01)
+        with pytest.raises(DeadlineExceeded):
+            await guard.call(work)
+
+    asyncio.run(scenario())
+    assert calls == 0
+
+
+def test_cancelled_probe_is_released():
+    guard = _guard()
+    guard.breaker.state = OPEN
+    guard.breaker.opened_at = -1000.0
+
+    async def scenario():
+        task = asyncio.create_task(guard.call(lambda: asyncio.sleep(1)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert guard.breaker.state == HALF_OPEN
+    assert guard.breaker.allow()
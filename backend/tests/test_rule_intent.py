@@ -0,0 +1,111 @@
+"""
+Tests for the rule-based intent classifier
+"""
+import asyncio
+import pytest
+from app.services.llm_service import LLMService
+from app.services.rule_intent import RuleIntentExtractor
+from app.utils.env_config import get_rule_intent_min_confidence
+
+GAZETTEER = {
+    "place_types": [
+        {"term": "restaurant", "category": "restaurant", "aliases": ["restaurant", "food"], "generic": True},
+        {"term": "ramen", "category": "restaurant", "aliases": ["ramen"]},
+        {"term": "sushi", "category": "restaurant", "aliases": ["sushi"]},
+        {"term": "pizza", "category": "restaurant", "aliases": ["pizza"]},
+        {"term": "coffee", "category": "cafe", "aliases": ["coffee", "coffee shop", "cafe"]},
+        {"term": "nasi goreng", "category": "restaurant", "aliases": ["nasi goreng", "fried rice"]},
+    ],
+    "locations": [
+        {"name": "Blok M Jakarta", "aliases": ["blok m"]},
+        {"name": "Kemang Jakarta", "aliases": ["kemang"]},
+        {"name": "Senayan Jakarta", "aliases": ["senayan"]},
+    ],
+}
+
+THRESHOLD = get_rule_intent_min_confidence()
+
+
+@pytest.fixture(scope="module")
+def extractor():
+    return RuleIntentExtractor(GAZETTEER)
+
+
+@pytest.mark.parametrize("text, query, location, category, confidence", [
+    # Clean matches
+    ("ramen near blok m", "ramen", "Blok M Jakarta", "restaurant", 1.0),
+    ("Where can I find good Fried Rice in Kemang?", "nasi goreng", "Kemang Jakarta", "restaurant", 1.0),
+    ("coffee shop near senayan", "coffee", "Senayan Jakarta", "cafe", 1.0),
+    ("best ramen", "ramen", None, "restaurant", 0.75),
+    # A specific type wins over a generic one
+    ("ramen food in kemang", "ramen", "Kemang Jakarta", "restaurant", 1.0),
+    # More than one type or location
+    ("ramen and sushi in kemang", "ramen", "Kemang Jakarta", "restaurant", 0.7),
+    ("ramen in kemang and senayan", "ramen", "Kemang Jakarta", "restaurant", 0.7),
+    # Trailing locations the gazetteer does not know
+    ("pizza near my office", "pizza", "office", "restaurant", 0.65),
+    ("coffee in my area", "coffee", "area", "cafe", 0.65),
+    ("best ramen in town", "ramen", "town", "restaurant", 0.65),
+    ("pizza in 10 minutes", "pizza", "10 minutes", "restaurant", 0.65),
+    ("pizza in a quiet spot", "pizza", "quiet", "restaurant", 0.65),
+    # Unknown words and negation
+    ("spicy ramen in kemang", "ramen", "Kemang Jakarta", "restaurant", 0.7),
+    ("not pizza near kemang", "pizza", "Kemang Jakarta", "restaurant", 0.0),
+    ("sushi without rice in blok m", "sushi", "Blok M Jakarta", "restaurant", 0.0),
+    ("anything except ramen", "ramen", None, "restaurant", 0.0),
+    # No place type at all
+    ("something in kemang", None, "Kemang Jakarta", "restaurant", 0.0),
+])
+def test_classify(extractor, text, query, location, category, confidence):
+    match = extractor.classify(text)
+
+    assert (match.query, match.location, match.category) == (query, location, category)
+    assert match.confidence == pytest.approx(confidence)
+
+
+def test_unknown_words_are_reported(extractor):
+    assert extractor.classify("spicy ramen with extra egg in kemang").unknown_words == ["spicy", "extra", "egg"]
+
+
+def test_partial_words_do_not_match(extractor):
+    # "pizzas" and "kemangan" contain patterns but are different words
+    match = extractor.classify("pizzas near kemangan")
+
+    assert match.query is None
+    assert match.confidence == 0.0
+
+
+@pytest.mark.parametrize("text, skips_llm", [
+    ("ramen near blok m", True),
+    ("best ramen", True),
+    ("ramen and sushi in kemang", False),
+    ("spicy ramen in kemang", False),
+    ("pizza near my office", False),
+    ("sushi near work", False),
+    ("not pizza near kemang", False),
+])
+def test_only_clear_cut_queries_clear_the_default_threshold(extractor, text, skips_llm):
+    assert (extractor.classify(text).confidence >= THRESHOLD) is skips_llm
+
+
+def test_queries_below_the_threshold_go_to_the_llm(monkeypatch):
+    service = LLMService()
+    llm_queries = []
+
+    async def extract(user_query):
+        llm_queries.append(user_query)
+        return None
+
+    monkeypatch.setattr(service, "_extract_with_llm", extract)
+
+    async def scenario():
+        return (
+            await service.extract_intent("ramen near blok m"),
+            await service.extract_intent("pizza near my office"),
+            await service.extract_intent("not pizza near kemang"),
+        )
+
+    rule_intent, tail, negated = asyncio.run(scenario())
+    assert rule_intent.query == "ramen" and rule_intent.location == "Blok M Jakarta"
+    assert llm_queries == ["pizza near my office", "not pizza near kemang"]
+    assert service.path_counts["rules"] == 1
@@ -0,0 +1,131 @@
+"""
+Tests for the memory-mapped shared cache
+"""
+import os
+import struct
+import pytest
+from app.utils import shared_cache
+from app.utils.cache import MISSING
+from app.utils.shared_cache import SharedMemoryCache
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache.bin")
+
+
+def _cache(path: str, name: str = "test", slots: int = 16) -> SharedMemoryCache:
+    return SharedMemoryCache(name, path, slots=slots, slot_size=256, ttl=60.0, stale_ttl=60.0)
+
+
+def _slot_offset(cache: SharedMemoryCache, key) -> int:
+    key_bytes = shared_cache._encode_key(key)
+    return next(cache._slot_offsets(cache._hash(key_bytes)))
+
+
+class _WriteDuringRead:
+    """
+    Stands in for the slot struct and lets a writer run between a reader's
+    payload copy and its sequence re-check, as another process could
+    """
+
+    def __init__(self, write):
+        self._real = shared_cache._SLOT
+        self.size = self._real.size
+        self._write = write
+        self._header_reads = 0
+        self.writes = 0
+
+    def unpack_from(self, buffer, offset=0):
+        self._header_reads += 1
+        # The second header read is the reader's check after copying the payload
+        if self._header_reads == 2 and not self.writes:
+            self.writes += 1
+            self._write()
+        return self._real.unpack_from(buffer, offset)
+
+    def pack_into(self, *args):
+        return self._real.pack_into(*args)
+
+
+def test_entries_are_shared_through_the_file(path):
+    writer, reader = _cache(path, "writer"), _cache(path, "reader")
+    writer.set(("ramen", "blok m"), [{"name": "Ramen 1"}])
+    # Large values are compressed
+    writer.set("big", {"text": "x" * 150})
+
+    assert reader.get(("ramen", "blok m")) == [{"name": "Ramen 1"}]
+    assert reader.get("big") == {"text": "x" * 150}
+    assert reader.lookup("other") == (MISSING, False)
+
+
+def test_reader_retries_a_torn_read(path, monkeypatch):
+    writer, reader = _cache(path, "writer"), _cache(path, "reader")
+    writer.set("key", "old")
+
+    tearing = _WriteDuringRead(lambda: writer.set("key", "new"))
+    monkeypatch.setattr(shared_cache, "_SLOT", tearing)
+
+    # The payload copied before the write is discarded; the retry sees the new value
+    assert reader.get("key") == "new"
+    assert tearing.writes == 1
+
+
+def test_slot_being_written_reads_as_a_miss(path):
+    writer, reader = _cache(path, "writer"), _cache(path, "reader")
+    writer.set("key", "value")
+
+    offset = _slot_offset(writer, "key")
+    seq = shared_cache._SLOT.unpack_from(writer._map, offset)[0]
+    # A writer that stopped halfway leaves the sequence odd
+    struct.pack_into("<Q", writer._map, offset, seq + 1)
+    assert reader.lookup("key") == (MISSING, False)
+
+    struct.pack_into("<Q", writer._map, offset, seq + 2)
+    assert reader.get("key") == "value"
+
+
+def test_full_neighbourhood_evicts_the_entry_closest_to_expiry(path):
+    cache = _cache(path, slots=shared_cache._PROBE)
+    for i in range(shared_cache._PROBE):
+        cache.set(f"key-{i}", i, ttl=100.0 + i)
+    cache.set("newcomer", "value")
+
+    assert cache.evictions == 1
+    assert cache.get("key-0") is None
+    assert cache.get("newcomer") == "value"
+    assert len(cache) == shared_cache._PROBE
+
+
+def test_oversized_values_are_skipped(path):
+    cache = _cache(path)
+    # Random text, so compression cannot make it fit
+    cache.set("key", os.urandom(500).hex())
+
+    assert cache.oversized == 1
+    assert cache.get("key") is None
+
+
+def test_changed_layout_uses_a_separate_file(path):
+    old = _cache(path)
+    old.set("key", "value")
+    new = _cache(path, slots=32)
+
+    assert new.path != old.path
+    assert new.get("key") is None
+    # Workers still on the old layout keep their mapping and entries
+    assert old.get("key") == "value"
+    assert os.path.getsize(old.path) == shared_cache._HEADER_SIZE + 16 * 256
+
+
+def test_file_with_an_unexpected_layout_is_refused(path):
+    cache = _cache(path)
+    cache.set("key", "value")
+    size = os.path.getsize(cache.path)
+    with open(cache.path, "r+b") as f:
+        f.write(b"XXXX")
+
+    with pytest.raises(OSError):
+        _cache(path)
+    # The file in use is left alone
+    assert os.path.getsize(cache.path) == size
@@ -0,0 +1,177 @@
+"""
+Tests for single-flight coalescing
+"""
+import asyncio
+import pytest
+from app.utils.deadline import DeadlineExceeded, remaining, start_deadline
+from app.utils.single_flight import SingleFlight
+
+
+def test_identical_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight("test")
+        started = 0
+
+        async def work():
+            nonlocal started
+            started += 1
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+        return flight, started, results
+
+    flight, started, results = asyncio.run(scenario())
+    assert started == 1
+    assert results == ["result"] * 5
+    assert flight.stats() == {
+        "name": "test", "calls": 5, "executions": 1, "coalesced": 4, "cancelled": 0, "in_flight": 0,
+    }
+
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def work(value):
+            await asyncio.sleep(0)
+            return value
+
+        return await asyncio.gather(flight.do("a", lambda: work(1)), flight.do("b", lambda: work(2)))
+
+    assert asyncio.run(scenario()) == [1, 2]
+
+
+def test_cancelling_one_waiter_keeps_the_shared_call():
+    async def scenario():
+        flight = SingleFlight("test")
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "done"
+
+        first = asyncio.create_task(flight.do("key", work))
+        second = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return flight, first, await second
+
+    flight, first, result = asyncio.run(scenario())
+    assert first.cancelled()
+    assert result == "done"
+    assert flight.cancelled == 0
+
+
+def test_cancelling_every_waiter_cancels_the_shared_call():
+    async def scenario():
+        flight = SingleFlight("test")
+        work_cancelled = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                work_cancelled.set()
+                raise
+
+        waiters = [asyncio.create_task(flight.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.wait_for(work_cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        return flight
+
+    flight = asyncio.run(scenario())
+    assert flight.cancelled == 1
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_exception_reaches_every_waiter_and_key_is_released():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def fail():
+            await asyncio.sleep(0)
+            raise ValueError("upstream broke")
+
+        results = await asyncio.gather(
+            flight.do("key", fail), flight.do("key", fail), return_exceptions=True
+        )
+
+        async def succeed():
+            return "fresh"
+
+        return results, await flight.do("key", succeed)
+
+    results, retried = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert retried == "fresh"
+
+
+@pytest.mark.parametrize("waiters", [1, 3])
+def test_sequential_calls_do_not_coalesce(waiters):
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def work():
+            return 1
+
+        for _ in range(waiters):
+            await flight.do("key", work)
+        return flight
+
+    flight = asyncio.run(scenario())
+    assert flight.executions == waiters
+    assert flight.coalesced == 0
+
+
+def test_shared_call_does_not_inherit_the_first_callers_deadline():
+    async def scenario():
+        flight = SingleFlight("test")
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return remaining()
+
+        async def caller(budget):
+            start_deadline(budget)
+            return await flight.do("key", work)
+
+        hurried = asyncio.create_task(caller(0.01))
+        await asyncio.sleep(0)
+        patient = asyncio.create_task(caller(0))
+        results = await asyncio.gather(hurried, return_exceptions=True)
+        release.set()
+        return flight, results[0], await patient
+
+    flight, hurried, patient = asyncio.run(scenario())
+    # The first caller gives up at its deadline; the call goes on for the second
+    assert isinstance(hurried, DeadlineExceeded)
+    assert patient is None
+    assert flight.cancelled == 0
+
+
+def test_last_caller_past_its_deadline_cancels_the_shared_call():
+    async def scenario():
+        flight = SingleFlight("test")
+        start_deadline(0.05)
+
+        async def work():
+            await asyncio.sleep(10)
+
+        with pytest.raises(DeadlineExceeded):
+            # Half the 0.05 s budget is always left to the call
+            await flight.do("key", work, reserve=10.0)
+        await asyncio.sleep(0)
+        return flight
+
+    flight = asyncio.run(scenario())
+    assert flight.cancelled == 1
+    assert flight.stats()["in_flight"] == 0
@@ -0,0 +1,91 @@
+"""
+Tests for local travel time estimates
+"""
+import math
+import numpy as np
+import pytest
+from app.services.travel_estimator import (
+    BIKE_THRESHOLD_SECONDS,
+    WALK_THRESHOLD_SECONDS,
+    SpeedModel,
+    TravelEstimate,
+    TravelTimeEstimator,
+    format_distance,
+    format_duration,
+)
+from app.utils.geo import EARTH_RADIUS_M
+
+ORIGIN = (0.0, 0.0)
+
+
+def _north(meters: float) -> tuple:
+    """Point `meters` due north of ORIGIN"""
+    return (math.degrees(meters / EARTH_RADIUS_M), 0.0)
+
+
+def _estimator(**kwargs) -> TravelTimeEstimator:
+    return TravelTimeEstimator(
+        models={"walking": SpeedModel(speed=1.3), "bicycling": SpeedModel(speed=4.0),
+                "driving": SpeedModel(speed=6.0, overhead=60.0)},
+        detour_factor=1.3,
+        **kwargs
+    )
+
+
+@pytest.mark.parametrize("seconds, text", [
+    (10, "1 min"), (90, "2 mins"), (3600, "1 hour"), (3900, "1 hour 5 mins"), (7260, "2 hours 1 min"),
+])
+def test_format_duration(seconds, text):
+    assert format_duration(seconds) == text
+
+
+@pytest.mark.parametrize("meters, text", [(849.6, "850 m"), (1234, "1.2 km"), (15000, "15.0 km")])
+def test_format_distance(meters, text):
+    assert format_distance(meters) == text
+
+
+def test_estimate_scales_straight_distance_by_detour_and_speed():
+    estimate = _estimator().estimate(ORIGIN, [_north(1000), _north(2600)])
+
+    assert estimate.straight_m == pytest.approx([1000, 2600], rel=1e-6)
+    assert estimate.road_m == pytest.approx([1300, 3380], rel=1e-6)
+    assert estimate.seconds["walking"] == pytest.approx([1000, 2600], rel=1e-6)
+    assert estimate.seconds["bicycling"] == pytest.approx([325, 845], rel=1e-6)
+    assert estimate.seconds["driving"] == pytest.approx([60 + 1300 / 6, 60 + 3380 / 6], rel=1e-6)
+
+
+def test_observations_calibrate_speed_overhead_and_detour_by_least_squares():
+    estimator = _estimator(min_samples=20)
+    for i in range(19):
+        x = 200.0 + 100 * i
+        estimator.observe("walking", x, 1.5 * x, 30 + 0.9 * x)
+    # Not enough samples yet: the configured model still applies
+    assert estimator.stats()["models"]["walking"]["calibrated"] is False
+    assert estimator.detour_factor == 1.3
+
+    estimator.observe("walking", 2100.0, 1.5 * 2100, 30 + 0.9 * 2100)
+    stats = estimator.stats()
+    assert stats["observations"] == 20
+    assert stats["detour_factor"] == pytest.approx(1.5)
+    assert stats["models"]["walking"] == {"overhead_s": 30.0, "straight_line_mps": round(1 / 0.9, 3), "calibrated": True}
+    assert estimator.estimate(ORIGIN, [_north(1000)]).seconds["walking"] == pytest.approx([930], rel=1e-6)
+    # Modes without observations keep their speed but use the calibrated detour
+    assert estimator.estimate(ORIGIN, [_north(1000)]).seconds["bicycling"] == pytest.approx([1500 / 4], rel=1e-6)
+
+
+def test_calibration_can_be_disabled():
+    estimator = _estimator(calibrate=False, min_samples=1)
+    for x in (100.0, 200.0, 300.0):
+        estimator.observe("walking", x, 2 * x, 5 * x)
+
+    assert estimator.observations == 0
+    assert estimator.stats()["models"]["walking"]["calibrated"] is False
+
+
+def test_borderline_picks_places_near_the_walk_or_bike_threshold():
+    walk = np.array([100.0, WALK_THRESHOLD_SECONDS * 1.2, 1000.0, 2000.0, 5000.0])
+    bike = np.array([30.0, 140.0, 325.0, BIKE_THRESHOLD_SECONDS * 0.9, 1625.0])
+    estimate = TravelEstimate(straight_m=walk, road_m=walk * 1.3, seconds={"walking": walk, "bicycling": bike})
+
+    assert _estimator().borderline(estimate, margin=0.25) == [1, 3]
+    assert _estimator().borderline(estimate, margin=0.0) == []